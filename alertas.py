@@ -0,0 +1,136 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import urllib.request
+from collections import deque
+
+from servicio_scan import cache_scan, setups_respuesta
+
+log = logging.getLogger(__name__)
+
+# ============================================================
+#        ALERTAS DELTA (SOLO LO QUE CAMBIÓ ENTRE ESCANEOS)
+# ============================================================
+# Cada escaneo nuevo que entra al cache_scan se compara contra los
+# setups del escaneo anterior del mismo mercado:
+#   nuevos    -> setups que no estaban (registro completo)
+#   salieron  -> tickers que dejaron de ser setup
+#   cambiados -> mismo ticker con otro stop / TP1 / TP2 ({antes, ahora})
+# Solo se guardan (y se empujan al webhook) los deltas no vacíos.
+#
+# El primer escaneo de cada mercado solo fija la base: después de un
+# reinicio no se re-anuncian como "nuevos" todos los setups vigentes.
+#
+# Escaneos parciales (chunks caídos, tickers sin descargar): solo se
+# comparan los tickers analizados en AMBOS escaneos. Un ticker que faltó
+# no "sale" ni "entra"; la base conserva su último estado conocido y se
+# compara contra él cuando vuelva a analizarse.
+
+# POST con cada delta (p.ej. un webhook de n8n); vacío = no se empuja
+ALERTAS_WEBHOOK_URL = os.environ.get("ALERTAS_WEBHOOK_URL", "")
+ALERTAS_WEBHOOK_TIMEOUT = float(os.environ.get("ALERTAS_WEBHOOK_TIMEOUT", "5"))
+
+# Deltas que se guardan por mercado para /alertas?desde=...
+ALERTAS_HISTORIAL = 50
+
+NIVELES = ("stop_loss", "tp1", "tp2")
+
+
+def diferencias(previos, actuales, comunes=None):
+    """
+    Delta entre dos listas de setups (formato de setups_respuesta).
+    Con 'comunes' solo se comparan esos tickers (los analizados en ambos
+    escaneos). Regresa {"nuevos": [...], "salieron": [...], "cambiados": [...]}.
+    """
+    antes = {s["ticker"]: s for s in previos if comunes is None or s["ticker"] in comunes}
+    ahora = {s["ticker"]: s for s in actuales if comunes is None or s["ticker"] in comunes}
+
+    nuevos = [s for t, s in ahora.items() if t not in antes]
+    salieron = [t for t in antes if t not in ahora]
+    cambiados = []
+    for t, s in ahora.items():
+        if t not in antes:
+            continue
+        cambios = {c: {"antes": antes[t].get(c), "ahora": s.get(c)}
+                   for c in NIVELES if antes[t].get(c) != s.get(c)}
+        if cambios:
+            cambiados.append({"ticker": t, **cambios})
+
+    return {"nuevos": nuevos, "salieron": salieron, "cambiados": cambiados}
+
+
+def _vacio(delta):
+    return not (delta["nuevos"] or delta["salieron"] or delta["cambiados"])
+
+
+def enviar_webhook(url, delta, timeout=None):
+    """POST JSON del delta (en un hilo aparte, no frena el escaneo)."""
+    cuerpo = json.dumps(delta, ensure_ascii=False, default=str).encode("utf-8")
+
+    def _post():
+        try:
+            req = urllib.request.Request(url, data=cuerpo, headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(req, timeout=timeout or ALERTAS_WEBHOOK_TIMEOUT).close()
+        except Exception as e:
+            # el delta sigue disponible en /alertas
+            log.warning("No se pudo enviar la alerta %s a %s: %s",
+                        delta.get("secuencia"), url, e)
+
+    threading.Thread(target=_post, daemon=True).start()
+
+
+class Alertas:
+    def __init__(self, webhook=None):
+        self.webhook = ALERTAS_WEBHOOK_URL if webhook is None else webhook
+        self._base = {}         # mercado -> (setups, tickers analizados)
+        self._deltas = {}       # mercado -> deque de deltas
+        self._secuencia = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def registrar(self, mercado, resultado):
+        """Compara el escaneo nuevo con el anterior; regresa el delta (o None)."""
+        actuales = setups_respuesta(resultado)
+        analizados = set(resultado.tabla["Ticker"]) - set(resultado.faltantes)
+        with self._lock:
+            base = self._base.get(mercado)
+            if base is None:
+                self._base[mercado] = (actuales, analizados)
+                return None
+
+            previos, analizados_antes = base
+            # Lo que no se analizó ahora se queda con su último estado
+            arrastrados = [s for s in previos if s["ticker"] not in analizados]
+            self._base[mercado] = (
+                actuales + arrastrados,
+                analizados | (analizados_antes - analizados),
+            )
+
+            delta = diferencias(previos, actuales, comunes=analizados & analizados_antes)
+            if _vacio(delta):
+                return None
+
+            delta = {
+                "secuencia": next(self._secuencia),
+                "market": mercado,
+                "datos_del": resultado.timestamp,
+                **delta,
+            }
+            self._deltas.setdefault(mercado, deque(maxlen=ALERTAS_HISTORIAL)).append(delta)
+
+        if self.webhook:
+            enviar_webhook(self.webhook, delta)
+        return delta
+
+    def deltas(self, mercado, desde=None):
+        """Deltas con secuencia > desde (sin 'desde': solo el último)."""
+        with self._lock:
+            historial = list(self._deltas.get(mercado, ()))
+        if desde is None:
+            return historial[-1:]
+        return [d for d in historial if d["secuencia"] > desde]
+
+
+alertas = Alertas()
+cache_scan.suscriptores.append(alertas.registrar)
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+
+from registros import LoteResultados
+
+# ============================================================
+#     MOTOR VECTORIZADO (TODO EL UNIVERSO EN UNA PASADA)
+# ============================================================
+# Mismo cálculo que analizar_con_data pero sobre matrices fechas × tickers.
+# Los recorridos temporales (EMAs) son un solo for sobre las fechas con
+# operaciones NumPy sobre TODOS los tickers a la vez; el resto (ventanas
+# de 14/20, percentiles) solo necesita las últimas filas.
+
+# EMAs de tendencia que salen directo del Close
+SPANS_EMAS = np.array([20, 50, 200], dtype=float)
+
+
+def como_panel(panel, tickers=None):
+    """
+    Con un solo ticker la descarga puede venir con columnas planas
+    (Open, High, ...). Se envuelve al layout MultiIndex (Ticker, Campo)
+    para analizarla igual que un panel de varios tickers.
+    """
+    if panel is None or panel.empty or isinstance(panel.columns, pd.MultiIndex):
+        return panel
+    tickers = list(tickers) if tickers is not None else []
+    if len(tickers) != 1:
+        return panel
+    return pd.concat({tickers[0]: panel}, axis=1)
+
+
+def preparar_arrays(panel, tickers=None):
+    """
+    Convierte el panel MultiIndex (Ticker, Campo) de descargar_batch en:
+      tickers, close, high, low, validos
+    con matrices (fechas × tickers). 'validos' marca las filas que
+    sobreviven al data.dropna() que hace analizar_con_data (todas las
+    columnas del ticker con dato).
+    """
+    panel = como_panel(panel, tickers)
+    if panel is None or panel.empty or not isinstance(panel.columns, pd.MultiIndex):
+        return [], None, None, None, None
+
+    disponibles = set(panel.columns.get_level_values(0))
+    if tickers is None:
+        tickers = list(dict.fromkeys(panel.columns.get_level_values(0)))
+    tickers = [t for t in tickers if t in disponibles]
+
+    # Un solo to_numpy de todo el panel y luego se recortan columnas por
+    # posición (mucho más rápido que un xs/reindex por campo con miles de tickers)
+    valores = panel.to_numpy(dtype=float)
+    posicion = {col: i for i, col in enumerate(panel.columns)}
+    vacia = np.full((len(panel), 1), np.nan)
+
+    campos = {}
+    for campo in dict.fromkeys(panel.columns.get_level_values(1)):
+        idx = np.array([posicion.get((t, campo), -1) for t in tickers], dtype=int)
+        arr = valores[:, idx] if len(idx) else np.empty((len(panel), 0))
+        if (idx < 0).any():
+            arr[:, idx < 0] = vacia
+        campos[campo] = arr
+
+    if not all(c in campos for c in ("Close", "High", "Low")):
+        return [], None, None, None, None
+
+    validos = np.ones(campos["Close"].shape, dtype=bool)
+    for arr in campos.values():
+        validos &= ~np.isnan(arr)
+
+    return tickers, campos["Close"], campos["High"], campos["Low"], validos
+
+
+def alinear_derecha(validos, *arrays):
+    """
+    Compacta cada columna dejando solo sus filas válidas pegadas al final
+    (arriba queda NaN). Es el equivalente por columna de data.dropna():
+    la última fila de cada ticker queda en [-1] y las ventanas [-n:]
+    traen NaN si el ticker tiene menos de n velas.
+    """
+    orden = np.argsort(validos, axis=0, kind="stable")
+    faltan = ~np.take_along_axis(validos, orden, axis=0)
+
+    salida = []
+    for arr in arrays:
+        a = np.take_along_axis(arr, orden, axis=0)
+        a[faltan] = np.nan
+        salida.append(a)
+    return salida
+
+
+def ema_matriz(x, spans):
+    """
+    EMA adjust=False (igual que pandas .ewm(span, adjust=False)) de
+    varias series a la vez.
+      x: (fechas, n) -> regresa (len(spans), n) con el último valor.
+    Empieza en el primer dato no-NaN de cada columna.
+    """
+    alfa = (2.0 / (np.asarray(spans, dtype=float) + 1.0))[:, None]
+    ema = np.full((len(alfa), x.shape[1]), np.nan)
+
+    for fila in x:
+        nuevo = alfa * fila + (1 - alfa) * ema
+        ema = np.where(np.isnan(ema), fila, nuevo)
+
+    return ema
+
+
+def _macd_signal(close):
+    """MACD y su Signal (EMA9 del MACD) en una sola pasada por las fechas."""
+    a12, a26, a9 = 2 / 13, 2 / 27, 2 / 10
+    e12 = e26 = sig = np.full(close.shape[1], np.nan)
+
+    for fila in close:
+        e12 = np.where(np.isnan(e12), fila, a12 * fila + (1 - a12) * e12)
+        e26 = np.where(np.isnan(e26), fila, a26 * fila + (1 - a26) * e26)
+        macd = e12 - e26
+        sig = np.where(np.isnan(sig), macd, a9 * macd + (1 - a9) * sig)
+
+    return e12 - e26, sig
+
+
+def percentiles(x, n_velas, qs):
+    """
+    Cuantiles con interpolación lineal (default de pandas .quantile) de
+    cada columna ignorando NaN, sin el loop por columna de np.nanquantile:
+    se ordena una vez (los NaN quedan al final) y se interpola por posición.
+    """
+    ordenado = np.sort(x, axis=0)
+    ultimo = np.maximum(n_velas - 1, 0)
+
+    salida = []
+    for q in qs:
+        pos = q * ultimo
+        abajo = np.floor(pos).astype(int)
+        arriba = np.minimum(abajo + 1, ultimo)
+        frac = pos - abajo
+        v_abajo = np.take_along_axis(ordenado, abajo[None, :], axis=0)[0]
+        v_arriba = np.take_along_axis(ordenado, arriba[None, :], axis=0)[0]
+        salida.append(v_abajo + (v_arriba - v_abajo) * frac)
+    return salida
+
+
+def calcular_indicadores(close, high, low):
+    """
+    Recibe matrices ya alineadas a la derecha y regresa un dict de
+    vectores (uno por ticker) con el último valor de cada indicador.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precio = close[-1]
+
+        # -------- MACD --------
+        macd, signal = _macd_signal(close)
+
+        # -------- BOLLINGER (20, 2σ) --------
+        v20 = close[-20:]
+        mid = v20.mean(axis=0)
+        std = v20.std(axis=0, ddof=1)
+        upper = mid + 2 * std
+        lower = mid - 2 * std
+
+        # -------- KDJ (14) --------
+        low_min = low[-14:].min(axis=0)
+        high_max = high[-14:].max(axis=0)
+        rsv = ((precio - low_min) / (high_max - low_min)) * 100
+        K = (2 / 3) * 50 + (1 / 3) * rsv
+        D = (2 / 3) * 50 + (1 / 3) * K
+        J = 3 * K - 2 * D
+
+        # -------- RSI (14) --------
+        delta = np.diff(close[-15:], axis=0)
+        gain = np.clip(delta, 0, None).mean(axis=0)
+        loss = (-np.clip(delta, None, 0)).mean(axis=0)
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        # -------- EMAs --------
+        ema20, ema50, ema200 = ema_matriz(close, SPANS_EMAS)
+
+        # -------- ATR (14, media simple) --------
+        h, l, c = high[-14:], low[-14:], close[-15:]
+        prev = c[:-1]
+        tr = np.fmax(h - l, np.fmax(np.abs(h - prev), np.abs(l - prev)))
+        # fmax ignora el NaN del primer cierre previo (queda High-Low),
+        # igual que el .max(axis=1) de atr_manual
+        atr14 = tr.mean(axis=0)
+
+        # -------- PERCENTILES (P20/P50/P80 de toda la historia) --------
+        n_velas = (~np.isnan(close)).sum(axis=0)
+        p20, p50, p80 = percentiles(close, n_velas, (0.20, 0.50, 0.80))
+        pocas = n_velas < 50
+        p20[pocas] = np.nan
+        p50[pocas] = np.nan
+        p80[pocas] = np.nan
+
+    return {
+        "precio": precio, "macd": macd, "signal": signal,
+        "upper": upper, "lower": lower, "K": K, "D": D, "J": J,
+        "rsi": rsi, "ema20": ema20, "ema50": ema50, "ema200": ema200,
+        "atr14": atr14, "p20": p20, "p50": p50, "p80": p80,
+        "n_velas": n_velas,
+    }
+
+
+def analizar_arrays(tickers, close, high, low, validos):
+    """
+    Núcleo del motor: matrices crudas (fechas × tickers) -> (lote, faltantes).
+    'lote' es un LoteResultados (columnar); lote.a_dicts() da los mismos
+    dicts que analizar_con_data.
+    """
+    if not tickers:
+        return LoteResultados.vacio(), []
+
+    close, high, low = alinear_derecha(validos, close, high, low)
+    ind = calcular_indicadores(close, high, low)
+
+    atr14 = ind["atr14"]
+    with np.errstate(invalid="ignore"):
+        ok = (ind["n_velas"] > 0) & ~np.isnan(atr14) & (atr14 > 0)
+
+    tickers = np.asarray(tickers, dtype=object)
+    lote = LoteResultados.desde_indicadores(
+        tickers[ok], {k: v[ok] for k, v in ind.items()}
+    )
+    return lote, list(tickers[~ok])
+
+
+def analizar_panel(panel, tickers=None):
+    """
+    Analiza todos los tickers del panel de descargar_batch en una pasada.
+    Regresa (lote, faltantes) respetando el orden de 'tickers'.
+    """
+    pedidos = list(tickers) if tickers is not None else None
+    tickers, close, high, low, validos = preparar_arrays(panel, pedidos)
+
+    lote, faltantes = analizar_arrays(tickers, close, high, low, validos)
+
+    if pedidos is not None:
+        ok = set(tickers) - set(faltantes)
+        faltantes = [t for t in pedidos if t not in ok]
+
+    return lote, faltantes
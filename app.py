@@ -1,17 +1,18 @@
 import streamlit as st
-import pandas as pd
 import streamlit.components.v1 as components
-import json
-from urllib.parse import parse_qs
-from datetime import datetime
-import pytz
+import textwrap
 
 from bot_trading import (
-    descargar_batch,
-    analizar_con_data,    
     acciones_mx,
     acciones_usa,
 )
+from registros import formatear_tabla
+from puntuacion import setups_perfectos, razones_score, COMPRA_FUERTE, POSIBLE_COMPRA, ORDEN_SEMAFORO, ORDEN_ATR
+from servicio_scan import ResultadoScan, cache_scan, escanear_por_partes_sync
+from plantillas_html import (
+    BUSCAR_TICKER, IR_A_TICKER_JS, alto_tarjetas, componente_tarjetas, filas_resumen, hash_filas,
+    pagina_tarjetas,
+)
 
 st.markdown('<div id="top"></div>', unsafe_allow_html=True)
 st.set_page_config(page_title="Trading by Arkangel", layout="wide")
@@ -30,41 +31,133 @@ mercado = st.selectbox(
 acciones = acciones_mx if mercado == "México (BMV)" else acciones_usa
 st.caption(f"Analizando: {len(acciones)} acciones — {mercado}")
 
-batch = descargar_batch(acciones, period="2y", interval="1d")
-tz_mx = pytz.timezone("America/Mazatlan")
-batch_ts = datetime.now(tz_mx).strftime("%Y-%m-%d %H:%M:%S")
-resultados = []
-faltantes = []
-
-for t in acciones:
-    try:
-        # batch suele venir con columnas MultiIndex: (Ticker, Campo)
-        if isinstance(batch.columns, pd.MultiIndex):
-            # si el ticker no viene en el paquete, lo marcamos como faltante
-            if t not in batch.columns.get_level_values(0):
-                faltantes.append(t)
-                continue
-
-            df_t = batch[t].copy()  # Open/High/Low/Close/...
-        else:
-            # caso raro: si por alguna razón no viene MultiIndex
-            df_t = batch.copy()
-
-        r = analizar_con_data(t, df_t)
-        if r:
-            resultados.append(r)
-        else:
-            faltantes.append(t)
-
-    except Exception:
-        faltantes.append(t)
-
-st.caption(f"Total: {len(acciones)} | OK: {len(resultados)} | Faltantes: {len(faltantes)} | Datos del: {batch_ts}")
+# ==========================
+# DATOS DEL ESCANEO (CACHE DEL PROCESO)
+# ==========================
+# cache_scan (servicio_scan.py) vive en el proceso, no en la sesión: todas
+# las pestañas y la API leen el mismo escaneo por (mercado, versión de
+# datos) con TTL. Un rerun (o volver a un mercado ya visto) no descarga
+# ni analiza nada; pasado el TTL se muestra el último y se recalcula atrás.
+codigo = "MX" if mercado == "México (BMV)" else "USA"
+
+
+def carga_progresiva(codigo, total):
+    """
+    Arranque en frío (nada en cache): escanea por partes y va pintando el
+    avance (barra, tiempo y faltantes por parte) más un resumen y los
+    setups parciales. Al terminar el escaneo completo queda en cache_scan
+    y se regresa (sin volver a escanear aunque alguna parte haya fallado).
+    """
+    barra = st.progress(0.0, text="Descargando datos...")
+    detalle = st.empty()
+    parcial = st.empty()
+
+    partes, lineas = [], []
+    for parte, segundos in escanear_por_partes_sync(codigo):
+        partes.append(parte)
+        hechas = sum(len(p.tabla) + len(p.faltantes) for p in partes)
+        barra.progress(min(hechas / max(total, 1), 1.0), text=f"Analizadas {hechas} de {total} acciones")
+        lineas.append(f"Parte {len(partes)}: {len(parte.tabla)} OK, {len(parte.faltantes)} faltantes, {segundos:.1f}s")
+        detalle.caption(" · ".join(lineas))
+
+        # Resumen y setups con lo que va llegando
+        tabla = ResultadoScan.unir(codigo, partes).tabla
+        with parcial.container():
+            conteo = tabla["Semáforo Final"].value_counts()
+            st.caption(" | ".join(f"{s}: {conteo.get(s, 0)}" for s in ORDEN_SEMAFORO))
+            setups = tabla[setups_perfectos(tabla)]
+            if not setups.empty:
+                st.dataframe(
+                    formatear_tabla(setups)[["Ticker", "Semáforo Final", "Precio", "Score", "Semáforo ATR", "Riesgo%"]],
+                    use_container_width=True
+                )
+
+    barra.empty()
+    detalle.empty()
+    parcial.empty()
+    return cache_scan.guardado(codigo) or ResultadoScan.unir(codigo, partes)
+
+
+# Sin escaneo en cache (primera visita al mercado): carga progresiva en vez
+# de dejar la página en blanco hasta que termine todo. El modo JSON no pinta nada.
+progresiva = cache_scan.guardado(codigo) is None and st.query_params.get("mode") != "json"
+if progresiva:
+    resultado, estado_cache = carga_progresiva(codigo, len(acciones)), "nuevo"
+else:
+    resultado, estado_cache = cache_scan.obtener(codigo)
+faltantes = resultado.faltantes
+
+st.caption(f"Total: {len(acciones)} | OK: {len(resultado.tabla)} | Faltantes: {len(faltantes)} | Datos del: {resultado.timestamp} | Cache: {estado_cache}")
+if resultado.warning is not None:
+    st.warning(resultado.warning)
 
 #Esta funcion me ayuda a saber cuales son las acciones faltantes.
 #st.write("Faltantes:", faltantes)
 
-tabla = pd.DataFrame(resultados)
+
+def vistas(resultado):
+    """
+    Tablas que el dashboard deriva del escaneo. Se calculan una vez por
+    snapshot y se guardan en resultado.derivados (compartido entre sesiones),
+    así un rerun solo vuelve a pintar.
+    """
+    v = resultado.derivados.get("app")
+    if v is not None:
+        return v
+
+    # Tabla cruda: floats sin redondear y NaN donde no hay dato, ya con
+    # Score + Semáforo Final + Semáforo ATR (mismo módulo que la API).
+    # El redondeo / "" solo se aplica al mostrar (formatear_tabla).
+    # Copia: el resultado es compartido y aquí se le agregan columnas.
+    tabla = resultado.tabla.copy()
+
+    # Orden de prioridad para el resumen (puntuacion.ORDEN_SEMAFORO, igual que la API)
+    # Crear columna auxiliar solo para ordenar por señal
+    tabla["orden_resumen"] = tabla["Semáforo Final"].map(ORDEN_SEMAFORO).fillna(99)
+
+    # ✅ Orden de prioridad para volatilidad (ATR)
+    # Crear columna auxiliar para ordenar por volatilidad
+    tabla["orden_atr"] = tabla["Semáforo ATR"].map(ORDEN_ATR).fillna(99)
+
+    # ✅ Tabla ordenada para el resumen: primero por señal y luego por volatilidad
+    tabla_resumen = tabla.sort_values(["orden_resumen", "orden_atr"], ascending=[True, True])
+
+    # COMPRA + Volatilidad Sana + Score≥3 + Riesgo≤5% + precio <= P50 y < P80
+    tabla_setup = tabla[setups_perfectos(tabla)].copy()
+    if not tabla_setup.empty:
+        # Ordena mejores primero: Compra fuerte > posible compra, mayor score, menor riesgo, más cerca de soporte
+        tabla_setup["prio_sem"] = tabla_setup["Semáforo Final"].map({COMPRA_FUERTE: 1, POSIBLE_COMPRA: 2}).fillna(9)
+        tabla_setup["riesgo_num"] = tabla_setup["Riesgo%"]
+        tabla_setup["score_num"] = tabla_setup["Score"]
+
+        # Distancia a soporte (qué tan “barata” está vs P20)
+        tabla_setup["dist_soporte"] = (tabla_setup["Precio"] - tabla_setup["Soporte Estadístico"]).abs().fillna(999999)
+
+        tabla_setup = tabla_setup.sort_values(
+            by=["prio_sem", "score_num", "riesgo_num", "dist_soporte"],
+            ascending=[True, False, True, True]
+        )
+
+    # Versión para mostrar (redondeada, "" donde no hay dato)
+    tabla_vista = formatear_tabla(tabla)
+
+    razones = razones_score(tabla)
+    v = resultado.derivados["app"] = {
+        "tabla": tabla,
+        "tabla_resumen": tabla_resumen,
+        "tabla_setup": tabla_setup,
+        "tabla_vista": tabla_vista,
+        "csv": tabla_vista.to_csv(index=False),
+        # Explicación corta del score (top 4 razones) de todas las acciones
+        "razones": razones,
+        # Hash de lo que se pinta de cada fila (cache de render, plantillas_html.py)
+        "hashes": hash_filas(tabla_vista, razones),
+    }
+    return v
+
+
+v = vistas(resultado)
+tabla_vista = v["tabla_vista"]
 # ==========================
 # MODO JSON PARA n8n
 # ==========================
@@ -74,7 +167,7 @@ modo = query_params.get("mode", None)
 if modo == "json":
     salida = []
 
-    for _, row in tabla.iterrows():
+    for _, row in tabla_vista.iterrows():
         # Solo setups perfectos u oportunidades de compra
         if row.get("Semáforo Final") in ["🟢 COMPRA FUERTE", "🟢 POSIBLE COMPRA"]:
             salida.append({
@@ -92,545 +185,171 @@ if modo == "json":
     st.json(salida)
     st.stop()
 
-def calcular_score_y_semaforo(row):
-    score = 0
-
-    # MACD
-    macd_val = float(row["MACD"])
-    signal_val = float(row["Signal"])
-    score += 1 if macd_val > signal_val else -1
-
-    # RSI
-    rsi_val = float(row["RSI"])
-    if rsi_val < 30:
-        score += 1
-    elif rsi_val > 70:
-        score -= 1
-
-    # Bollinger
-    boll = str(row["Bollinger Señal"])
-    if boll == "Sobreventa":
-        score += 1
-    elif boll == "Sobrecompra":
-        score -= 1
-
-    # Tendencia (EMA50 vs EMA200)
-    tendencia = str(row["Tendencia"])
-    score += 1 if tendencia == "Alcista" else -1
-
-    # Precio vs EMA50
-    precio_ema50 = str(row["Precio EMA50"])
-    score += 1 if precio_ema50 == "Arriba" else -1
-
-    # KDJ
-    K_val = float(row["K"])
-    D_val = float(row["D"])
-    score += 1 if K_val > D_val else -1
-
-    # Semáforo final por score
-    if score >= 4:
-        sem = "🟢 COMPRA FUERTE"
-    elif score >= 2:
-        sem = "🟢 POSIBLE COMPRA"
-    elif score <= -4:
-        sem = "🔴 VENTA FUERTE"
-    elif score <= -2:
-        sem = "🔴 POSIBLE VENTA"
-    else:
-        sem = "🟡 ESPERAR"
-
-    return score, sem
-
-tabla["Score"] = ""
-tabla["Semáforo Final"] = ""
-
+# ==========================
+# SECCIONES (FRAGMENTOS)
+# ==========================
+# Cada sección es un st.fragment: sus propios widgets solo re-ejecutan
+# esa sección (no la página), y todas se arman desde el escaneo en cache
+# (vistas), así una interacción cuesta lo que tarda en pintarse.
+# Cambiar de mercado sí re-ejecuta todo, porque todas dependen de él.
+def vistas_de(codigo):
+    # El último snapshot guardado (al re-ejecutar una sección ya se ve el
+    # refresco de atrás); si el escaneo no se pudo guardar, el de la página
+    return vistas(cache_scan.guardado(codigo) or resultado)
 
 
-for i in range(len(tabla)):
-    sc, sem = calcular_score_y_semaforo(tabla.iloc[i])
-    tabla.at[i, "Score"] = sc
-    tabla.at[i, "Semáforo Final"] = sem
+# ==========================
+# ✅ SETUP PERFECTO (compras)
+# ==========================
+@st.fragment
+def seccion_setup(codigo):
+    v = vistas_de(codigo)
+    st.subheader("✅ Oportunidad de compra")
 
-def semaforo_atr(atr_pct):
-    try:
-        atr_pct = float(atr_pct)
-    except:
-        return "—"
+    # COMPRA + Volatilidad Sana + Score≥3 + Riesgo≤5% + precio <= P50 y < P80
+    # (ya filtrada y ordenada en vistas())
+    tabla_setup = v["tabla_setup"]
 
-    if atr_pct < 1:
-        return "⚪ MUY LENTA"
-    elif atr_pct <= 3:
-        return "🟢 VOLATILIDAD SANA"
-    elif atr_pct <= 4:
-        return "🟡 VOLATIL"
+    if tabla_setup.empty:
+        st.info("No hay setups perfectos ahorita. (Busca COMPRA + Volatilidad Sana + Score≥3 + Riesgo≤5% + Precio entre Soporte y Precio Medio)")
     else:
-        return "🔴 MUY VOLATIL"
+        st.dataframe(
+            formatear_tabla(tabla_setup)[[
+                "Ticker",
+                "Semáforo Final",
+                "Precio",
+                "Soporte Estadístico",
+                "Precio Medio",
+                "Zona Cara",
+                "Score",
+                "Semáforo ATR",
+                "Riesgo%"
+            ]],
+            use_container_width=True
+        )
 
-tabla["Semáforo ATR"] = tabla["ATR%"].apply(semaforo_atr)
-
-
-# Orden de prioridad para el resumen
-orden_semaforo = {
-    "🟢 COMPRA FUERTE": 1,
-    "🟢 POSIBLE COMPRA": 2,
-    "🟡 ESPERAR": 3,
-    "🔴 POSIBLE VENTA": 4,
-    "🔴 VENTA FUERTE": 5
-}
-
-# Crear columna auxiliar solo para ordenar por señal
-tabla["orden_resumen"] = tabla["Semáforo Final"].map(orden_semaforo).fillna(99)
-
-# ✅ Orden de prioridad para volatilidad (ATR)
-orden_atr = {
-    "🟢 VOLATILIDAD SANA": 1,
-    "🟡 VOLATIL": 2,
-    "🔴 MUY VOLATIL": 3,
-    "⚪ MUY LENTA": 4,
-    "—": 99,
-    "": 99
-}
-
-# Crear columna auxiliar para ordenar por volatilidad
-tabla["orden_atr"] = tabla["Semáforo ATR"].map(orden_atr).fillna(99)
-
-# ✅ Tabla ordenada para el resumen: primero por señal y luego por volatilidad
-tabla_resumen = tabla.sort_values(["orden_resumen", "orden_atr"], ascending=[True, True])
 
 # ==========================
-# ✅ SETUP PERFECTO (compras)
+# RESUMEN RÁPIDO SUPERIOR
 # ==========================
-st.subheader("✅ Oportunidad de compra")
-
-def to_float(x):
-    try:
-        if x is None or x == "":
-            return None
-        return float(x)
-    except:
-        return None
-
-def es_setup_perfecto(row):
-    sem = str(row.get("Semáforo Final", "")).upper()
-    atr_sem = str(row.get("Semáforo ATR", "")).upper()
-    score = to_float(row.get("Score", None))
-    riesgo = to_float(row.get("Riesgo%", None))
-    precio = to_float(row.get("Precio", None))
-    soporte = to_float(row.get("Soporte Estadístico", None))
-    medio = to_float(row.get("Precio Medio", None))
-    cara = to_float(row.get("Zona Cara", None))
-
-    # 1) Señal (momentum)
-    if "COMPRA FUERTE" not in sem and "POSIBLE COMPRA" not in sem:
-        return False
-
-    # 2) Volatilidad operable
-    if "SANA" not in atr_sem:
-        return False
-
-    # 3) Score mínimo
-    if score is None or score < 3:
-        return False
-
-    # 4) Riesgo máximo (ATR %)
-    if riesgo is None or riesgo > 5:
-        return False
-
-    # 5) Precio en zona “barata” (P20 a P50) y NO en zona cara
-    #    - si no hay percentiles calculados, no lo considera perfecto
-    if precio is None or soporte is None or medio is None or cara is None:
-        return False
-
-    # Regla: precio <= P50 (ideal), y evitar que esté muy cerca/arriba de P80
-    if precio > medio:
-        return False
-    if precio >= cara:
-        return False
-
-    return True
-
-tabla_setup = tabla[tabla.apply(es_setup_perfecto, axis=1)].copy()
-
-if tabla_setup.empty:
-    st.info("No hay setups perfectos ahorita. (Busca COMPRA + Volatilidad Sana + Score≥3 + Riesgo≤5% + Precio entre Soporte y Precio Medio)")
-else:
-    # Ordena mejores primero: Compra fuerte > posible compra, mayor score, menor riesgo, más cerca de soporte
-    def prioridad_sem(sem):
-        sem = str(sem).upper()
-        if "COMPRA FUERTE" in sem: return 1
-        if "POSIBLE COMPRA" in sem: return 2
-        return 9
-
-    tabla_setup["prio_sem"] = tabla_setup["Semáforo Final"].apply(prioridad_sem)
-    tabla_setup["riesgo_num"] = tabla_setup["Riesgo%"].apply(to_float)
-    tabla_setup["score_num"] = tabla_setup["Score"].apply(to_float)
-
-    # Distancia a soporte (qué tan “barata” está vs P20)
-    tabla_setup["dist_soporte"] = tabla_setup.apply(
-        lambda r: abs(to_float(r["Precio"]) - to_float(r["Soporte Estadístico"]))
-        if to_float(r["Precio"]) is not None and to_float(r["Soporte Estadístico"]) is not None else 999999,
-        axis=1
-    )
+@st.fragment
+def seccion_resumen(codigo):
+    v = vistas_de(codigo)
+    tabla_resumen, tabla_vista = v["tabla_resumen"], v["tabla_vista"]
 
-    tabla_setup = tabla_setup.sort_values(
-        by=["prio_sem", "score_num", "riesgo_num", "dist_soporte"],
-        ascending=[True, False, True, True]
-    )
+    # ... tu código arriba ...
+    st.markdown('<div id="resumen"></div>', unsafe_allow_html=True)
+    st.subheader("📌 Resumen rápido (toca la acción para ir a su tarjeta)")
 
-    st.dataframe(
-        tabla_setup[[
-            "Ticker",
-            "Semáforo Final",
-            "Precio",
-            "Soporte Estadístico",
-            "Precio Medio",
-            "Zona Cara",
-            "Score",
-            "Semáforo ATR",
-            "Riesgo%"
-        ]],
-        use_container_width=True
-    )
+    # Renglones pre-armados por hash de fila: solo se re-arman los que cambiaron
+    orden = tabla_resumen.index
+    items = filas_resumen(tabla_vista.loc[orden], v["hashes"].loc[orden])
 
+    resumen_html = textwrap.dedent(f"""
+    <div style="
+      background-color:#ffffff;
+      padding:16px;
+      border-radius:16px;
+      border:1px solid #dcdcdc;
+      font-family:Arial;
+    ">
+
+      <script>
+        // Escribe la acción en el buscador de tarjetas y baja hasta ahí
+        {IR_A_TICKER_JS}
+      </script>
+
+      {''.join(items)}
+    </div>
+    """).strip()
 
+    components.html(resumen_html, height=600, scrolling=True)
 
 
 # ==========================
-# RESUMEN RÁPIDO SUPERIOR
+# CREA LA TABLA PARA DESCARGAR
 # ==========================
-import textwrap
-
-# ... tu código arriba ...
-st.markdown('<div id="resumen"></div>', unsafe_allow_html=True)
-st.subheader("📌 Resumen rápido (toca la acción para ir a su tarjeta)")
-
-items = []
-#for _, fila in tabla.iterrows():
-for _, fila in tabla_resumen.iterrows():
-    anchor_id = str(fila["Ticker"]).replace(".", "-")
-   
-    item_html = textwrap.dedent(f"""
-<div style="padding:8px 0; border-bottom:1px solid #eee;">
-
-🔗 <a href="javascript:void(0)"
-        onclick="goToTicker('{anchor_id}')"
-        style="text-decoration:none; font-weight:800; color:#0066ff;">
-    {fila["Ticker"]}
-  </a> 
-  
-  &nbsp; — &nbsp;
-  <span style="font-weight:800;">{fila["Semáforo Final"]}</span>
-   &nbsp; | &nbsp;
-  <span style="color:#111;">
-    💲 {fila["Precio"]} 
-    &nbsp; | &nbsp; 🧱 {fila["Soporte Estadístico"]}
-    &nbsp; | &nbsp; ⚖️ {fila["Precio Medio"]}
-    &nbsp; | &nbsp; 🏁 {fila["Zona Cara"]}
-  </span>
-  &nbsp; | &nbsp;
-  <span style="color:#666;">Score: {fila.get("Score","–")}/6</span>
-  &nbsp; — &nbsp;
-  <span style="font-weight:800;">{fila["Semáforo ATR"]}</span>
-  &nbsp; — &nbsp;
-  <span style="font-weight:800;">RIESGO {fila["Riesgo%"]}%</span>
-</div>
-""").strip()
-
-    items.append(item_html)
-
-resumen_html = textwrap.dedent(f"""
-<div style="
-  background-color:#ffffff;
-  padding:16px;
-  border-radius:16px;
-  border:1px solid #dcdcdc;
-  font-family:Arial;
-">
-
-  <script>
-    // Scroll en el documento padre (evita que abra la página dentro del resumen)
-    function goToTicker(id) {{
-      const doc = window.parent.document;
-      const el = doc.getElementById(id);
-      if (el) {{
-        el.scrollIntoView({{ behavior: "smooth", block: "start" }});
-      }}
-    }}
-  </script>
-
-  {''.join(items)}
-</div>
-""").strip()
-
-components.html(resumen_html, height=600, scrolling=True)
+@st.fragment
+def seccion_tabla(codigo):
+    v = vistas_de(codigo)
+    tabla_vista = v["tabla_vista"]
+
+    st.subheader("📊 Resultados del Análisis Técnico")
+
+    # Filtros (solo re-ejecutan esta sección)
+    col_senal, col_atr, col_buscar = st.columns([2, 2, 1])
+    senales = col_senal.multiselect("Semáforo Final", list(ORDEN_SEMAFORO), key=f"filtro_senal_{codigo}")
+    bandas = col_atr.multiselect("Semáforo ATR", [b for b in ORDEN_ATR if b], key=f"filtro_atr_{codigo}")
+    buscar = col_buscar.text_input("Ticker", key=f"filtro_ticker_{codigo}").strip().upper()
+
+    filtrada = tabla_vista
+    if senales:
+        filtrada = filtrada[filtrada["Semáforo Final"].isin(senales)]
+    if bandas:
+        filtrada = filtrada[filtrada["Semáforo ATR"].isin(bandas)]
+    if buscar:
+        filtrada = filtrada[filtrada["Ticker"].str.contains(buscar, regex=False)]
+
+    st.dataframe(filtrada, use_container_width=True)
+
+    # El CSV completo ya viene listo de vistas(); el filtrado se arma aquí
+    st.download_button(
+        label="📥 Descargar CSV",
+        data=v["csv"] if filtrada is tabla_vista else filtrada.to_csv(index=False),
+        file_name="resultados_trading.csv",
+        mime="text/csv",
+        on_click="ignore"
+    )
 
 
 # ==========================
-# CREA LA TABLA PARA DESCARGAR
+# TARJETAS (UN COMPONENTE POR PÁGINA)
 # ==========================
+# Búsqueda y paginación son widgets de este fragmento; al iframe solo
+# viajan las tarjetas de la página visible (plantillas_html.py).
+def ir_a_pagina(clave, pagina):
+    st.session_state[clave] = pagina
+
+
+@st.fragment
+def seccion_tarjetas(codigo):
+    v = vistas_de(codigo)
+    st.subheader("📊 Análisis Individual por Acción")
+
+    clave_pagina = f"tarjetas_pagina_{codigo}"
+    col_buscar, col_anterior, col_pagina, col_siguiente = st.columns([4, 1, 2, 1])
+    # Buscar otra acción regresa a la primera página
+    buscar = col_buscar.text_input(
+        BUSCAR_TICKER, placeholder="🔎 Buscar ticker...", label_visibility="collapsed",
+        key=f"tarjetas_buscar_{codigo}", on_change=ir_a_pagina, args=(clave_pagina, 0),
+    )
 
-st.subheader("📊 Resultados del Análisis Técnico")
-st.dataframe(tabla, use_container_width=True)
+    filas, pagina, paginas, total = pagina_tarjetas(
+        v["tabla_vista"], buscar, st.session_state.get(clave_pagina, 0)
+    )
+    st.session_state[clave_pagina] = pagina
 
-st.download_button(
-    label="📥 Descargar CSV",
-    data=tabla.to_csv(index=False),
-    file_name="resultados_trading.csv",
-    mime="text/csv"
-)
+    col_anterior.button("◀", key=f"tarjetas_anterior_{codigo}", disabled=pagina == 0,
+                        on_click=ir_a_pagina, args=(clave_pagina, pagina - 1), use_container_width=True)
+    col_pagina.caption(f"Página {pagina + 1} de {paginas} · {total} acciones")
+    col_siguiente.button("▶", key=f"tarjetas_siguiente_{codigo}", disabled=pagina >= paginas - 1,
+                         on_click=ir_a_pagina, args=(clave_pagina, pagina + 1), use_container_width=True)
 
-import streamlit.components.v1 as components
+    if filas.empty:
+        st.info("Sin acciones con ese ticker.")
+        return
 
-# ==========================
-# TARJETAS HTML SIN RESTRICCIÓN
-# ==========================
-st.subheader("📊 Análisis Individual por Acción")
-
-# for _, fila in tabla.iterrows():
-#Agregue este 
-for _, fila in tabla.iterrows():
-    anchor_id = str(fila["Ticker"]).replace(".", "-")
-    st.markdown(
-        f'<div id="{anchor_id}" style="position:relative; top:-80px;"></div>',
-        unsafe_allow_html=True
+    components.html(
+        componente_tarjetas(filas, v["razones"], v["hashes"]),
+        height=alto_tarjetas(len(filas)),
     )
 
-  
-    
-    # Color del MACD (basado en números, no en texto)
-    macd_val = float(fila["MACD"])
-    signal_val = float(fila["Signal"])
-    macd_color = "🟢" if macd_val > signal_val else "🔴"
-
-   # RSI semáforo por acción (🟢 comprar | 🟡 esperar | 🔴 vender)
-    rsi_val = float(fila["RSI"])
-    if rsi_val < 30:
-        rsi_estado = "Sobreventa"
-        rsi_color = "🟢"   # Comprar
-    elif rsi_val <= 70:
-        rsi_estado = "Normal"
-        rsi_color = "🟡"   # Esperar
-    else:
-        rsi_estado = "Sobrecompra"
-        rsi_color = "🔴"   # Vender
-
-        # ===== Semáforo EMAs =====
-    tendencia = str(fila["Tendencia"])          # "Alcista" o "Bajista"
-    precio_ema50 = str(fila["Precio EMA50"])    # "Arriba" o "Debajo"
-
-    ema_trend_color = "🟢" if tendencia == "Alcista" else "🔴"
-    precio_ema50_color = "🟢" if precio_ema50 == "Arriba" else "🔴"
-
-    ema50_val = float(fila["EMA50"])
-    ema200_val = float(fila["EMA200"])
-
-    # ===== Semáforo Bollinger (acción) =====
-    boll_estado = str(fila["Bollinger Señal"])  # "Sobreventa", "Normal", "Sobrecompra"
-
-    if boll_estado == "Sobreventa":
-        boll_color = "🟢"   # Comprar
-    elif boll_estado == "Normal":
-        boll_color = "🟡"   # Esperar
-    else:  # "Sobrecompra"
-        boll_color = "🔴"   # Vender
-
-        # ===== Semáforo KDJ =====
-    K_val = float(fila["K"])
-    D_val = float(fila["D"])
-
-    if K_val > D_val:
-        kdj_estado = "Alcista"
-        kdj_color = "🟢"   # Comprar
-    elif abs(K_val - D_val) < 1:
-        kdj_estado = "Neutral"
-        kdj_color = "🟡"   # Esperar
-    else:
-        kdj_estado = "Bajista"
-        kdj_color = "🔴"   # Vender
-
-    # ==========================
-    # SEMÁFORO FINAL (SCORING)
-    # ==========================
-    score = 0
-    razones = []
-
-    # --- MACD ---
-    macd_val = float(fila["MACD"])
-    signal_val = float(fila["Signal"])
-    if macd_val > signal_val:
-        score += 1
-        razones.append("MACD alcista")
-    else:
-        score -= 1
-        razones.append("MACD bajista")
-
-    # --- RSI ---
-    rsi_val = float(fila["RSI"])
-    if rsi_val < 30:
-        score += 1
-        razones.append("RSI sobreventa (<30)")
-    elif rsi_val > 70:
-        score -= 1
-        razones.append("RSI sobrecompra (>70)")
-    else:
-        razones.append("RSI normal (30–70)")
-
-    # --- Bollinger ---
-    boll_estado = str(fila["Bollinger Señal"])
-    if boll_estado == "Sobreventa":
-        score += 1
-        razones.append("Bollinger sobreventa")
-    elif boll_estado == "Sobrecompra":
-        score -= 1
-        razones.append("Bollinger sobrecompra")
-    else:
-        razones.append("Bollinger normal")
-
-    # --- Tendencia (EMA50 vs EMA200) ---
-    tendencia = str(fila["Tendencia"])
-    if tendencia == "Alcista":
-        score += 1
-        razones.append("Tendencia alcista (EMA50>EMA200)")
-    else:
-        score -= 1
-        razones.append("Tendencia bajista (EMA50<EMA200)")
-
-    # --- Precio vs EMA50 (timing) ---
-    precio_ema50 = str(fila["Precio EMA50"])
-    if precio_ema50 == "Arriba":
-        score += 1
-        razones.append("Precio arriba EMA50")
-    else:
-        score -= 1
-        razones.append("Precio debajo EMA50")
-
-    # --- KDJ ---
-    K_val = float(fila["K"])
-    D_val = float(fila["D"])
-    if K_val > D_val:
-        score += 1
-        razones.append("KDJ alcista (K>D)")
-    else:
-        score -= 1
-        razones.append("KDJ bajista (K<D)")
-
-    # --- Interpretación del score ---
-    if score >= 4:
-        semaforo_final = "🟢 COMPRA FUERTE"
-    elif score >= 2:
-        semaforo_final = "🟢 POSIBLE COMPRA"
-    elif score <= -4:
-        semaforo_final = "🔴 VENTA FUERTE"
-    elif score <= -2:
-        semaforo_final = "🔴 POSIBLE VENTA"
-    else:
-        semaforo_final = "🟡 ESPERAR"
 
-    # Explicación corta (top 4 razones)
-    explicacion_score = " | ".join(razones[:4]) + (" | ..." if len(razones) > 4 else "")
-
-    
-    html = f"""
-    <div style="
-    background-color:#ffffff;
-    padding:25px;
-    border-radius:20px;
-    margin-bottom:25px;
-    border:1px solid #cccccc;
-    font-family:Arial;
-
-#    max-height: 820px;
-#    overflow-y: auto;
-#    -webkit-overflow-scrolling: touch;
-">
-
-
-        <h2 style="margin:0; font-size:26px;">
-            📌 <strong>{fila['Ticker']}</strong> —
-            <span style="color:#0066ff;">{fila['Señal Final']}</span>
-        </h2>
-
-        <p style="font-size:18px; margin-top:10px;">
-            💲 <strong>Precio actual:</strong> {fila['Precio']}
-        </p>
-
-        <h3 style="margin-top:20px;">🚦 Semáforo Final (Score)</h3>
-        <p style="font-size:17px;">
-            <strong>{semaforo_final}</strong><br>
-            <strong>Score:</strong> {score} / 6<br>
-            <small>{explicacion_score}</small>
-        </p>
-
-        <h3 style="margin-top:20px;">🎯 Gestión de riesgo (ATR)</h3>
-        <p style="font-size:17px;">
-            <strong>{fila["Semáforo ATR"]}</strong><br>    
-            <strong>ATR(14):</strong> {fila.get('ATR14','')} &nbsp; | &nbsp;
-            <strong>ATR%:</strong> {fila.get('ATR%','')}%<br>
-            <strong>Tipo de Stop:</strong> {fila.get('Tipo Stop','—')}<br>
-            <strong>Stop sugerido:</strong> {fila.get('Stop Sugerido','')}<br>
-            <strong>TP1:</strong> {fila.get('TP1','')} &nbsp; | &nbsp;
-            <strong>TP2:</strong> {fila.get('TP2','')}<br>
-            <strong>Riesgo%:</strong> {fila.get('Riesgo%','')}%
-        </p>
-
-
-        <h3 style="margin-top:20px;">📉 MACD</h3>
-        <p style="font-size:17px;">
-        {macd_color} <strong>{fila['MACD Señal']}</strong><br>
-        <strong>MACD:</strong> {fila['MACD']}<br>
-        <strong>Signal:</strong> {fila['Signal']}
-        </p>
-
-        <h3 style="margin-top:20px;">📊 RSI (14)</h3>
-        <p style="font-size:17px;">
-        {rsi_color} <strong>{rsi_estado}</strong><br>
-         RSI: {rsi_val:.2f}<br>
-        Rangos: Sobreventa &lt; 30 | Normal 30–70 | Sobrecompra &gt; 70
-        </p>
-
-        <h3 style="margin-top:20px;">📉 Bollinger (Volatilidad)</h3>
-        <p style="font-size:17px;">
-            {boll_color} <strong>Estado:</strong> {boll_estado}<br>
-            <strong>Banda Superior:</strong> {fila['Banda Superior']}<br>
-            <strong>Banda Inferior:</strong> {fila['Banda Inferior']}<br>
-            <small>
-                Interpretación: 🟢 precio bajo banda inferior (zona compra) |
-                🟡 dentro del canal (esperar) |
-                🔴 sobre banda superior (zona venta)
-            </small>
-        </p>
-
-        <h3 style="margin-top:20px;">📊 KDJ (Momentum)</h3>
-        <p style="font-size:17px;">
-            {kdj_color} <strong>{kdj_estado}</strong><br>
-            <strong>K:</strong> {fila['K']}<br>
-            <strong>D:</strong> {fila['D']}<br>
-            <strong>J:</strong> {fila['J']}<br>
-            <small>
-                Interpretación: 🟢 K&gt;D (impulso alcista) |
-                🟡 K≈D (sin dirección) |
-                🔴 K&lt;D (impulso bajista)
-            </small>
-        </p>
-
-    
-        <h3 style="margin-top:20px;">📈 Tendencia (EMAs)</h3>
-        <p style="font-size:17px;">
-            {ema_trend_color} <strong>EMA50 vs EMA200:</strong> {tendencia}<br>
-            <strong>EMA50:</strong> {ema50_val:.2f}<br>
-            <strong>EMA200:</strong> {ema200_val:.2f}
-        </p>
-
-        <h3 style="margin-top:15px;">⏱️ Reacción (Precio vs EMA50)</h3>
-        <p style="font-size:17px;">
-            {precio_ema50_color} <strong>Precio vs EMA50:</strong> {precio_ema50}
-        </p>
-
-        
-    </div>
-    """
+seccion_setup(codigo)
+seccion_resumen(codigo)
+seccion_tabla(codigo)
+seccion_tarjetas(codigo)
 
-    components.html(html, height=1280)
 components.html(
 """
 <script>
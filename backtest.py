@@ -0,0 +1,277 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ============================================================
+#        BACKTEST VECTORIZADO (SEÑAL + STOP/TP POR ATR)
+# ============================================================
+# Mismas reglas que analizar_con_data, evaluadas en TODAS las fechas:
+#   - COMPRA FUERTE  -> stop a 2.0 ATR
+#   - POSIBLE COMPRA -> stop a 1.5 ATR
+#   - TP1 = 1R, TP2 = 2R (R = precio - stop)
+# Se entra al cierre del primer día de la señal de compra y se sale en
+# el stop, en el objetivo, o al cierre después de 'horizonte' velas.
+# Una sola posición por ticker: una racha de compra que empieza mientras
+# la operación anterior sigue abierta no abre otra (no hay traslapes, así
+# el resumen no cuenta más exposición de la que hubo).
+# Si el stop y el objetivo caen en la misma vela se cuenta el stop
+# (supuesto conservador: con velas diarias no se sabe cuál fue primero).
+
+HORIZONTE = 20          # velas máximas por operación
+OBJETIVO_R = 2.0        # 1.0 = TP1, 2.0 = TP2
+VENTANA_PERCENTILES = 504  # ~2y de velas, como el soporte estadístico
+
+
+def series_indicadores(data, percentiles=False):
+    """
+    Serie completa (no solo el último valor) de cada indicador de
+    analizar_con_data. Regresa un DataFrame indexado por fecha.
+    """
+    data = data.dropna()
+    close = data["Close"].astype(float)
+    high = data["High"].astype(float)
+    low = data["Low"].astype(float)
+
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema12 - ema26
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    mid = close.rolling(20).mean()
+    std = close.rolling(20).std()
+
+    low_min = low.rolling(14).min()
+    high_max = high.rolling(14).max()
+    rsv = ((close - low_min) / (high_max - low_min)) * 100
+    K = (2 / 3) * 50 + (1 / 3) * rsv
+    D = (2 / 3) * 50 + (1 / 3) * K
+
+    delta = close.diff()
+    gain = delta.clip(lower=0).rolling(14).mean()
+    loss = -delta.clip(upper=0).rolling(14).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+
+    prev_close = close.shift(1)
+    tr = pd.concat([
+        (high - low),
+        (high - prev_close).abs(),
+        (low - prev_close).abs()
+    ], axis=1).max(axis=1)
+    atr = tr.rolling(14).mean()
+
+    ind = pd.DataFrame({
+        "precio": close,
+        "high": high,
+        "low": low,
+        "macd": macd,
+        "signal": signal,
+        "upper": mid + 2 * std,
+        "lower": mid - 2 * std,
+        "K": K,
+        "D": D,
+        "rsi": rsi,
+        "ema50": close.ewm(span=50, adjust=False).mean(),
+        "ema200": close.ewm(span=200, adjust=False).mean(),
+        "atr": atr,
+    })
+
+    if percentiles:
+        ventana = close.rolling(VENTANA_PERCENTILES, min_periods=50)
+        ind["p20"] = ventana.quantile(0.20)
+        ind["p50"] = ventana.quantile(0.50)
+        ind["p80"] = ventana.quantile(0.80)
+
+    return ind
+
+
+def señales_compra(ind, rsi_compra_fuerte=35, rsi_sobrecompra=70):
+    """
+    Señal Final de analizar_con_data por fecha.
+    Regresa (compra_fuerte, posible_compra) como arrays booleanos.
+    Son señales por día, no operaciones: en una racha de compra hay una
+    señal cada día; backtest_ticker entra solo el primer día de la racha
+    y sin traslapar operaciones (ver sin_traslape).
+    """
+    precio = ind["precio"].to_numpy()
+    macd = ind["macd"].to_numpy()
+    signal = ind["signal"].to_numpy()
+    tendencia_alcista = ind["ema50"].to_numpy() > ind["ema200"].to_numpy()
+
+    compra_fuerte = (
+        (macd > signal) & (ind["rsi"].to_numpy() < rsi_compra_fuerte)
+        & (precio < ind["lower"].to_numpy()) & tendencia_alcista
+    )
+    venta_fuerte = (
+        (macd < signal) & (ind["rsi"].to_numpy() > rsi_sobrecompra)
+        & (precio > ind["upper"].to_numpy()) & ~tendencia_alcista
+    )
+    posible_compra = (
+        ~compra_fuerte & ~venta_fuerte
+        & ((macd > signal) | (ind["K"].to_numpy() > ind["D"].to_numpy()))
+    )
+    return compra_fuerte, posible_compra
+
+
+def resultados_operaciones(precio, high, low, atr, mult,
+                           objetivo_r=OBJETIVO_R, horizonte=HORIZONTE):
+    """
+    Resultado en R de entrar en CADA fecha (sin loop por día).
+    Regresa dict de arrays del largo de 'precio':
+      r        -> ganancia/pérdida en múltiplos del riesgo (NaN si no cerró)
+      velas    -> velas hasta la salida
+      salida   -> 1 = objetivo, -1 = stop, 0 = tiempo, NaN = sin datos suficientes
+      tocó_tp1 -> llegó a 1R antes que al stop
+    """
+    n = len(precio)
+    riesgo = mult * atr
+    stop = precio - riesgo
+    objetivo = precio + objetivo_r * riesgo
+    tp1 = precio + riesgo
+
+    # Ventanas de las 'horizonte' velas siguientes (relleno NaN al final)
+    relleno = np.full(horizonte, np.nan)
+    fut_high = sliding_window_view(np.concatenate([high[1:], relleno, [np.nan]]), horizonte)[:n]
+    fut_low = sliding_window_view(np.concatenate([low[1:], relleno, [np.nan]]), horizonte)[:n]
+    fut_close = np.concatenate([precio[1:], relleno, [np.nan]])[horizonte - 1:horizonte - 1 + n]
+
+    with np.errstate(invalid="ignore"):
+        toca_stop = fut_low <= stop[:, None]
+        toca_obj = fut_high >= objetivo[:, None]
+        toca_tp1 = fut_high >= tp1[:, None]
+
+    def primera(m):
+        return np.where(m.any(axis=1), m.argmax(axis=1), horizonte)
+
+    k_stop = primera(toca_stop)
+    k_obj = primera(toca_obj)
+    k_tp1 = primera(toca_tp1)
+
+    completa = ~np.isnan(fut_close)
+    por_stop = (k_stop < horizonte) & (k_stop <= k_obj)
+    por_obj = (k_obj < horizonte) & (k_obj < k_stop)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r_tiempo = (fut_close - precio) / riesgo
+
+    r = np.where(por_stop, -1.0, np.where(por_obj, objetivo_r, r_tiempo))
+    salida = np.where(por_stop, -1.0, np.where(por_obj, 1.0, 0.0))
+    velas = np.where(por_stop, k_stop + 1, np.where(por_obj, k_obj + 1, horizonte))
+
+    # Sin suficientes velas y sin haber tocado stop/objetivo: sigue abierta
+    abierta = ~(por_stop | por_obj) & ~completa
+    invalida = np.isnan(riesgo) | (riesgo <= 0)
+    r = np.where(abierta | invalida, np.nan, r)
+    salida = np.where(abierta | invalida, np.nan, salida)
+
+    return {
+        "r": r,
+        "velas": velas,
+        "salida": salida,
+        "tocó_tp1": (k_tp1 < k_stop) & (k_tp1 < horizonte),
+    }
+
+
+def sin_traslape(candidatas, velas):
+    """
+    De las fechas candidatas (índices en orden) se queda con las que no
+    caen dentro de una operación abierta: la siguiente entrada tiene que
+    ser después de la vela de salida de la anterior. El loop es sobre las
+    entradas (pocas), no sobre los días.
+    """
+    elegidas = []
+    salida = -1
+    for i in candidatas:
+        if i > salida:
+            elegidas.append(i)
+            salida = i + int(velas[i])
+    return np.array(elegidas, dtype=np.int64)
+
+
+def max_drawdown(r):
+    """Máxima caída (en R) de la curva acumulada de resultados."""
+    if len(r) == 0:
+        return 0.0
+    curva = np.concatenate([[0.0], np.cumsum(r)])
+    return float((np.maximum.accumulate(curva) - curva).max())
+
+
+def resumen(operaciones):
+    """Hit rate, expectancy (R promedio) y drawdown de un conjunto de operaciones."""
+    ops = operaciones.dropna(subset=["r"]).sort_values("fecha")
+    r = ops["r"].to_numpy()
+
+    if len(r) == 0:
+        return {"operaciones": 0, "hit_rate": np.nan, "expectancy": np.nan,
+                "r_total": 0.0, "max_drawdown": 0.0, "hit_tp1": np.nan}
+
+    return {
+        "operaciones": int(len(r)),
+        "hit_rate": float((r > 0).mean()),
+        "expectancy": float(r.mean()),
+        "r_total": float(r.sum()),
+        "max_drawdown": max_drawdown(r),
+        "hit_tp1": float(ops["tocó_tp1"].mean()),
+    }
+
+
+def backtest_ticker(ticker, data, objetivo_r=OBJETIVO_R, horizonte=HORIZONTE):
+    """Operaciones (una fila por entrada) de un ticker."""
+    if data is None or data.empty:
+        return pd.DataFrame()
+
+    ind = series_indicadores(data)
+    if ind.empty:
+        return pd.DataFrame()
+
+    compra_fuerte, posible_compra = señales_compra(ind)
+    compra = compra_fuerte | posible_compra
+    mult = np.where(compra_fuerte, 2.0, 1.5)
+
+    res = resultados_operaciones(
+        ind["precio"].to_numpy(), ind["high"].to_numpy(), ind["low"].to_numpy(),
+        ind["atr"].to_numpy(), mult, objetivo_r=objetivo_r, horizonte=horizonte,
+    )
+
+    # Entrada solo el primer día de cada racha de compra, y solo si no hay
+    # una operación abierta (una posición por ticker)
+    inicio_racha = compra & ~np.concatenate([[False], compra[:-1]])
+    entrada = sin_traslape(np.flatnonzero(inicio_racha), res["velas"])
+
+    return pd.DataFrame({
+        "ticker": ticker,
+        "fecha": ind.index[entrada],
+        "tipo": np.where(compra_fuerte[entrada], "COMPRA FUERTE", "POSIBLE COMPRA"),
+        "precio": ind["precio"].to_numpy()[entrada],
+        "r": res["r"][entrada],
+        "velas": res["velas"][entrada],
+        "salida": res["salida"][entrada],
+        "tocó_tp1": res["tocó_tp1"][entrada],
+    })
+
+
+def backtest_universo(panel, tickers, objetivo_r=OBJETIVO_R, horizonte=HORIZONTE):
+    """
+    Corre el backtest de todos los tickers del panel.
+    Regresa (operaciones, tabla_por_ticker, resumen_universo).
+    """
+    disponibles = set(panel.columns.get_level_values(0)) if isinstance(panel.columns, pd.MultiIndex) else set()
+
+    todas = []
+    filas = []
+    for t in tickers:
+        if t not in disponibles:
+            continue
+        ops = backtest_ticker(t, panel[t], objetivo_r=objetivo_r, horizonte=horizonte)
+        if ops.empty:
+            continue
+        todas.append(ops)
+        filas.append({"ticker": t, **resumen(ops)})
+
+    operaciones = pd.concat(todas, ignore_index=True) if todas else pd.DataFrame(
+        columns=["ticker", "fecha", "tipo", "precio", "r", "velas", "salida", "tocó_tp1"]
+    )
+    por_ticker = pd.DataFrame(filas)
+    if not por_ticker.empty:
+        por_ticker = por_ticker.sort_values("expectancy", ascending=False).reset_index(drop=True)
+
+    return operaciones, por_ticker, resumen(operaciones)
@@ -1,33 +1,45 @@
 import warnings
 warnings.filterwarnings("ignore")
 
-import yfinance as yf
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-from datetime import datetime
+
+from cache_ohlcv import descargar_incremental
+from proveedores import get_proveedor
+from registros import armar_registro
 
 # ============================================================
 #              DESCARGA BATCH (TODOS LOS TICKERS)
 # ============================================================
-def descargar_batch(tickers, period="2y", interval="1d"):
+def descargar_batch(tickers, period="2y", interval="1d", usar_cache=True, proveedor=None):
     """
     Descarga en una sola llamada los datos de todos los tickers.
     Regresa un DataFrame con columnas MultiIndex:
       nivel 0 = Ticker
       nivel 1 = Open/High/Low/Close/Adj Close/Volume
+
+    Con usar_cache=True primero se lee el cache local en Parquet
+    (ver cache_ohlcv.py) y solo se descarga lo que falta de cada ticker.
+
+    La fuente sale de 'proveedor' o, si no se pasa, del proveedor global
+    (proveedores.py: Yahoo por default, local/sintético para correr sin red).
     """
     if not tickers:
         return pd.DataFrame()
 
-    data = yf.download(
-        tickers=" ".join(tickers),
-        period=period,
-        interval=interval,
-        group_by="ticker",
-        threads=True,
-        auto_adjust=False
-    )
+    proveedor = proveedor or get_proveedor()
+
+    if usar_cache and proveedor.cacheable:
+        return descargar_incremental(
+            tickers, proveedor.descargar, period=period, interval=interval
+        )
 
-    return data
+    return proveedor.descargar(tickers, period=period, interval=interval)
     
 # ============================================================
 #                    MACD MANUAL
@@ -107,10 +119,138 @@ def atr_manual(high, low, close, period=14):
     atr = tr.rolling(period).mean()  # simple (rápido). Si quieres Wilder luego lo cambiamos.
     return float(atr.iloc[-1])
 
+# ============================================================
+#          MODO ACOTADO (SOLO LAS VELAS NECESARIAS)
+# ============================================================
+# Las ventanas de 14/20 solo necesitan las últimas 15-20 velas. Las EMAs
+# (adjust=False) dependen de toda la historia, pero el peso del arranque
+# decae como (1-alfa)^n: con n velas el error contra la EMA de toda la
+# historia queda acotado por (1-alfa)^(n-1) * (máx - mín del precio).
+# 'tolerancia_ema' es el error máximo que aceptamos como fracción del
+# PRECIO: cada ticker usa las velas que le pide su rango/precio. Con el
+# default (1% del precio) y un rango del tamaño del precio la EMA200 pide
+# ~460 velas, menos que las ~504 de la descarga de 2y; con rangos más
+# chicos, bastante menos.
+TOLERANCIA_EMA = 1e-2
+
+# Tickers con percentiles precalculados (LRU)
+PERCENTILES_MAX = int(os.environ.get("PERCENTILES_MAX", "5000"))
+
+
+def lookback_ema(span, tolerancia=TOLERANCIA_EMA):
+    """Velas mínimas para que (1-alfa)^(n-1) <= tolerancia (fracción del rango)."""
+    alfa = 2 / (span + 1)
+    return int(math.ceil(math.log(tolerancia) / math.log(1 - alfa))) + 1
+
+
+def lookback_macd(tolerancia=TOLERANCIA_EMA):
+    """
+    El Signal es una EMA(9) del MACD, que a su vez arrastra el error de
+    la EMA(26). Se parte la ventana en dos mitades de h velas:
+      error <= 2 * rango * ((1-a26)^h + (1-a9)^h)
+    """
+    h = lookback_ema(26, tolerancia / 4) - 1
+    return 2 * h + 1
+
+
+def cota_ema(span, n, rango):
+    alfa = 2 / (span + 1)
+    return (1 - alfa) ** (n - 1) * rango
+
+
+def cota_macd(n, rango):
+    h = (n - 1) // 2
+    return 2 * rango * ((1 - 2 / 27) ** h + (1 - 2 / 10) ** h)
+
+
+def tolerancia_rango(tolerancia, precio, rango):
+    """Tolerancia en % del precio -> fracción del rango (máx 1: sin rango no hay error)."""
+    if not rango or rango <= 0:
+        return 1.0
+    return min(1.0, tolerancia * precio / rango)
+
+
+def lookback_minimo(tolerancia=TOLERANCIA_EMA, rango_rel=1.0):
+    """
+    Velas que necesita el modo acotado para todos los indicadores salvo
+    percentiles, para un ticker cuyo rango (máx - mín) es rango_rel veces
+    su precio.
+    """
+    t = tolerancia_rango(tolerancia, 1.0, rango_rel)
+    return max(20, 15, lookback_macd(t), *(lookback_ema(s, t) for s in (20, 50, 200)))
+
+
+def _ema_ultimo(close, span):
+    return float(close.ewm(span=span, adjust=False).mean().iloc[-1])
+
+
+# Percentiles precalculados: por ticker se guardan los closes ordenados
+# (sin la última vela) y el mín/máx. Mientras no llegue una vela nueva
+# solo se inserta el último close con búsqueda binaria: O(log n). Una
+# vela nueva cambia la clave y reemplaza la entrada del ticker; a lo más
+# se guardan PERCENTILES_MAX tickers (se saca el usado hace más tiempo).
+_PERCENTILES = OrderedDict()
+_percentiles_lock = threading.Lock()
+
+
+def percentiles_precalculados(ticker, close):
+    """
+    Regresa (p20, p50, p80, minimo, maximo) de toda la serie 'close',
+    reutilizando la estructura ordenada si la historia no cambió.
+    """
+    n = len(close)
+    clave = (close.index[0], close.index[-2] if n > 1 else None, n)
+
+    with _percentiles_lock:
+        guardado = _PERCENTILES.get(ticker)
+        if guardado is not None:
+            _PERCENTILES.move_to_end(ticker)
+    if guardado is None or guardado[0] != clave:
+        previos = close.to_numpy(dtype=float)[:-1]
+        ordenados = np.sort(previos)
+        minimo = float(ordenados[0]) if n > 1 else float("inf")
+        maximo = float(ordenados[-1]) if n > 1 else float("-inf")
+        guardado = (clave, ordenados, minimo, maximo)
+        with _percentiles_lock:
+            _PERCENTILES[ticker] = guardado
+            _PERCENTILES.move_to_end(ticker)
+            while len(_PERCENTILES) > PERCENTILES_MAX:
+                _PERCENTILES.popitem(last=False)
+
+    _, ordenados, minimo, maximo = guardado
+    x = float(close.iloc[-1])
+    p = int(np.searchsorted(ordenados, x, side="left"))
+
+    def en(k):
+        if k < p:
+            return float(ordenados[k])
+        if k == p:
+            return x
+        return float(ordenados[k - 1])
+
+    salida = []
+    for q in (0.20, 0.50, 0.80):
+        pos = q * (n - 1)
+        k = int(math.floor(pos))
+        frac = pos - k
+        abajo = en(k)
+        salida.append(abajo if frac == 0 else abajo + (en(k + 1) - abajo) * frac)
+
+    return salida[0], salida[1], salida[2], min(minimo, x), max(maximo, x)
+
+
 # ============================================================
 #        ANALIZAR UNA ACCIÓN (USANDO DATA YA DESCARGADA)
 # ============================================================
-def analizar_con_data(ticker, data):
+def analizar_con_data(ticker, data, acotado=False, tolerancia_ema=TOLERANCIA_EMA):
+    """
+    acotado=False: cálculo original sobre toda la historia.
+    acotado=True : cada indicador solo ve las velas que necesita (ver
+    MODO ACOTADO) y los percentiles salen de la estructura precalculada.
+    El registro trae además "Cota Error EMA%": el peor error posible de
+    las EMAs/MACD contra la historia completa, en % del precio (nunca
+    más de tolerancia_ema * 100).
+    """
 
     if data is None or data.empty:
         return None
@@ -136,6 +276,9 @@ def analizar_con_data(ticker, data):
 
     precio = float(close.dropna().iloc[-1])
 
+    if acotado:
+        return _analizar_acotado(ticker, precio, close, high, low, tolerancia_ema)
+
     # -------- INDICADORES --------
     macd, signal = macd_manual(close)
     upper, lower = bollinger_manual(close)
@@ -146,7 +289,6 @@ def analizar_con_data(ticker, data):
     atr14 = atr_manual(high, low, close, period=14)
     if pd.isna(atr14) or atr14 <= 0:
         return None
-    atr_pct = (atr14 / precio) * 100 if precio else 0
 
     # -------- SOPORTE ESTADÍSTICO (Percentiles 2y) --------
     serie_precios = close.dropna()
@@ -160,109 +302,107 @@ def analizar_con_data(ticker, data):
         precio_medio = None
         zona_cara = None
 
+    return armar_resultado(
+        ticker, precio,
+        macd, signal, upper, lower, K, D, J, rsi,
+        ema20, ema50, ema200, atr14,
+        soporte_est, precio_medio, zona_cara,
+    )
 
-    # -------- ESTADOS --------
-    macd_estado = "Alcista" if macd > signal else "Bajista"
-    kdj_estado = "Alcista" if K > D else "Bajista"
 
-    if precio < lower:
-        bollinger_estado = "Sobreventa"
-    elif precio > upper:
-        bollinger_estado = "Sobrecompra"
-    else:
-        bollinger_estado = "Normal"
+def _analizar_acotado(ticker, precio, close, high, low, tolerancia_ema):
+    # -------- PERCENTILES (estructura precalculada) --------
+    # Van primero: el mín/máx de la historia decide cuántas velas piden las EMAs
+    p20, p50, p80, minimo, maximo = percentiles_precalculados(ticker, close)
+    rango = maximo - minimo
+    tolerancia = tolerancia_rango(tolerancia_ema, precio, rango)
 
-    if rsi < 30:
-        rsi_estado = "Sobreventa"
-    elif rsi > 70:
-        rsi_estado = "Sobrecompra"
-    else:
-        rsi_estado = "Normal"
-
-    tendencia = "Alcista" if ema50 > ema200 else "Bajista"
-    precio_ema50 = "Arriba" if precio > ema50 else "Debajo"
-
-    # -------- SEÑAL FINAL --------
-    if macd > signal and rsi < 35 and precio < lower and tendencia == "Alcista":
-        señal = "COMPRA FUERTE"
-    elif macd < signal and rsi > 70 and precio > upper and tendencia == "Bajista":
-        señal = "VENTA FUERTE"
-    elif macd > signal or K > D:
-        señal = "POSIBLE COMPRA"
-    elif macd < signal or K < D:
-        señal = "POSIBLE VENTA"
-    else:
-        señal = "ESPERAR"
-
-    # Stop/TP sugeridos SOLO para compras
-    if señal in ["COMPRA FUERTE", "POSIBLE COMPRA"]:
-        mult = 2.0 if señal == "COMPRA FUERTE" else 1.5
-        tipo_stop = "Conservador (2 ATR)" if mult == 2.0 else "Agresivo (1.5 ATR)"
-        stop_sugerido = precio - (mult * atr14)
-        riesgo = precio - stop_sugerido
-        tp1 = precio + (1.0 * riesgo)
-        tp2 = precio + (2.0 * riesgo)
-        riesgo_pct = (riesgo / precio) * 100 if precio else 0
+    n_macd = lookback_macd(tolerancia)
+    n_emas = {s: lookback_ema(s, tolerancia) for s in (20, 50, 200)}
+
+    # -------- INDICADORES (solo la cola necesaria) --------
+    macd, signal = macd_manual(close.iloc[-n_macd:])
+    upper, lower = bollinger_manual(close.iloc[-20:])
+    K, D, J = kdj_manual(high.iloc[-14:], low.iloc[-14:], close.iloc[-14:])
+    rsi = rsi_manual(close.iloc[-15:])
+    ema20, ema50, ema200 = (_ema_ultimo(close.iloc[-n_emas[s]:], s) for s in (20, 50, 200))
+
+    atr14 = atr_manual(high.iloc[-15:], low.iloc[-15:], close.iloc[-15:], period=14)
+    if pd.isna(atr14) or atr14 <= 0:
+        return None
+
+    if len(close) >= 50:
+        soporte_est, precio_medio, zona_cara = p20, p50, p80
     else:
-        tipo_stop = "—"
-        stop_sugerido = None
-        tp1 = None
-        tp2 = None
-        riesgo_pct = None
+        soporte_est = precio_medio = zona_cara = None
+
+    # -------- COTA DE ERROR vs HISTORIA COMPLETA --------
+    # Si la serie es más corta que el lookback se usó completa: error 0
+    n = len(close)
+    cotas = [cota_macd(n_macd, rango) if n > n_macd else 0.0]
+    cotas += [cota_ema(s, n_emas[s], rango) if n > n_emas[s] else 0.0 for s in n_emas]
+    cota_pct = (max(cotas) / precio) * 100 if precio else 0
+
+    r = armar_resultado(
+        ticker, precio,
+        macd, signal, upper, lower, K, D, J, rsi,
+        ema20, ema50, ema200, atr14,
+        soporte_est, precio_medio, zona_cara,
+    )
+    r["Cota Error EMA%"] = round(cota_pct, 4)
+    r["Velas EMA200"] = min(n, n_emas[200])
+    return r
 
+
+def verificar_acotado(ticker, data, tolerancia_ema=TOLERANCIA_EMA):
+    """
+    Compara el modo acotado contra la historia completa para un ticker.
+    Regresa el peor error medido de EMAs/MACD/Signal (en % del precio),
+    la cota reportada y las velas que usó la EMA200; el error medido
+    nunca debe pasar de la cota. 'iguales_resto' dice si el resto del
+    registro coincide (Tendencia / Precio EMA50 pueden voltearse cuando
+    las EMAs están a menos de la cota una de otra).
+    """
+    completo = analizar_con_data(ticker, data)
+    acotado = analizar_con_data(ticker, data, acotado=True, tolerancia_ema=tolerancia_ema)
+    if completo is None or acotado is None:
+        return None
+    precio = completo["Precio"]
+    campos = ("MACD", "Signal", "EMA20", "EMA50", "EMA200")
+    error = max(abs(float(acotado[c]) - float(completo[c])) for c in campos) / precio * 100
     return {
-        "Fecha": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "Ticker": ticker,
-        "Precio": round(precio, 2),
-
-        "MACD": round(macd, 4),
-        "Signal": round(signal, 4),
-        "MACD Señal": macd_estado,
-
-        "Banda Superior": round(upper, 2),
-        "Banda Inferior": round(lower, 2),
-        "Bollinger Señal": bollinger_estado,
-
-        "K": round(K, 2),
-        "D": round(D, 2),
-        "J": round(J, 2),
-        "KDJ Señal": kdj_estado,
-
-        "RSI": round(rsi, 2),
-        "RSI Estado": rsi_estado,
-
-        "EMA20": round(ema20, 2),
-        "EMA50": round(ema50, 2),
-        "EMA200": round(ema200, 2),
-
-        "Tendencia": tendencia,
-        "Precio EMA50": precio_ema50,
-
-        "Señal Final": señal,
-
-        "Soporte Estadístico": (round(soporte_est, 2) if soporte_est is not None else ""),
-        "Precio Medio": (round(precio_medio, 2) if precio_medio is not None else ""),
-        "Zona Cara": (round(zona_cara, 2) if zona_cara is not None else ""),
-
-        "ATR14": round(float(atr14), 4),
-        "ATR%": round(float(atr_pct), 2),
-        "Tipo Stop": tipo_stop,
-        "Stop Sugerido": (round(stop_sugerido, 2) if stop_sugerido is not None else ""),
-        "TP1": (round(tp1, 2) if tp1 is not None else ""),
-        "TP2": (round(tp2, 2) if tp2 is not None else ""),
-        "Riesgo%": (round(riesgo_pct, 2) if riesgo_pct is not None else ""),
-
-        "Explicación": (
-            f"MACD: {macd_estado} | "
-            f"KDJ: {kdj_estado} | "
-            f"Bollinger: {bollinger_estado} | "
-            f"RSI: {rsi_estado} | "
-            f"Tendencia (EMA50/EMA200): {tendencia} | "
-            f"Precio vs EMA50: {precio_ema50}"
-        )
+        "error_pct": error,
+        "cota_pct": acotado["Cota Error EMA%"],
+        "velas_ema200": acotado["Velas EMA200"],
+        "velas": len(data.dropna()),
+        "iguales_resto": all(
+            acotado[c] == completo[c] for c in completo if c not in campos and c != "Fecha"
+        ),
     }
 
 
+# ============================================================
+#     ARMAR EL REGISTRO (ESTADOS + SEÑAL + STOP/TP)
+# ============================================================
+def armar_resultado(ticker, precio,
+                    macd, signal, upper, lower, K, D, J, rsi,
+                    ema20, ema50, ema200, atr14,
+                    soporte_est, precio_medio, zona_cara,
+                    fecha=None):
+    """
+    Recibe los valores finales de los indicadores y arma el dict de salida.
+    Las reglas viven en registros.armar_registro (registro tipado, sin
+    redondeo); aquí solo se presenta como el dict de siempre.
+    """
+    return armar_registro(
+        ticker, precio,
+        macd, signal, upper, lower, K, D, J, rsi,
+        ema20, ema50, ema200, atr14,
+        soporte_est, precio_medio, zona_cara,
+        fecha=fecha,
+    ).a_dict()
+
+
 
 # ============================================================
 #               LISTA DE ACCIONES DEL MERCADO MX
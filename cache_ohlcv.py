@@ -0,0 +1,214 @@
+import logging
+import os
+import re
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ============================================================
+#          CACHE LOCAL DE OHLCV (PARQUET, 1 ARCHIVO/TICKER)
+# ============================================================
+# Carpeta del cache (se puede mover con la variable de entorno)
+CACHE_DIR = os.environ.get(
+    "CACHE_OHLCV_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_ohlcv"),
+)
+
+# Segundos en los que un archivo recién escrito se considera al día
+# (evita pedir el delta en cada rerun de Streamlit / poll de n8n)
+CACHE_TTL = int(os.environ.get("CACHE_OHLCV_TTL", "60"))
+
+log = logging.getLogger(__name__)
+
+# Desde qué fecha se pidió la historia guardada (metadata del parquet)
+_META_DESDE = b"cache_desde"
+
+_PERIODOS = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def inicio_periodo(period, hoy=None):
+    """
+    Convierte un period de yfinance ("2y", "6mo", "ytd"...) en la fecha
+    de inicio equivalente. Regresa None para "max" o periodos desconocidos.
+    """
+    hoy = pd.Timestamp(hoy) if hoy is not None else pd.Timestamp.today()
+    hoy = hoy.normalize()
+
+    if period == "ytd":
+        return pd.Timestamp(year=hoy.year, month=1, day=1)
+    if period in _PERIODOS:
+        return hoy - _PERIODOS[period]
+    return None
+
+
+def nombre_archivo(ticker):
+    """Nombre seguro para disco ("PE&OLES.MX" -> "PE_OLES.MX")."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", ticker)
+
+
+def _ruta(ticker, interval):
+    return os.path.join(CACHE_DIR, interval, f"{nombre_archivo(ticker)}.parquet")
+
+
+def leer_cache(ticker, interval="1d"):
+    """
+    Lee la historia guardada de un ticker.
+    Regresa (DataFrame, desde, edad_seg) o (None, None, None) si no hay cache.
+    """
+    ruta = _ruta(ticker, interval)
+    if not os.path.exists(ruta):
+        return None, None, None
+
+    try:
+        tabla = pq.read_table(ruta)
+    except Exception:
+        return None, None, None
+
+    meta = tabla.schema.metadata or {}
+    desde = meta.get(_META_DESDE)
+    desde = pd.Timestamp(desde.decode()) if desde else None
+
+    df = tabla.to_pandas()
+    edad = time.time() - os.path.getmtime(ruta)
+    return df, desde, edad
+
+
+def guardar_cache(ticker, df, desde=None, interval="1d"):
+    """
+    Escribe la historia de un ticker de forma atómica (tmp + replace),
+    así la API y Streamlit pueden compartir la misma carpeta.
+    """
+    ruta = _ruta(ticker, interval)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    tabla = pa.Table.from_pandas(df)
+    meta = dict(tabla.schema.metadata or {})
+    if desde is not None:
+        meta[_META_DESDE] = str(pd.Timestamp(desde).date()).encode()
+    tabla = tabla.replace_schema_metadata(meta)
+
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    pq.write_table(tabla, tmp)
+    os.replace(tmp, ruta)
+
+
+def _separar(panel, tickers):
+    """
+    Parte el panel MultiIndex (Ticker, Campo) en un DataFrame por ticker,
+    quitando las filas que el ticker no tiene (feriados de otro mercado).
+    """
+    frames = {}
+    if panel is None or panel.empty:
+        return frames
+
+    if isinstance(panel.columns, pd.MultiIndex):
+        disponibles = set(panel.columns.get_level_values(0))
+        for t in tickers:
+            if t in disponibles:
+                df = panel[t].dropna(how="all")
+                if not df.empty:
+                    frames[t] = df
+    elif len(tickers) == 1:
+        df = panel.dropna(how="all")
+        if not df.empty:
+            frames[tickers[0]] = df
+
+    return frames
+
+
+def descargar_incremental(tickers, descargar, period="2y", interval="1d"):
+    """
+    Igual que descargar_batch pero consultando primero el cache local:
+      - tickers sin cache (o con historia más corta que el periodo) -> descarga completa
+      - tickers con cache -> solo se pide desde su última vela (se re-pide la
+        última porque puede venir incompleta si se descargó en horario de mercado)
+
+    'descargar' es la función que habla con la fuente de datos:
+        descargar(tickers, period=..., interval=..., start=...) -> panel MultiIndex
+
+    Regresa el mismo panel MultiIndex (nivel 0 = Ticker) que yf.download.
+    Los tickers cuyo delta falló salen con sus velas guardadas y quedan
+    listados en panel.attrs["sin_actualizar"] (para avisar al que escanea).
+    """
+    inicio = inicio_periodo(period)
+
+    frames = {}
+    desdes = {}
+    completos = []
+    por_inicio = {}
+    sin_actualizar = []
+
+    for t in tickers:
+        df, desde, edad = leer_cache(t, interval)
+
+        if df is None or df.empty:
+            completos.append(t)
+            continue
+        if inicio is not None and (desde is None or desde > inicio):
+            completos.append(t)
+            continue
+
+        frames[t] = df
+        desdes[t] = desde
+        if edad is not None and edad < CACHE_TTL:
+            continue
+
+        por_inicio.setdefault(df.index[-1], []).append(t)
+
+    # -------- DESCARGA COMPLETA (sin cache) --------
+    if completos:
+        panel = descargar(completos, period=period, interval=interval)
+        for t, df in _separar(panel, completos).items():
+            frames[t] = df
+            guardar_cache(t, df, desde=inicio or df.index[0], interval=interval)
+
+    # -------- DELTAS (solo lo que falta) --------
+    for ultima, grupo in por_inicio.items():
+        try:
+            panel = descargar(grupo, interval=interval, start=ultima)
+        except Exception as e:
+            # Se quedan las velas guardadas, pero el escaneo se entera
+            log.warning("No se pudo actualizar %d tickers desde %s: %s", len(grupo), ultima, e)
+            sin_actualizar += grupo
+            continue
+
+        nuevos = _separar(panel, grupo)
+        for t in grupo:
+            viejo = frames[t]
+
+            if t in nuevos:
+                delta = nuevos[t]
+                merged = pd.concat([viejo[viejo.index < delta.index[0]], delta])
+                merged = merged[~merged.index.duplicated(keep="last")]
+            else:
+                merged = viejo
+
+            frames[t] = merged
+            guardar_cache(t, merged, desde=desdes[t], interval=interval)
+
+    # -------- ARMAR PANEL (mismo orden que tickers) --------
+    salida = {}
+    for t in tickers:
+        if t not in frames:
+            continue
+        df = frames[t]
+        if inicio is not None:
+            df = df[df.index >= inicio]
+        if not df.empty:
+            salida[t] = df
+
+    panel = pd.concat(salida, axis=1).sort_index() if salida else pd.DataFrame()
+    panel.attrs["sin_actualizar"] = [t for t in sin_actualizar if t in salida]
+    return panel
@@ -0,0 +1,197 @@
+import os
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+# ============================================================
+#          CALENDARIO DE SESIONES (BMV Y NYSE)
+# ============================================================
+# Horario regular de cada bolsa en su propia zona (así el cambio de
+# horario de verano de EE.UU. sale solo) y feriados por regla, sin
+# dependencias extra. Todo lo que regresa va en America/Mazatlan,
+# igual que los timestamps del resto del bot.
+#
+# Feriados extra (cierres no previstos) por variable de entorno:
+#   FERIADOS_EXTRA="MX:2026-03-02,USA:2026-01-09"
+
+TZ_LOCAL = pytz.timezone("America/Mazatlan")
+
+SESIONES = {
+    "MX": {"tz": pytz.timezone("America/Mexico_City"), "apertura": time(8, 30), "cierre": time(15, 0)},
+    "USA": {"tz": pytz.timezone("America/New_York"), "apertura": time(9, 30), "cierre": time(16, 0)},
+}
+
+# Cierre temprano de NYSE (13:00) en días de media sesión
+CIERRE_TEMPRANO_USA = time(13, 0)
+
+# Segundos después del cierre en que el proveedor ya tiene la vela final
+MARGEN_CIERRE = int(os.environ.get("MARGEN_CIERRE", "900"))
+
+
+def normalizar_mercado(mercado):
+    """"MX" o "USA" (cualquier otro se trata como USA, igual que universo())."""
+    return "MX" if mercado.upper() == "MX" else "USA"
+
+
+def _pascua(año):
+    """Domingo de Pascua (algoritmo anónimo gregoriano)."""
+    a = año % 19
+    b, c = divmod(año, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(año, mes, dia + 1)
+
+
+def _n_esimo(año, mes, dia_semana, n):
+    """n-ésimo lunes/martes/... del mes (n=-1 = el último)."""
+    if n > 0:
+        primero = date(año, mes, 1)
+        return primero + timedelta(days=(dia_semana - primero.weekday()) % 7 + 7 * (n - 1))
+    ultimo = date(año + (mes == 12), mes % 12 + 1, 1) - timedelta(days=1)
+    return ultimo - timedelta(days=(ultimo.weekday() - dia_semana) % 7)
+
+
+def _observado(d):
+    """Regla NYSE: sábado -> viernes, domingo -> lunes."""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def _extra():
+    feriados = {"MX": set(), "USA": set()}
+    for parte in os.environ.get("FERIADOS_EXTRA", "").split(","):
+        if ":" in parte:
+            mercado, fecha = parte.split(":", 1)
+            feriados[normalizar_mercado(mercado.strip())].add(date.fromisoformat(fecha.strip()))
+    return feriados
+
+
+def feriados(mercado, año):
+    mercado = normalizar_mercado(mercado)
+    pascua = _pascua(año)
+
+    if mercado == "MX":
+        dias = {
+            date(año, 1, 1),
+            _n_esimo(año, 2, 0, 1),            # Día de la Constitución
+            _n_esimo(año, 3, 0, 3),            # Natalicio de Benito Juárez
+            pascua - timedelta(days=3),        # Jueves Santo
+            pascua - timedelta(days=2),        # Viernes Santo
+            date(año, 5, 1),
+            date(año, 9, 16),
+            date(año, 11, 2),
+            _n_esimo(año, 11, 0, 3),           # Revolución Mexicana
+            date(año, 12, 12),
+            date(año, 12, 25),
+        }
+    else:
+        dias = {
+            _n_esimo(año, 1, 0, 3),            # Martin Luther King Jr.
+            _n_esimo(año, 2, 0, 3),            # Presidents' Day
+            pascua - timedelta(days=2),        # Good Friday
+            _n_esimo(año, 5, 0, -1),           # Memorial Day
+            _observado(date(año, 6, 19)),
+            _observado(date(año, 7, 4)),
+            _n_esimo(año, 9, 0, 1),            # Labor Day
+            _n_esimo(año, 11, 3, 4),           # Thanksgiving
+            _observado(date(año, 12, 25)),
+        }
+        # Año nuevo en sábado NO se recorre al viernes anterior
+        if date(año, 1, 1).weekday() != 5:
+            dias.add(_observado(date(año, 1, 1)))
+
+    return dias | {d for d in _extra()[mercado] if d.year == año}
+
+
+def es_dia_habil(mercado, d):
+    return d.weekday() < 5 and d not in feriados(mercado, d.year)
+
+
+def _cierre(mercado, d):
+    """Hora de cierre de la bolsa el día d (NYSE cierra a las 13:00 en medias sesiones)."""
+    if mercado == "USA":
+        thanksgiving = _n_esimo(d.year, 11, 3, 4)
+        medias = {thanksgiving + timedelta(days=1), date(d.year, 12, 24), date(d.year, 7, 3)}
+        if d in medias:
+            return CIERRE_TEMPRANO_USA
+    return SESIONES[mercado]["cierre"]
+
+
+def sesion(mercado, d):
+    """(apertura, cierre) de la sesión del día d en America/Mazatlan, o None si no hay."""
+    mercado = normalizar_mercado(mercado)
+    if not es_dia_habil(mercado, d):
+        return None
+    tz = SESIONES[mercado]["tz"]
+    apertura = tz.localize(datetime.combine(d, SESIONES[mercado]["apertura"]))
+    cierre = tz.localize(datetime.combine(d, _cierre(mercado, d)))
+    return apertura.astimezone(TZ_LOCAL), cierre.astimezone(TZ_LOCAL)
+
+
+def hora_local(ahora=None):
+    """'ahora' (o la hora actual) en America/Mazatlan; naive = ya es local."""
+    if ahora is None:
+        return datetime.now(TZ_LOCAL)
+    if ahora.tzinfo is None:
+        return TZ_LOCAL.localize(ahora)
+    return ahora.astimezone(TZ_LOCAL)
+
+
+def _dia_bolsa(mercado, ahora):
+    return ahora.astimezone(SESIONES[normalizar_mercado(mercado)]["tz"]).date()
+
+
+def abierto(mercado, ahora=None):
+    ahora = hora_local(ahora)
+    s = sesion(mercado, _dia_bolsa(mercado, ahora))
+    return s is not None and s[0] <= ahora < s[1]
+
+
+def ultimo_cierre(mercado, ahora=None):
+    """Cierre de la última sesión terminada antes de 'ahora'."""
+    ahora = hora_local(ahora)
+    d = _dia_bolsa(mercado, ahora)
+    for _ in range(15):
+        s = sesion(mercado, d)
+        if s is not None and s[1] <= ahora:
+            return s[1]
+        d -= timedelta(days=1)
+    return None
+
+
+def proxima_apertura(mercado, ahora=None):
+    """Apertura de la siguiente sesión que todavía no empieza."""
+    ahora = hora_local(ahora)
+    d = _dia_bolsa(mercado, ahora)
+    for _ in range(15):
+        s = sesion(mercado, d)
+        if s is not None and s[0] > ahora:
+            return s[0]
+        d += timedelta(days=1)
+    return None
+
+
+def datos_al_dia(mercado, calculado, margen=MARGEN_CIERRE, ahora=None):
+    """
+    True si un escaneo hecho en 'calculado' (epoch o datetime) ya no puede
+    cambiar: la bolsa está cerrada y se calculó después del último cierre
+    (+ margen en segundos, lo que tarda el proveedor en asentar la vela).
+    """
+    ahora = hora_local(ahora)
+    if abierto(mercado, ahora):
+        return False
+    cierre = ultimo_cierre(mercado, ahora)
+    if cierre is None:
+        return False
+    if not isinstance(calculado, datetime):
+        calculado = datetime.fromtimestamp(calculado, TZ_LOCAL)
+    return hora_local(calculado) >= cierre + timedelta(seconds=margen)
@@ -0,0 +1,36 @@
+import argparse
+import time
+
+from backtest import backtest_universo, HORIZONTE, OBJETIVO_R
+from bot_trading import descargar_batch, acciones_usa, acciones_mx
+
+# ============================================================
+#        BACKTEST DESDE LA TERMINAL
+# ============================================================
+# python correr_backtest.py --mercado USA --period 2y
+# backtest.py queda como librería (no imprime nada).
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest de la señal de compra")
+    parser.add_argument("--mercado", default="USA", choices=["USA", "MX"])
+    parser.add_argument("--period", default="2y")
+    parser.add_argument("--objetivo-r", type=float, default=OBJETIVO_R)
+    parser.add_argument("--horizonte", type=int, default=HORIZONTE)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    tickers = acciones_usa if args.mercado == "USA" else acciones_mx
+
+    inicio = time.perf_counter()
+    panel = descargar_batch(tickers, period=args.period, interval="1d")
+    _, por_ticker, total = backtest_universo(
+        panel, tickers, objetivo_r=args.objetivo_r, horizonte=args.horizonte
+    )
+
+    print(por_ticker.head(args.top).to_string(index=False))
+    print("\nUniverso:", total)
+    print(f"Tiempo: {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import bisect
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+from registros import armar_registro
+
+# ============================================================
+#     INDICADORES EN STREAMING (O(1) POR VELA / POR TICK)
+# ============================================================
+# Mismo cálculo que macd_manual, bollinger_manual, kdj_manual, rsi_manual,
+# calcular_emas y atr_manual, pero guardando el estado en vez de recorrer
+# los 2 años cada vez.
+#
+# El estado se divide en:
+#   - velas cerradas ("confirmadas"): acumuladores de EMAs, buffers de
+#     las ventanas de 14/20 y deques de mín/máx para el KDJ
+#   - la vela abierta (la de hoy): se combina con lo confirmado al leer,
+#     así cada tick intradía solo reemplaza 3 números.
+#
+# Costo real: un tick es O(1). Confirmar una vela es O(1) salvo los
+# percentiles, que viven en una lista ordenada: O(log n) para ubicar el
+# close + O(n) de memmove al insertar/sacar (n = velas de la historia,
+# ~500 en 2y: microsegundos). Leer los valores recorre las ventanas fijas
+# de 14/20 velas.
+
+SPANS = {"e12": 12, "e26": 26, "e20": 20, "e50": 50, "e200": 200}
+ALFA_SIGNAL = 2 / (9 + 1)
+
+
+def _ema(prev, x, alfa):
+    return x if prev is None else alfa * x + (1 - alfa) * prev
+
+
+class EstadoIndicadores:
+    """
+    Estado incremental de un ticker.
+
+      estado = EstadoIndicadores.desde_historial("WALMEX.MX", batch["WALMEX.MX"])
+      estado.actualizar_tick(61.35)           # precio intradía (misma vela)
+      estado.nueva_vela(62.0, 60.9, 61.5)     # cierra la vela anterior y abre otra
+      r = estado.resultado()                  # mismo dict que analizar_con_data
+
+    max_hist limita cuántas velas entran en los percentiles P20/P50/P80
+    (None = toda la historia, como analizar_con_data).
+
+    'desde' y 'fecha' son la primera vela y la vela abierta (si se
+    conocen): con ellas CacheEstados sabe si el estado sigue sirviendo.
+    """
+
+    def __init__(self, ticker, max_hist=None):
+        self.ticker = ticker
+        self.max_hist = max_hist
+        self.desde = None
+        self.fecha = None
+
+        # Velas confirmadas
+        self.n = 0
+        self.ultimo_close = None
+        self.emas = {k: None for k in SPANS}
+        self.signal = None
+
+        self.closes20 = deque(maxlen=19)   # + vela abierta = 20
+        self.gains = deque(maxlen=13)      # + delta abierto = 14
+        self.losses = deque(maxlen=13)
+        self.trs = deque(maxlen=13)        # + TR abierto = 14
+        self.min_low = deque()             # (idx, low) creciente -> mínimo al frente
+        self.max_high = deque()            # (idx, high) decreciente -> máximo al frente
+
+        self.historia = deque()            # closes confirmados (para sacar el más viejo)
+        self.ordenados = []                # mismos closes, ordenados (percentiles)
+
+        # Vela abierta (high, low, close)
+        self.abierta = None
+
+    # ---------------------------------------------------------
+    #                     CONSTRUCCIÓN
+    # ---------------------------------------------------------
+    @classmethod
+    def desde_historial(cls, ticker, data, max_hist=None):
+        """
+        Calienta el estado recorriendo la historia una sola vez.
+        La última vela queda como vela abierta (puede seguir recibiendo ticks).
+        """
+        estado = cls(ticker, max_hist=max_hist)
+        if data is None or data.empty:
+            return estado
+
+        data = data.dropna()
+        for h, l, c in zip(data["High"].to_numpy(float),
+                           data["Low"].to_numpy(float),
+                           data["Close"].to_numpy(float)):
+            estado.nueva_vela(h, l, c)
+        if len(data):
+            estado.desde, estado.fecha = data.index[0], data.index[-1]
+        return estado
+
+    # ---------------------------------------------------------
+    #                     ACTUALIZACIONES
+    # ---------------------------------------------------------
+    def nueva_vela(self, high, low, close, fecha=None):
+        """Confirma la vela abierta (si hay) y abre una nueva."""
+        if self.abierta is not None:
+            self._confirmar(*self.abierta)
+        self.abierta = (float(high), float(low), float(close))
+        self.fecha = fecha
+
+    def actualizar_tick(self, precio, high=None, low=None):
+        """
+        Actualiza la vela abierta con un precio intradía.
+        Si no se pasan high/low se extienden con el precio.
+        """
+        precio = float(precio)
+        if self.abierta is None:
+            self.abierta = (high if high is not None else precio,
+                            low if low is not None else precio,
+                            precio)
+            return
+
+        h, l, _ = self.abierta
+        h = float(high) if high is not None else max(h, precio)
+        l = float(low) if low is not None else min(l, precio)
+        self.abierta = (h, l, precio)
+
+    def _confirmar(self, high, low, close):
+        """O(1) salvo la lista ordenada de percentiles (ver encabezado)."""
+        prev = self.ultimo_close
+
+        for k, span in SPANS.items():
+            self.emas[k] = _ema(self.emas[k], close, 2 / (span + 1))
+        self.signal = _ema(self.signal, self.emas["e12"] - self.emas["e26"], ALFA_SIGNAL)
+
+        if prev is None:
+            self.trs.append(high - low)
+        else:
+            delta = close - prev
+            self.gains.append(max(delta, 0.0))
+            self.losses.append(max(-delta, 0.0))
+            self.trs.append(max(high - low, abs(high - prev), abs(low - prev)))
+
+        self.closes20.append(close)
+
+        # Deques monótonos para mín/máx de 14 (13 confirmadas + la abierta)
+        idx = self.n
+        while self.min_low and self.min_low[-1][1] >= low:
+            self.min_low.pop()
+        self.min_low.append((idx, low))
+        while self.max_high and self.max_high[-1][1] <= high:
+            self.max_high.pop()
+        self.max_high.append((idx, high))
+
+        self.n += 1
+        while self.min_low[0][0] < self.n - 13:
+            self.min_low.popleft()
+        while self.max_high[0][0] < self.n - 13:
+            self.max_high.popleft()
+
+        # Percentiles: ventana de max_hist velas contando la abierta
+        self.historia.append(close)
+        bisect.insort(self.ordenados, close)
+        if self.max_hist is not None:
+            while len(self.historia) > self.max_hist - 1:
+                viejo = self.historia.popleft()
+                del self.ordenados[bisect.bisect_left(self.ordenados, viejo)]
+
+        self.ultimo_close = close
+
+    # ---------------------------------------------------------
+    #                       LECTURA
+    # ---------------------------------------------------------
+    def _percentil(self, q, x):
+        """Cuantil lineal (como pandas) de los confirmados + el close abierto x."""
+        s = self.ordenados
+        p = bisect.bisect_left(s, x)
+
+        def en(k):
+            if k < p:
+                return s[k]
+            if k == p:
+                return x
+            return s[k - 1]
+
+        pos = q * len(s)   # (len(s) + 1) - 1
+        k = math.floor(pos)
+        frac = pos - k
+        abajo = en(k)
+        if frac == 0:
+            return abajo
+        return abajo + (en(k + 1) - abajo) * frac
+
+    def valores(self):
+        """
+        Valores actuales de todos los indicadores (incluyendo la vela abierta).
+        NaN donde la historia no alcanza para la ventana, igual que pandas.
+        """
+        nan = float("nan")
+        if self.abierta is None:
+            return None
+
+        h, l, c = self.abierta
+        total = self.n + 1
+        prev = self.ultimo_close
+
+        # -------- EMAs / MACD --------
+        e = {k: _ema(self.emas[k], c, 2 / (span + 1)) for k, span in SPANS.items()}
+        macd = e["e12"] - e["e26"]
+        signal = _ema(self.signal, macd, ALFA_SIGNAL)
+
+        # -------- BOLLINGER --------
+        if total >= 20:
+            v = list(self.closes20) + [c]
+            mid = sum(v) / 20
+            std = math.sqrt(sum((x - mid) ** 2 for x in v) / 19)
+            upper, lower = mid + 2 * std, mid - 2 * std
+        else:
+            upper = lower = nan
+
+        # -------- KDJ --------
+        if total >= 14:
+            low_min = min(self.min_low[0][1], l) if self.min_low else l
+            high_max = max(self.max_high[0][1], h) if self.max_high else h
+            rango = high_max - low_min
+            rsv = ((c - low_min) / rango) * 100 if rango else nan
+        else:
+            rsv = nan
+        K = (2 / 3) * 50 + (1 / 3) * rsv
+        D = (2 / 3) * 50 + (1 / 3) * K
+        J = 3 * K - 2 * D
+
+        # -------- RSI --------
+        if total >= 15:
+            delta = c - prev
+            gain = (sum(self.gains) + max(delta, 0.0)) / 14
+            loss = (sum(self.losses) + max(-delta, 0.0)) / 14
+            if loss:
+                rsi = 100 - (100 / (1 + gain / loss))
+            else:
+                rsi = 100.0 if gain else nan
+        else:
+            rsi = nan
+
+        # -------- ATR --------
+        if total >= 14:
+            tr = (h - l) if prev is None else max(h - l, abs(h - prev), abs(l - prev))
+            atr14 = (sum(self.trs) + tr) / 14
+        else:
+            atr14 = nan
+
+        # -------- PERCENTILES --------
+        if total >= 50 and (self.max_hist is None or self.max_hist >= 50):
+            p20, p50, p80 = (self._percentil(q, c) for q in (0.20, 0.50, 0.80))
+        else:
+            p20 = p50 = p80 = None
+
+        return {
+            "precio": c, "macd": macd, "signal": signal,
+            "upper": upper, "lower": lower, "K": K, "D": D, "J": J,
+            "rsi": rsi, "ema20": e["e20"], "ema50": e["e50"], "ema200": e["e200"],
+            "atr14": atr14, "p20": p20, "p50": p50, "p80": p80,
+        }
+
+    def registro(self):
+        """ResultadoAnalisis tipado (o None si el ATR no es válido)."""
+        v = self.valores()
+        if v is None or math.isnan(v["atr14"]) or v["atr14"] <= 0:
+            return None
+
+        return armar_registro(
+            self.ticker, v["precio"],
+            v["macd"], v["signal"], v["upper"], v["lower"],
+            v["K"], v["D"], v["J"], v["rsi"],
+            v["ema20"], v["ema50"], v["ema200"], v["atr14"],
+            v["p20"], v["p50"], v["p80"],
+        )
+
+    def resultado(self):
+        """Mismo dict que analizar_con_data (o None si el ATR no es válido)."""
+        r = self.registro()
+        return r.a_dict() if r is not None else None
+
+
+def estados_desde_panel(panel, tickers, max_hist=None):
+    """
+    Calienta un EstadoIndicadores por ticker a partir del panel de
+    descargar_batch. Se hace una vez; después solo llegan ticks/velas.
+    """
+    estados = {}
+    if panel is None or panel.empty or not isinstance(panel.columns, pd.MultiIndex):
+        return estados
+
+    disponibles = set(panel.columns.get_level_values(0))
+    for t in tickers:
+        if t in disponibles:
+            estados[t] = EstadoIndicadores.desde_historial(t, panel[t], max_hist=max_hist)
+    return estados
+
+
+# ============================================================
+#        ESTADOS POR TICKER (ACTUALIZAR EN VEZ DE RECALCULAR)
+# ============================================================
+# /analisis/{ticker} vuelve a pedir la misma historia con solo la última
+# vela cambiada (ticks intradía) o con una vela más. En vez de recorrer
+# los 2 años otra vez, se guarda el estado de cada ticker y se actualiza:
+#   - misma primera vela y misma vela abierta -> actualizar_tick
+#   - misma primera vela y una vela nueva     -> cerrar la anterior con
+#     sus valores finales + nueva_vela
+#   - cualquier otra cosa (la ventana de 2y se recorrió, huecos) -> se
+#     calienta de nuevo desde la historia
+ESTADOS_MAX = int(os.environ.get("ESTADOS_MAX", "2000"))
+
+
+class CacheEstados:
+    """LRU de EstadoIndicadores por ticker (máximo 'maximo' tickers)."""
+
+    def __init__(self, maximo=ESTADOS_MAX):
+        self.maximo = maximo
+        self._estados = OrderedDict()
+        self._lock = threading.Lock()
+        self.calentados = 0    # veces que se recorrió toda la historia
+
+    def actualizar(self, ticker, data):
+        """Estado al día con 'data' (historia OHLC del ticker), o None si no hay velas."""
+        if data is None or data.empty:
+            return None
+        data = data.dropna()
+        if data.empty:
+            return None
+
+        with self._lock:
+            estado = self._estados.pop(ticker, None)
+
+        fechas = data.index
+        n = len(fechas)
+        ultima = data.iloc[-1]
+        if estado is not None and estado.desde == fechas[0] and estado.fecha == fechas[-1] and estado.n == n - 1:
+            estado.actualizar_tick(ultima["Close"], high=ultima["High"], low=ultima["Low"])
+        elif (estado is not None and n >= 2 and estado.desde == fechas[0]
+              and estado.fecha == fechas[-2] and estado.n == n - 2):
+            cerrada = data.iloc[-2]
+            estado.actualizar_tick(cerrada["Close"], high=cerrada["High"], low=cerrada["Low"])
+            estado.nueva_vela(ultima["High"], ultima["Low"], ultima["Close"], fecha=fechas[-1])
+        else:
+            estado = EstadoIndicadores.desde_historial(ticker, data)
+            self.calentados += 1
+
+        with self._lock:
+            self._estados[ticker] = estado
+            while len(self._estados) > self.maximo:
+                self._estados.popitem(last=False)
+        return estado
+
+
+estados_ticker = CacheEstados()
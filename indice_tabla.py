@@ -0,0 +1,349 @@
+import base64
+import re
+
+import numpy as np
+
+from puntuacion import (
+    ORDEN_SEMAFORO, ORDEN_ATR, numerica,
+    COMPRA_FUERTE, POSIBLE_COMPRA, ESPERAR, POSIBLE_VENTA, VENTA_FUERTE,
+    ATR_LENTA, ATR_SANA, ATR_VOLATIL, ATR_MUY_VOLATIL,
+)
+from registros import registros_json
+from servicio_scan import ResultadoScan, cache_scan
+
+# ============================================================
+#      ÍNDICE DE LA TABLA COMPLETA (FILTROS + ORDEN + CURSOR)
+# ============================================================
+# Por cada snapshot del cache_scan se precalculan, una sola vez:
+#   - las columnas numéricas que usan los filtros
+#   - la permutación de filas de cada orden (asc y desc, NaN al final)
+#   - por cada orden, las posiciones (en esa permutación) de cada
+#     combinación señal × banda ATR × zona, ya ordenadas
+# Así una página es: buscar el cursor en las listas de las combinaciones
+# que pide el filtro y mezclar solo las filas que caben en la página
+# (más las que tumben los filtros numéricos), sin recorrer la tabla.
+# El total de cada filtro se calcula una vez y se reutiliza en las
+# páginas siguientes.
+#
+# El cursor es opaco: versión del snapshot + orden + posición. Si entre
+# páginas llegó un snapshot con otros datos el cursor ya no aplica.
+
+LIMITE_PAGINA = 50
+LIMITE_PAGINA_MAX = 500
+
+# Filtro por ticker de /tabla: cuántos por request y qué caracteres
+TICKERS_FILTRO_MAX = LIMITE_PAGINA_MAX
+_TICKER_VALIDO = re.compile(r"^[A-Z0-9.\-^=&]{1,20}$")
+
+SENALES = {
+    "compra_fuerte": COMPRA_FUERTE,
+    "posible_compra": POSIBLE_COMPRA,
+    "esperar": ESPERAR,
+    "posible_venta": POSIBLE_VENTA,
+    "venta_fuerte": VENTA_FUERTE,
+}
+BANDAS_ATR = {
+    "lenta": ATR_LENTA,
+    "sana": ATR_SANA,
+    "volatil": ATR_VOLATIL,
+    "muy_volatil": ATR_MUY_VOLATIL,
+}
+# Zona del precio contra los percentiles de su historia
+ZONAS = ("soporte", "barata", "media", "cara")   # <=P20 | P20-P50 | P50-P80 | >=P80
+
+# clave de orden -> columna (resumen = como tabla_resumen de Streamlit)
+ORDENES = {
+    "resumen": None,
+    "ticker": "Ticker",
+    "score": "Score",
+    "riesgo": "Riesgo%",
+    "atr": "ATR%",
+    "precio": "Precio",
+    "rsi": "RSI",
+    "dist_soporte": None,
+}
+
+# Código de cada valor categórico (el último = sin valor / desconocido)
+_COD_SENAL = {v: i for i, v in enumerate(SENALES.values())}
+_COD_ATR = {v: i for i, v in enumerate(BANDAS_ATR.values())}
+_COD_ZONA = {z: i for i, z in enumerate(ZONAS)}
+_N_SENAL, _N_ATR, _N_ZONA = len(SENALES) + 1, len(BANDAS_ATR) + 1, len(ZONAS) + 1
+
+TOTALES_MAX = 256   # totales por filtro guardados en cada índice
+
+
+def _lista(valor):
+    return [v.strip().lower() for v in valor.split(",") if v.strip()] if valor else []
+
+
+def _codigos(valores, codigos, n):
+    return np.array([codigos.get(v, n - 1) for v in valores], dtype=np.int64)
+
+
+def criterios(senal=None, score_min=None, score_max=None, atr=None,
+              riesgo_max=None, zona=None, ticker=None):
+    """
+    Valida y normaliza los filtros de /tabla (ValueError si un valor no
+    existe). Regresa una tupla hashable:
+      (combinaciones permitidas o None, score_min, score_max, riesgo_max, tickers o None)
+    """
+    senales = range(_N_SENAL)
+    if senal:
+        valores = set()
+        for s in _lista(senal):
+            if s == "compra":
+                valores |= {COMPRA_FUERTE, POSIBLE_COMPRA}
+            elif s == "venta":
+                valores |= {VENTA_FUERTE, POSIBLE_VENTA}
+            elif s in SENALES:
+                valores.add(SENALES[s])
+            else:
+                raise ValueError(f"senal desconocida: {s}")
+        senales = sorted(_COD_SENAL[v] for v in valores)
+
+    bandas = range(_N_ATR)
+    if atr:
+        lista = _lista(atr)
+        desconocidas = [b for b in lista if b not in BANDAS_ATR]
+        if desconocidas:
+            raise ValueError(f"banda ATR desconocida: {desconocidas[0]}")
+        bandas = sorted({_COD_ATR[BANDAS_ATR[b]] for b in lista})
+
+    zonas = range(_N_ZONA)
+    if zona:
+        lista = _lista(zona)
+        desconocidas = [z for z in lista if z not in ZONAS]
+        if desconocidas:
+            raise ValueError(f"zona desconocida: {desconocidas[0]}")
+        zonas = sorted({_COD_ZONA[z] for z in lista})
+
+    combinaciones = None
+    if senal or atr or zona:
+        combinaciones = tuple(
+            (s * _N_ATR + a) * _N_ZONA + z for s in senales for a in bandas for z in zonas
+        )
+
+    tickers = None
+    if ticker:
+        tickers = tuple(dict.fromkeys(t.upper() for t in _lista(ticker)))
+        if len(tickers) > TICKERS_FILTRO_MAX:
+            raise ValueError(f"máximo {TICKERS_FILTRO_MAX} tickers en el filtro ({len(tickers)} recibidos)")
+        invalidos = [t for t in tickers if not _TICKER_VALIDO.match(t)]
+        if invalidos:
+            raise ValueError(f"ticker inválido: {invalidos[0]}")
+    return combinaciones, score_min, score_max, riesgo_max, tickers
+
+
+class IndiceTabla:
+    def __init__(self, resultado):
+        tabla = resultado.tabla
+        self.version = resultado.version
+        self.tabla = tabla
+        self.n = len(tabla)
+
+        self.num = {c: numerica(tabla, c) for c in (
+            "Score", "ATR%", "Riesgo%", "Precio", "RSI",
+            "Soporte Estadístico", "Precio Medio", "Zona Cara")}
+        self.senal = tabla["Semáforo Final"].to_numpy(dtype=object)
+        self.atr = tabla["Semáforo ATR"].to_numpy(dtype=object)
+        self.tickers = tabla["Ticker"].to_numpy(dtype=object)
+        self.fila_de = {t: i for i, t in enumerate(self.tickers)}
+
+        p = self.num["Precio"]
+        p20, p50, p80 = self.num["Soporte Estadístico"], self.num["Precio Medio"], self.num["Zona Cara"]
+        with np.errstate(invalid="ignore"):
+            self.zona = np.select(
+                [p <= p20, p <= p50, p < p80, p >= p80],
+                ["soporte", "barata", "media", "cara"],
+                default="",
+            )
+
+        # Combinación señal × banda ATR × zona de cada fila
+        self.combinacion = (
+            (_codigos(self.senal, _COD_SENAL, _N_SENAL) * _N_ATR
+             + _codigos(self.atr, _COD_ATR, _N_ATR)) * _N_ZONA
+            + _codigos(self.zona, _COD_ZONA, _N_ZONA)
+        )
+        self.conteo = np.bincount(self.combinacion, minlength=_N_SENAL * _N_ATR * _N_ZONA)
+
+        self.ordenes = {}
+        self.rangos = {}       # (orden, desc) -> posición de cada fila en la permutación
+        self.posiciones = {}   # (orden, desc) -> {combinación: posiciones ordenadas}
+        for clave in ORDENES:
+            asc = self._permutacion(clave)
+            for desc, permutacion in ((False, asc), (True, self._invertir(clave, asc))):
+                self.ordenes[(clave, desc)] = permutacion
+                rango = np.empty(self.n, dtype=np.int64)
+                rango[permutacion] = np.arange(self.n)
+                self.rangos[(clave, desc)] = rango
+                self.posiciones[(clave, desc)] = self._por_combinacion(permutacion)
+
+        self._todas = np.arange(self.n)
+        self._totales = {}
+
+    def _claves(self, clave):
+        """Llaves de ordenamiento de np.lexsort (la última es la principal)."""
+        t = self.tabla
+        if clave == "resumen":
+            return [t["Semáforo ATR"].map(ORDEN_ATR).fillna(99).to_numpy(),
+                    t["Semáforo Final"].map(ORDEN_SEMAFORO).fillna(99).to_numpy()]
+        if clave == "ticker":
+            return [t["Ticker"].to_numpy(dtype=str)]
+        if clave == "dist_soporte":
+            return [np.abs(self.num["Precio"] - self.num["Soporte Estadístico"])]
+        return [self.num[ORDENES[clave]]]
+
+    def _permutacion(self, clave):
+        # lexsort es estable y deja los NaN al final
+        return np.lexsort(self._claves(clave)).astype(np.int64)
+
+    def _invertir(self, clave, asc):
+        """Orden descendente con los NaN todavía al final."""
+        principal = self._claves(clave)[-1]
+        if principal.dtype.kind == "f":
+            n_validos = int((~np.isnan(principal)).sum())
+            return np.concatenate([asc[:n_validos][::-1], asc[n_validos:]])
+        return asc[::-1].copy()
+
+    def _por_combinacion(self, permutacion):
+        """Posiciones de la permutación agrupadas por combinación (cada grupo en orden)."""
+        combinacion = self.combinacion[permutacion]
+        agrupadas = np.argsort(combinacion, kind="stable")
+        cortes = np.cumsum(self.conteo)[:-1]
+        return {c: grupo for c, grupo in enumerate(np.split(agrupadas, cortes)) if len(grupo)}
+
+    def _pasan(self, filas, score_min, score_max, riesgo_max):
+        """Máscara de los filtros numéricos sobre unas filas."""
+        m = np.ones(len(filas), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if score_min is not None:
+                m &= self.num["Score"][filas] >= score_min
+            if score_max is not None:
+                m &= self.num["Score"][filas] <= score_max
+            if riesgo_max is not None:
+                m &= self.num["Riesgo%"][filas] <= riesgo_max
+        return m
+
+    def _total(self, filtro):
+        total = self._totales.get(filtro)
+        if total is None:
+            combinaciones, score_min, score_max, riesgo_max, tickers = filtro
+            if tickers is None and score_min is None and score_max is None and riesgo_max is None:
+                total = self.n if combinaciones is None else int(self.conteo[list(combinaciones)].sum())
+            else:
+                filas = self._filas_tickers(tickers) if tickers is not None else self._todas
+                if combinaciones is not None:
+                    filas = filas[np.isin(self.combinacion[filas], combinaciones)]
+                total = int(self._pasan(filas, score_min, score_max, riesgo_max).sum())
+            if len(self._totales) >= TOTALES_MAX:
+                self._totales.clear()
+            self._totales[filtro] = total
+        return total
+
+    def _filas_tickers(self, tickers):
+        return np.array([self.fila_de[t] for t in tickers if t in self.fila_de], dtype=np.int64)
+
+    def _recorrer(self, listas, desde, cuantas, pasa):
+        """
+        Primeras 'cuantas' posiciones >= desde (mezclando las listas ya
+        ordenadas) cuyas filas pasan los filtros numéricos. Cada vuelta
+        solo toma un bloque de cada lista; el bloque crece si los filtros
+        tumban muchas filas.
+        """
+        tomadas = []
+        bloque = cuantas
+        while len(tomadas) < cuantas:
+            trozos = [l[i:i + bloque] for l in listas
+                      if (i := int(np.searchsorted(l, desde))) < len(l)]
+            if not trozos:
+                break
+            # Las 'bloque' primeras de la mezcla son las siguientes en orden
+            candidatas = np.sort(np.concatenate(trozos))[:bloque]
+            tomadas += list(candidatas[pasa(candidatas)][:cuantas - len(tomadas)])
+            desde = int(candidatas[-1]) + 1
+            bloque *= 2
+        return tomadas
+
+    def pagina(self, orden="resumen", desc=False, cursor=None, limite=LIMITE_PAGINA, **filtros):
+        """(filas de la página como dicts, siguiente cursor o None, total filtrado)."""
+        if orden not in ORDENES:
+            raise ValueError(f"orden desconocido: {orden}")
+        limite = max(1, min(int(limite), LIMITE_PAGINA_MAX))
+        filtro = criterios(**filtros)
+        combinaciones, score_min, score_max, riesgo_max, tickers = filtro
+
+        inicio = 0
+        if cursor:
+            version, orden_c, desc_c, inicio = decodificar_cursor(cursor)
+            if version != self.version:
+                raise ValueError("cursor vencido: los datos cambiaron, pide la primera página otra vez")
+            if (orden_c, desc_c) != (orden, desc):
+                raise ValueError("el cursor es de otro orden")
+
+        permutacion = self.ordenes[(orden, desc)]
+        if tickers is not None:
+            # Pocas filas: se ubican directo por su posición en el orden
+            filas = self._filas_tickers(tickers)
+            if combinaciones is not None:
+                filas = filas[np.isin(self.combinacion[filas], combinaciones)]
+            listas = [np.sort(self.rangos[(orden, desc)][filas])]
+        elif combinaciones is not None:
+            por_combinacion = self.posiciones[(orden, desc)]
+            listas = [por_combinacion[c] for c in combinaciones if c in por_combinacion]
+        else:
+            listas = [self._todas]
+
+        def pasa(posiciones):
+            return self._pasan(permutacion[posiciones], score_min, score_max, riesgo_max)
+
+        pasan = self._recorrer(listas, inicio, limite + 1, pasa)
+        filas = permutacion[np.array(pasan[:limite], dtype=np.int64)]
+
+        siguiente = None
+        if len(pasan) > limite:
+            siguiente = codificar_cursor(self.version, orden, desc, int(pasan[limite]))
+
+        return registros_json(self.tabla.iloc[filas]), siguiente, self._total(filtro)
+
+
+def codificar_cursor(version, orden, desc, posicion):
+    texto = f"{version}:{orden}:{int(desc)}:{posicion}"
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, orden, desc, posicion = texto.split(":")
+        return version, orden, desc == "1", int(posicion)
+    except Exception:
+        raise ValueError("cursor inválido")
+
+
+def indice_de(resultado):
+    """Índice del snapshot (se construye una vez y se guarda en el resultado)."""
+    indice = resultado.derivados.get("indice")
+    if indice is None:
+        indice = resultado.derivados["indice"] = IndiceTabla(resultado)
+    return indice
+
+
+_combinados = {}      # tuple de versiones -> índice de la tabla unida (market=ALL)
+
+
+def indice_mercados(resultados):
+    """Índice de uno o varios mercados (varios = tablas unidas, en ese orden)."""
+    if len(resultados) == 1:
+        return indice_de(resultados[0])
+    clave = tuple(r.version for r in resultados)
+    indice = _combinados.get(clave)
+    if indice is None:
+        unido = ResultadoScan.unir("ALL", resultados)
+        indice = IndiceTabla(unido)
+        _combinados.clear()   # solo el snapshot vigente
+        _combinados[clave] = indice
+    return indice
+
+
+# Cada snapshot nuevo del cache llega con su índice ya armado
+cache_scan.suscriptores.append(lambda mercado, resultado: indice_de(resultado))
@@ -1,223 +1,384 @@
-from fastapi import FastAPI, Query
-from datetime import datetime
-import pytz
-import pandas as pd
-
-from bot_trading import (
-    descargar_batch,
-    analizar_con_data,
-    acciones_mx,
-    acciones_usa,
+import asyncio
+import hashlib
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from alertas import alertas
+from calendario_mercados import normalizar_mercado
+from indice_tabla import LIMITE_PAGINA, LIMITE_PAGINA_MAX, ORDENES, criterios, decodificar_cursor, indice_mercados
+from precalculo import PRECALCULO_ACTIVO, precalculador
+from registros import registros_json
+from servicio_scan import (
+    LISTA_MAX_DESCARGAS, LISTA_MAX_TICKERS, DemasiadasDescargas, analizar_ticker_async, cache_scan,
+    escanear_lista_async, escanear_por_partes, normalizar_tickers, setups_respuesta,
 )
 
-app = FastAPI(title="Trading Arkangel API")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Precálculo de MX/USA según el horario de cada bolsa (precalculo.py)
+    if PRECALCULO_ACTIVO:
+        precalculador.iniciar()
+    yield
+    await precalculador.detener()
+
+
+app = FastAPI(title="Trading Arkangel API", lifespan=lifespan)
+
+# Escaneos de listas personalizadas corriendo a la vez (el resto recibe 429)
+LISTA_MAX_SIMULTANEOS = 2
+_listas_en_curso = asyncio.Semaphore(LISTA_MAX_SIMULTANEOS)
 
 
 # =========================
-# Helpers (igual que Streamlit)
+# Helpers
 # =========================
-def to_float(x):
-    try:
-        if x is None or x == "":
-            return None
-        return float(x)
-    except:
-        return None
-
+def mercado_pedido(market: str):
+    """"ALL", "MX" o "USA" (cualquier otro se trata como USA, igual que universo())."""
+    return "ALL" if market.upper() == "ALL" else normalizar_mercado(market)
 
-def semaforo_atr(atr_pct):
-    try:
-        atr_pct = float(atr_pct)
-    except:
-        return "—"
 
-    if atr_pct < 1:
-        return "⚪ MUY LENTA"
-    elif atr_pct <= 3:
-        return "🟢 VOLATILIDAD SANA"
-    elif atr_pct <= 4:
-        return "🟡 VOLATIL"
-    else:
-        return "🔴 MUY VOLATIL"
+def mercados_pedidos(market: str):
+    """"MX", "USA" o "ALL" (los dos, descargados en paralelo)."""
+    market = mercado_pedido(market)
+    return ["MX", "USA"] if market == "ALL" else [market]
 
 
-def calcular_score_y_semaforo(r: dict):
-    """
-    Copia directa de tu calcular_score_y_semaforo(row) en Streamlit
-    pero leyendo desde el dict 'r' que regresa analizar_con_data.
+def etag_de(resultados, *extra):
     """
-    score = 0
-
-    # MACD
-    macd_val = float(r.get("MACD", 0))
-    signal_val = float(r.get("Signal", 0))
-    score += 1 if macd_val > signal_val else -1
-
-    # RSI
-    rsi_val = float(r.get("RSI", 50))
-    if rsi_val < 30:
-        score += 1
-    elif rsi_val > 70:
-        score -= 1
-
-    # Bollinger
-    boll = str(r.get("Bollinger Señal", ""))
-    if boll == "Sobreventa":
-        score += 1
-    elif boll == "Sobrecompra":
-        score -= 1
-
-    # Tendencia (EMA50 vs EMA200)
-    tendencia = str(r.get("Tendencia", ""))
-    score += 1 if tendencia == "Alcista" else -1
-
-    # Precio vs EMA50
-    precio_ema50 = str(r.get("Precio EMA50", ""))
-    score += 1 if precio_ema50 == "Arriba" else -1
-
-    # KDJ
-    K_val = float(r.get("K", 0))
-    D_val = float(r.get("D", 0))
-    score += 1 if K_val > D_val else -1
-
-    # Semáforo final por score
-    if score >= 4:
-        sem = "🟢 COMPRA FUERTE"
-    elif score >= 2:
-        sem = "🟢 POSIBLE COMPRA"
-    elif score <= -4:
-        sem = "🔴 VENTA FUERTE"
-    elif score <= -2:
-        sem = "🔴 POSIBLE VENTA"
-    else:
-        sem = "🟡 ESPERAR"
-
-    return score, sem
-
-
-def es_setup_perfecto(r: dict) -> bool:
+    ETag débil de uno o varios escaneos: versión de contenido (última
+    vela de cada ticker + umbrales del score) más parámetros del request.
+    Débil porque edad_datos_seg / cache cambian aunque los datos no.
     """
-    Copia directa de tu es_setup_perfecto(row) en Streamlit,
-    pero leyendo desde el dict enriquecido 'r'.
-    """
-    sem = str(r.get("Semáforo Final", "")).upper()
-    atr_sem = str(r.get("Semáforo ATR", "")).upper()
-
-    score = to_float(r.get("Score"))
-    riesgo = to_float(r.get("Riesgo%"))
-    precio = to_float(r.get("Precio"))
-    soporte = to_float(r.get("Soporte Estadístico"))
-    medio = to_float(r.get("Precio Medio"))
-    cara = to_float(r.get("Zona Cara"))
-
-    # 1) Señal (momentum)
-    if "COMPRA FUERTE" not in sem and "POSIBLE COMPRA" not in sem:
-        return False
-
-    # 2) Volatilidad operable
-    if "SANA" not in atr_sem:
-        return False
+    h = hashlib.sha1("|".join([r.version for r in resultados] + [str(x) for x in extra]).encode())
+    return f'W/"{h.hexdigest()[:20]}"'
 
-    # 3) Score mínimo
-    if score is None or score < 3:
-        return False
 
-    # 4) Riesgo máximo (ATR %)
-    if riesgo is None or riesgo > 5:
+def coincide_etag(request: Request, etag: str) -> bool:
+    """If-None-Match del cliente (lista separada por comas o *) contra etag."""
+    pedido = request.headers.get("if-none-match")
+    if not pedido:
         return False
+    etiquetas = [e.strip() for e in pedido.split(",")]
+    quitar_w = lambda e: e[2:] if e.startswith("W/") else e
+    return "*" in etiquetas or quitar_w(etag) in [quitar_w(e) for e in etiquetas]
 
-    # 5) Precio en zona “barata” (P20 a P50) y NO en zona cara
-    if precio is None or soporte is None or medio is None or cara is None:
-        return False
 
-    if precio > medio:
-        return False
-    if precio >= cara:
-        return False
-
-    return True
+def no_modificado(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 
 # =========================
 # Endpoints
 # =========================
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok", "message": "Trading Arkangel API activa"}
 
 
 @app.get("/oportunidad-compra")
-def oportunidad_compra(market: str = Query("MX")):
+async def oportunidad_compra(request: Request, response: Response, market: str = Query("MX")):
     """
     Devuelve SOLO setups perfectos (igual que Streamlit).
     Si no hay -> total=0 y setups=[]
+    market=ALL escanea MX y USA a la vez.
+    Con If-None-Match igual al ETag anterior -> 304 sin cuerpo.
     """
+    market = mercado_pedido(market)
     try:
-        acciones = acciones_mx if market.upper() == "MX" else acciones_usa
-
-        batch = descargar_batch(acciones, period="2y", interval="1d")
-
-        tz = pytz.timezone("America/Mazatlan")
-        timestamp = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
-
-        setups = []
+        # Resultados del cache (si ya venció se sirve igual y se recalcula atrás).
+        # La descarga y el análisis corren fuera del event loop.
+        pares = await asyncio.gather(*(cache_scan.obtener_async(m) for m in mercados_pedidos(market)))
+        resultados = [r for r, _ in pares]
+        estados = [e for _, e in pares]
+
+        cache = {
+            # Si cualquiera viene viejo / recién calculado, eso es lo que se reporta
+            "cache": "viejo" if "viejo" in estados else ("nuevo" if "nuevo" in estados else "fresco"),
+            "datos_del": min(r.timestamp for r in resultados),
+            "edad_datos_seg": round(max(r.edad() for r in resultados), 1),
+        }
 
-        # Validación del batch (MultiIndex)
-        if not isinstance(batch.columns, pd.MultiIndex):
+        # Escaneo fallido (sin filas) -> sin setups. Si solo falló alguna
+        # parte se responde con lo que sí hay y el warning.
+        warnings = [r.warning for r in resultados if r.warning is not None]
+        if any(r.warning is not None and r.tabla.empty for r in resultados):
             return {
                 "status": "ok",
-                "market": market.upper(),
+                "market": market,
                 "hay_oportunidad": False,
                 "total": 0,
                 "setups": [],
-                "warning": "Batch no vino con MultiIndex (respuesta inesperada de yfinance)."
+                **cache,
+                "warning": warnings[0]
             }
+        if warnings:
+            cache["warning"] = warnings[0]
 
-        for ticker in acciones:
-            if ticker not in batch.columns.get_level_values(0):
-                continue
-
-            df = batch[ticker].dropna()
-            r = analizar_con_data(ticker, df)
-            if not r:
-                continue
-
-            # 1) Calcula Score + Semáforo Final (igual Streamlit)
-            score, sem_final = calcular_score_y_semaforo(r)
-            r["Score"] = score
-            r["Semáforo Final"] = sem_final
-
-            # 2) Calcula Semáforo ATR (igual Streamlit)
-            r["Semáforo ATR"] = semaforo_atr(r.get("ATR%"))
-
-            # 3) Filtro exacto de Setup Perfecto (igual Streamlit)
-            if not es_setup_perfecto(r):
-                continue
-
-            # 4) Respuesta para n8n/Telegram
-            setups.append({
-                "ticker": r.get("Ticker"),
-                "tipo_senal": r.get("Semáforo Final"),
-                "precio_entrada": r.get("Precio"),
-                "stop_loss": r.get("Stop Sugerido"),
-                "tp1": r.get("TP1"),
-                "tp2": r.get("TP2"),
-                "riesgo_pct": r.get("Riesgo%"),
-                "atr_pct": r.get("ATR%"),
-                "score": r.get("Score"),
-                "soporte": r.get("Soporte Estadístico"),
-                "precio_medio": r.get("Precio Medio"),
-                "zona_cara": r.get("Zona Cara"),
-                "timestamp": timestamp,
-            })
+        # Mismos datos que la última vez que preguntó el cliente -> 304
+        etag = etag_de(resultados, market)
+        if coincide_etag(request, etag):
+            return no_modificado(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+        setups = []
+        for resultado in resultados:
+            setups += setups_respuesta(resultado)
 
         return {
             "status": "ok",
-            "market": market.upper(),
+            "market": market,
             "hay_oportunidad": len(setups) > 0,
             "total": len(setups),
-            "setups": setups
+            "setups": setups,
+            **cache
+        }
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.get("/alertas")
+async def ver_alertas(market: str = Query("MX"), desde: int | None = Query(None)):
+    """
+    Solo lo que cambió entre escaneos: setups nuevos, los que salieron y
+    cambios de stop/TP. Sin 'desde' regresa el último delta; con
+    desde=<secuencia> todos los posteriores (n8n guarda la última que vio).
+    Si ALERTAS_WEBHOOK_URL está configurada, cada delta además se empuja ahí.
+    """
+    market = mercado_pedido(market)
+    deltas = []
+    for mercado in mercados_pedidos(market):
+        deltas += alertas.deltas(mercado, desde)
+    deltas.sort(key=lambda d: d["secuencia"])
+    return {
+        "status": "ok",
+        "market": market,
+        "ultima_secuencia": deltas[-1]["secuencia"] if deltas else desde,
+        "deltas": deltas,
+    }
+
+
+def _linea(registro, formato, evento):
+    """Un registro del stream: NDJSON (una línea JSON) o SSE (event + data)."""
+    data = json.dumps(registro, ensure_ascii=False, default=str)
+    if formato == "sse":
+        return f"event: {evento}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+@app.get("/oportunidad-compra/stream")
+async def oportunidad_compra_stream(market: str = Query("MX"), formato: str = Query("ndjson")):
+    """
+    Igual que /oportunidad-compra pero en streaming: cada setup sale en
+    cuanto su parte de tickers se analiza (mismos campos que 'setups')
+    y al final un registro con tipo="resumen".
+    formato: ndjson (default) o sse (text/event-stream).
+    """
+    market = mercado_pedido(market)
+    formato = "sse" if formato.lower() == "sse" else "ndjson"
+
+    async def generar():
+        total = analizadas = 0
+        faltantes = []
+        datos_del = None
+        resumen = {"tipo": "resumen", "status": "ok", "market": market}
+        try:
+            for mercado in mercados_pedidos(market):
+                async for parte in escanear_por_partes(mercado):
+                    datos_del = datos_del or parte.timestamp
+                    analizadas += len(parte.tabla)
+                    faltantes += parte.faltantes
+                    if parte.warning is not None:
+                        resumen["warning"] = parte.warning
+                    for setup in setups_respuesta(parte):
+                        total += 1
+                        yield _linea(setup, formato, "setup")
+        except Exception as e:
+            resumen.update(status="error", message=str(e))
+
+        resumen.update({
+            "hay_oportunidad": total > 0,
+            "total": total,
+            "analizadas": analizadas,
+            "faltantes": len(faltantes),
+            "datos_del": datos_del,
+        })
+        yield _linea(resumen, formato, "resumen")
+
+    tipo = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(generar(), media_type=tipo)
+
+
+@app.get("/tabla")
+async def tabla_completa(
+    request: Request,
+    response: Response,
+    market: str = Query("MX"),
+    senal: str | None = Query(None),
+    score_min: float | None = Query(None),
+    score_max: float | None = Query(None),
+    atr: str | None = Query(None),
+    riesgo_max: float | None = Query(None),
+    zona: str | None = Query(None),
+    ticker: str | None = Query(None),
+    orden: str = Query("resumen"),
+    desc: bool = Query(False),
+    limite: int = Query(LIMITE_PAGINA, ge=1, le=LIMITE_PAGINA_MAX),
+    cursor: str | None = Query(None),
+):
+    """
+    Tabla completa del escaneo (todas las columnas, como la de Streamlit)
+    con filtros, orden y paginación por cursor. Sale del snapshot del
+    cache_scan: los órdenes ya están precalculados (indice_tabla.py).
+    senal: compra_fuerte, posible_compra, esperar, posible_venta,
+           venta_fuerte, compra o venta (varias separadas por coma)
+    atr: sana, volatil, muy_volatil, lenta
+    zona: soporte (<=P20), barata (P20-P50), media (P50-P80), cara (>=P80)
+    ticker: solo esos tickers (separados por coma, máximo TICKERS_FILTRO_MAX)
+    orden: resumen, ticker, score, riesgo, atr, precio, rsi, dist_soporte
+    Para la siguiente página se manda el 'siguiente' de la respuesta como cursor.
+    """
+    market = mercado_pedido(market)
+    orden = orden.lower()
+    filtros = dict(senal=senal, score_min=score_min, score_max=score_max,
+                   atr=atr, riesgo_max=riesgo_max, zona=zona, ticker=ticker)
+
+    # Parámetros inválidos -> 422 sin tocar el escaneo
+    try:
+        if orden not in ORDENES:
+            raise ValueError(f"orden desconocido: {orden}")
+        criterios(**filtros)
+        if cursor:
+            decodificar_cursor(cursor)
+    except ValueError as e:
+        response.status_code = 422
+        return {"status": "error", "message": str(e)}
+
+    try:
+        pares = await asyncio.gather(*(cache_scan.obtener_async(m) for m in mercados_pedidos(market)))
+        resultados = [r for r, _ in pares]
+
+        warnings = [r.warning for r in resultados if r.warning is not None]
+        if any(r.warning is not None and r.tabla.empty for r in resultados):
+            return {"status": "ok", "market": market, "total": 0,
+                    "filas": [], "siguiente": None, "warning": warnings[0]}
+
+        etag = etag_de(resultados, market, request.url.query)
+        if coincide_etag(request, etag):
+            return no_modificado(etag)
+
+        indice = indice_mercados(resultados)
+        try:
+            filas, siguiente, total = indice.pagina(
+                orden=orden, desc=desc, cursor=cursor, limite=limite, **filtros,
+            )
+        except ValueError as e:
+            # Cursor vencido (llegó otro snapshot) o de otro orden
+            response.status_code = 422
+            return {"status": "error", "message": str(e)}
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+        return {
+            "status": "ok",
+            "market": market,
+            "total": total,
+            "filas": filas,
+            "siguiente": siguiente,
+            "datos_del": min(r.timestamp for r in resultados),
+            **({"warning": warnings[0]} if warnings else {}),
         }
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+@app.get("/analisis/{ticker}")
+async def analisis_ticker(ticker: str):
+    """
+    Registro completo de UN ticker (mismos campos que analizar_con_data
+    + Score, Semáforo Final, Semáforo ATR y si es setup perfecto).
+    Sale del escaneo en cache si el ticker está ahí; si no, se descarga
+    solo ese ticker (o solo su delta si ya está en el cache Parquet).
+    Acepta cualquier ticker del proveedor, no solo los de las listas.
+    """
+    try:
+        resultado, origen = await analizar_ticker_async(ticker)
+        if resultado is None:
+            return {"status": "error", "message": f"Sin datos para {ticker.upper()}"}
+
+        registro = registros_json(resultado.tabla)[0]
+        return {
+            "status": "ok",
+            "ticker": registro["Ticker"],
+            "origen": origen,
+            "setup_perfecto": not resultado.setups().empty,
+            "datos_del": resultado.timestamp,
+            "analisis": registro,
+        }
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+class ListaTickers(BaseModel):
+    tickers: list[str]
+    incluir_tabla: bool = False   # además de los setups, el registro de cada ticker
+
+
+@app.post("/escaneo")
+async def escaneo_personalizado(lista: ListaTickers, response: Response):
+    """
+    Escanea una lista propia de tickers (BMV con sufijo .MX, el resto USA).
+    Mismo formato que /oportunidad-compra. Los tickers que ya están en el
+    escaneo en cache no se descargan; el resto se baja por bloques.
+    Límites por request: LISTA_MAX_TICKERS tickers, LISTA_MAX_DESCARGAS
+    fuera de cache y LISTA_MAX_SIMULTANEOS escaneos a la vez.
+    """
+    tickers = normalizar_tickers(lista.tickers)
+    if not tickers:
+        response.status_code = 422
+        return {"status": "error", "message": "La lista de tickers está vacía"}
+    if len(tickers) > LISTA_MAX_TICKERS:
+        response.status_code = 413
+        return {"status": "error", "message": f"Máximo {LISTA_MAX_TICKERS} tickers por request ({len(tickers)} recibidos)"}
+    if _listas_en_curso.locked():
+        response.status_code = 429
+        return {"status": "error", "message": "Hay demasiados escaneos personalizados en curso, intenta en un momento"}
+
+    async with _listas_en_curso:
+        try:
+            resultados, en_cache = await escanear_lista_async(tickers, max_descargas=LISTA_MAX_DESCARGAS)
+        except DemasiadasDescargas as e:
+            response.status_code = 413
+            return {"status": "error", "message": str(e)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    setups = []
+    for resultado in resultados:
+        setups += setups_respuesta(resultado)
+
+    respuesta = {
+        "status": "ok",
+        "market": "CUSTOM",
+        "hay_oportunidad": len(setups) > 0,
+        "total": len(setups),
+        "setups": setups,
+        "analizadas": sum(len(r.tabla) for r in resultados),
+        "desde_cache": en_cache,
+        "faltantes": [t for r in resultados for t in r.faltantes],
+        "datos_del": min(r.timestamp for r in resultados),
+    }
+    warnings = [r.warning for r in resultados if r.warning is not None]
+    if warnings:
+        respuesta["warning"] = warnings[0]
+    if lista.incluir_tabla:
+        respuesta["tabla"] = [f for r in resultados for f in registros_json(r.tabla)]
+    return respuesta
@@ -0,0 +1,55 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# ============================================================
+#        ARRAYS EN MEMORIA COMPARTIDA (PARA PROCESS POOLS)
+# ============================================================
+# Se copian una sola vez a un bloque de SharedMemory y cada worker los
+# "adjunta" como vistas NumPy: el panel de precios no se serializa por
+# tarea, solo viaja un descriptor chico (nombre del bloque + offsets).
+
+
+def publicar(arrays):
+    """
+    Copia un dict {nombre: np.ndarray} a un bloque compartido.
+    Regresa (shm, descriptor). Quien publica debe llamar liberar(shm).
+    """
+    campos = []
+    offset = 0
+    for nombre, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        campos.append((nombre, arr.shape, arr.dtype.str, offset))
+        # alinear cada arreglo a 64 bytes
+        offset += -(-arr.nbytes // 64) * 64
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (nombre, shape, dtype, inicio), arr in zip(campos, arrays.values()):
+        destino = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=inicio)
+        destino[...] = arr
+
+    return shm, {"nombre": shm.name, "campos": campos}
+
+
+def adjuntar(descriptor):
+    """
+    Abre el bloque desde otro proceso. Regresa (shm, {nombre: vista}).
+    Las vistas son de solo lectura para que ningún worker pise a otro.
+    """
+    shm = shared_memory.SharedMemory(name=descriptor["nombre"])
+    arrays = {}
+    for nombre, shape, dtype, inicio in descriptor["campos"]:
+        vista = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=inicio)
+        vista.flags.writeable = False
+        arrays[nombre] = vista
+    return shm, arrays
+
+
+def liberar(shm):
+    try:
+        shm.close()
+    finally:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,278 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import series_indicadores, resultados_operaciones, HORIZONTE, OBJETIVO_R
+from memoria_compartida import publicar, adjuntar, liberar
+from puntuacion import UMBRALES, calcular_score, atr_sana
+
+# ============================================================
+#     OPTIMIZADOR DE UMBRALES (GRILLA + WALK-FORWARD, PARALELO)
+# ============================================================
+# Umbrales del score / setup perfecto (puntuacion.UMBRALES) más los que
+# hoy están fijos en la señal de analizar_con_data y en la zona de precio.
+PARAMETROS_BASE = {
+    **UMBRALES,
+    "rsi_compra_fuerte": 35,   # COMPRA FUERTE requiere RSI < esto
+    "zona": "p50",             # p20: precio <= P20 | p50: precio <= P50 (actual) | p80: precio < P80 | todas
+}
+
+CAMPOS = ["precio", "macd", "signal", "upper", "lower", "K", "D",
+          "rsi", "ema50", "ema200", "atr", "p20", "p50", "p80"]
+
+
+def grilla(**opciones):
+    """
+    Producto cartesiano de los valores a probar; lo que no se pase
+    se queda en PARAMETROS_BASE.
+      grilla(score_min=[2, 3, 4], riesgo_max=[3, 5, 8])
+    """
+    claves = list(opciones)
+    combos = []
+    for valores in itertools.product(*(opciones[k] for k in claves)):
+        combos.append({**PARAMETROS_BASE, **dict(zip(claves, valores))})
+    return combos
+
+
+# ============================================================
+#         PANEL DE INDICADORES (UNA VEZ, PARA TODA LA GRILLA)
+# ============================================================
+def preparar_panel(panel, tickers, objetivo_r=OBJETIVO_R, horizonte=HORIZONTE):
+    """
+    Calcula las series de indicadores de cada ticker y el resultado en R de
+    entrar en cada fecha con stop de 1.5 y de 2.0 ATR. Como los umbrales no
+    cambian los indicadores, esto se hace una sola vez y cada combinación
+    de la grilla solo aplica máscaras.
+    Regresa (fechas, tickers, {campo: matriz fechas × tickers}).
+    """
+    series = {}
+    for t in tickers:
+        if not isinstance(panel.columns, pd.MultiIndex) or t not in panel.columns.get_level_values(0):
+            continue
+        ind = series_indicadores(panel[t], percentiles=True)
+        if len(ind) < 50:
+            continue
+
+        precio, high, low, atr = (ind[c].to_numpy() for c in ("precio", "high", "low", "atr"))
+        for mult, nombre in ((1.5, "r15"), (2.0, "r20")):
+            res = resultados_operaciones(precio, high, low, atr, np.full(len(ind), mult),
+                                         objetivo_r=objetivo_r, horizonte=horizonte)
+            ind[nombre] = res["r"]
+        series[t] = ind
+
+    tickers = list(series)
+    if not tickers:
+        return pd.DatetimeIndex([]), [], {}
+
+    fechas = pd.DatetimeIndex(sorted(set().union(*(s.index for s in series.values()))))
+    arrays = {}
+    for campo in CAMPOS + ["r15", "r20"]:
+        arrays[campo] = np.column_stack([
+            series[t][campo].reindex(fechas).to_numpy(dtype=float) for t in tickers
+        ])
+    return fechas, tickers, arrays
+
+
+# ============================================================
+#         EVALUAR UNA COMBINACIÓN (TODO CON MÁSCARAS)
+# ============================================================
+def entradas_setup(a, p):
+    """
+    Máscara (fechas × tickers) de entradas de 'setup perfecto' con los
+    umbrales 'p', y el resultado en R de cada una.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precio = a["precio"]
+        macd_alcista = a["macd"] > a["signal"]
+        tendencia = a["ema50"] > a["ema200"]
+        kdj_alcista = a["K"] > a["D"]
+
+        # -------- SCORE (puntuacion.calcular_score) --------
+        score = calcular_score(precio, a["macd"], a["signal"], a["rsi"], a["lower"], a["upper"],
+                               a["ema50"], a["ema200"], a["K"], a["D"], p)
+
+        # -------- SEÑAL (analizar_con_data) -> stop y Riesgo% --------
+        compra_fuerte = macd_alcista & (a["rsi"] < p["rsi_compra_fuerte"]) & (precio < a["lower"]) & tendencia
+        venta_fuerte = (a["macd"] < a["signal"]) & (a["rsi"] > p["rsi_sobrecompra"]) & (precio > a["upper"]) & ~tendencia
+        posible_compra = ~compra_fuerte & ~venta_fuerte & (macd_alcista | kdj_alcista)
+        mult = np.where(compra_fuerte, 2.0, 1.5)
+        riesgo_pct = mult * a["atr"] / precio * 100
+        atr_pct = a["atr"] / precio * 100
+
+        # -------- SETUP PERFECTO (es_setup_perfecto) --------
+        setup = (
+            (score >= 2)
+            & (compra_fuerte | posible_compra)
+            & atr_sana(atr_pct, p)
+            & (score >= p["score_min"])
+            & (riesgo_pct <= p["riesgo_max"])
+        )
+
+        zona = p["zona"]
+        if zona == "p20":
+            setup &= precio <= a["p20"]
+        elif zona == "p50":
+            setup &= (precio <= a["p50"]) & (precio < a["p80"])
+        elif zona == "p80":
+            setup &= precio < a["p80"]
+        if zona != "todas":
+            setup &= ~np.isnan(a["p20"])
+
+    # Primer día de cada racha (igual que backtest.py)
+    previo = np.vstack([np.zeros((1, setup.shape[1]), dtype=bool), setup[:-1]])
+    entrada = setup & ~previo
+    r = np.where(compra_fuerte, a["r20"], a["r15"])
+    return entrada, r
+
+
+def _metricas(r):
+    r = r[~np.isnan(r)]
+    if len(r) == 0:
+        return 0, np.nan, np.nan
+    return int(len(r)), float(r.mean()), float((r > 0).mean())
+
+
+def evaluar(a, p, cortes, horizonte=HORIZONTE):
+    """
+    Métricas de una combinación en cada corte walk-forward:
+    entrenamiento = todo lo anterior al bloque de prueba (menos 'horizonte'
+    velas de separación para que las operaciones no se asomen a la prueba).
+    """
+    entrada, r = entradas_setup(a, p)
+    filas = []
+    for k, (ini_prueba, fin_prueba) in enumerate(cortes):
+        fin_entreno = max(ini_prueba - horizonte, 0)
+        n_e, exp_e, hit_e = _metricas(r[:fin_entreno][entrada[:fin_entreno]])
+        n_p, exp_p, hit_p = _metricas(r[ini_prueba:fin_prueba][entrada[ini_prueba:fin_prueba]])
+        filas.append({
+            "corte": k,
+            "ops_entreno": n_e, "exp_entreno": exp_e, "hit_entreno": hit_e,
+            "ops_prueba": n_p, "exp_prueba": exp_p, "hit_prueba": hit_p,
+        })
+    return filas
+
+
+def cortes_walk_forward(n_fechas, n_cortes):
+    """Parte las fechas en n_cortes+1 bloques; cada corte prueba en el bloque siguiente."""
+    limites = np.linspace(0, n_fechas, n_cortes + 2).astype(int)
+    return [(int(limites[k + 1]), int(limites[k + 2])) for k in range(n_cortes)]
+
+
+# ============================================================
+#                 WORKERS (PROCESS POOL)
+# ============================================================
+_ARRAYS = None
+_SHM = None
+
+
+def _iniciar_worker(descriptor):
+    global _ARRAYS, _SHM
+    _SHM, _ARRAYS = adjuntar(descriptor)
+
+
+def _evaluar_lote(lote, cortes, horizonte):
+    filas = []
+    for i, p in lote:
+        for f in evaluar(_ARRAYS, p, cortes, horizonte):
+            filas.append({"combo": i, **f})
+    return filas
+
+
+# ============================================================
+#                       OPTIMIZAR
+# ============================================================
+def optimizar(panel, tickers, combos, n_cortes=4, workers=None,
+              min_operaciones=20, objetivo_r=OBJETIVO_R, horizonte=HORIZONTE):
+    """
+    Evalúa todas las combinaciones en todos los cortes walk-forward.
+    El panel de indicadores vive en memoria compartida; a cada tarea solo
+    viajan los índices/parámetros de su lote.
+
+    Regresa (ranking, walk_forward):
+      ranking      -> una fila por combinación, ordenada por expectancy
+                      fuera de muestra (solo las que tienen >= min_operaciones)
+      walk_forward -> por corte, la mejor combinación en entrenamiento y
+                      cómo le fue en la prueba siguiente
+    """
+    fechas, tickers, arrays = preparar_panel(panel, tickers, objetivo_r, horizonte)
+    if not tickers or not combos:
+        return pd.DataFrame(), pd.DataFrame()
+
+    cortes = cortes_walk_forward(len(fechas), n_cortes)
+    indexados = list(enumerate(combos))
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(combos) < 2:
+        filas = []
+        for i, p in indexados:
+            filas += [{"combo": i, **f} for f in evaluar(arrays, p, cortes, horizonte)]
+    else:
+        shm, descriptor = publicar(arrays)
+        try:
+            tam = max(1, len(indexados) // (workers * 4))
+            lotes = [indexados[i:i + tam] for i in range(0, len(indexados), tam)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                                     initargs=(descriptor,)) as pool:
+                filas = []
+                for parte in pool.map(_evaluar_lote, lotes,
+                                      [cortes] * len(lotes), [horizonte] * len(lotes)):
+                    filas += parte
+        finally:
+            liberar(shm)
+
+    detalle = pd.DataFrame(filas)
+    params = pd.DataFrame(combos)
+    params.index.name = "combo"
+
+    # -------- RANKING (fuera de muestra, ponderado por operaciones) --------
+    detalle["r_prueba"] = detalle["exp_prueba"].fillna(0) * detalle["ops_prueba"]
+    detalle["hits_prueba"] = detalle["hit_prueba"].fillna(0) * detalle["ops_prueba"]
+    agg = detalle.groupby("combo").agg(
+        ops_prueba=("ops_prueba", "sum"),
+        r_prueba=("r_prueba", "sum"),
+        hits_prueba=("hits_prueba", "sum"),
+        cortes_positivos=("exp_prueba", lambda s: float((s > 0).mean())),
+        exp_entreno=("exp_entreno", "mean"),
+    )
+    agg["exp_prueba"] = agg["r_prueba"] / agg["ops_prueba"].where(agg["ops_prueba"] > 0)
+    agg["hit_prueba"] = agg["hits_prueba"] / agg["ops_prueba"].where(agg["ops_prueba"] > 0)
+    ranking = params.join(agg.drop(columns=["r_prueba", "hits_prueba"]))
+    ranking = ranking[ranking["ops_prueba"] >= min_operaciones]
+    ranking = ranking.sort_values(["exp_prueba", "hit_prueba"], ascending=False)
+
+    # -------- WALK-FORWARD (elige en entrenamiento, mide en prueba) --------
+    elegibles = detalle[detalle["ops_entreno"] >= min_operaciones]
+    if elegibles.empty:
+        walk_forward = pd.DataFrame()
+    else:
+        mejores = elegibles.loc[elegibles.groupby("corte")["exp_entreno"].idxmax()]
+        walk_forward = mejores.drop(columns=["r_prueba", "hits_prueba"]).join(params, on="combo")
+        walk_forward["desde"] = [fechas[cortes[k][0]] for k in walk_forward["corte"]]
+        walk_forward = walk_forward.reset_index(drop=True)
+
+    return ranking, walk_forward
+
+
+if __name__ == "__main__":
+    import time
+
+    from bot_trading import descargar_batch, acciones_usa
+
+    inicio = time.perf_counter()
+    panel = descargar_batch(acciones_usa, period="5y", interval="1d")
+    combos = grilla(
+        rsi_sobreventa=[25, 30, 35],
+        score_min=[2, 3, 4],
+        riesgo_max=[3.0, 5.0, 8.0],
+        atr_sana_max=[3.0, 4.0],
+        zona=["p20", "p50", "p80"],
+    )
+    ranking, walk_forward = optimizar(panel, acciones_usa, combos)
+
+    print(ranking.head(20).to_string())
+    print("\nWalk-forward:")
+    print(walk_forward.to_string())
+    print(f"\n{len(combos)} combinaciones en {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,366 @@
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# ============================================================
+#        TARJETAS POR ACCIÓN (UN SOLO COMPONENTE PAGINADO)
+# ============================================================
+# Antes: un components.html (iframe de 1280px) por ticker, ~200 en USA.
+# Ahora: UN iframe por página con los datos ya calculados de esas
+# tarjetas (columnas compactas, sin HTML repetido); el HTML de la tarjeta
+# se arma en el navegador. Al iframe solo viaja la página visible: el
+# payload y el DOM crecen con TARJETAS_POR_PAGINA, no con el universo.
+#
+# Búsqueda por ticker y paginación son widgets de Streamlit dentro del
+# fragmento de tarjetas (app.py -> pagina_tarjetas): solo re-ejecutan
+# ese fragmento. Los links del "Resumen rápido" escriben el ticker en esa
+# búsqueda (IR_A_TICKER_JS) y la página muestra su tarjeta.
+
+TARJETAS_POR_PAGINA = 5
+ALTO_TARJETA = 1280     # alto aproximado de una tarjeta; el iframe se ajusta al real
+BUSCAR_TICKER = "Buscar ticker"   # label del buscador de tarjetas (IR_A_TICKER_JS lo ubica por él)
+
+# Fragmentos pre-armados que se guardan (resumen + tarjetas, ~2 por ticker)
+RENDER_CACHE_MAX = 5000
+
+# Orden de las columnas del payload (una lista por tarjeta)
+CAMPOS = (
+    "id", "ticker", "senal", "precio",
+    "semaforo_final", "score", "explicacion",
+    "semaforo_atr", "atr14", "atr_pct", "tipo_stop", "stop", "tp1", "tp2", "riesgo",
+    "macd_color", "macd_senal", "macd", "signal",
+    "rsi_color", "rsi_estado", "rsi",
+    "boll_color", "boll_estado", "banda_sup", "banda_inf",
+    "kdj_color", "kdj_estado", "k", "d", "j",
+    "ema_color", "tendencia", "ema50", "ema200",
+    "precio_ema50_color", "precio_ema50",
+)
+
+
+def id_ancla(ticker):
+    """Id HTML del ticker ("WALMEX.MX" -> "WALMEX-MX"), igual en resumen y tarjetas."""
+    return str(ticker).replace(".", "-")
+
+
+def datos_tarjeta(fila, explicacion_score):
+    """
+    Valores ya listos para pintar la tarjeta de una fila de la tabla de
+    presentación (formatear_tabla): semáforos por indicador incluidos.
+    """
+    # Color del MACD (basado en números, no en texto)
+    macd_val = float(fila["MACD"])
+    signal_val = float(fila["Signal"])
+    macd_color = "🟢" if macd_val > signal_val else "🔴"
+
+    # RSI semáforo por acción (🟢 comprar | 🟡 esperar | 🔴 vender)
+    rsi_val = float(fila["RSI"])
+    if rsi_val < 30:
+        rsi_estado, rsi_color = "Sobreventa", "🟢"    # Comprar
+    elif rsi_val <= 70:
+        rsi_estado, rsi_color = "Normal", "🟡"        # Esperar
+    else:
+        rsi_estado, rsi_color = "Sobrecompra", "🔴"   # Vender
+
+    # ===== Semáforo EMAs =====
+    tendencia = str(fila["Tendencia"])          # "Alcista" o "Bajista"
+    precio_ema50 = str(fila["Precio EMA50"])    # "Arriba" o "Debajo"
+
+    # ===== Semáforo Bollinger (acción) =====
+    boll_estado = str(fila["Bollinger Señal"])  # "Sobreventa", "Normal", "Sobrecompra"
+    boll_color = {"Sobreventa": "🟢", "Normal": "🟡"}.get(boll_estado, "🔴")
+
+    # ===== Semáforo KDJ =====
+    K_val = float(fila["K"])
+    D_val = float(fila["D"])
+    if K_val > D_val:
+        kdj_estado, kdj_color = "Alcista", "🟢"    # Comprar
+    elif abs(K_val - D_val) < 1:
+        kdj_estado, kdj_color = "Neutral", "🟡"    # Esperar
+    else:
+        kdj_estado, kdj_color = "Bajista", "🔴"    # Vender
+
+    return {
+        "id": id_ancla(fila["Ticker"]),
+        "ticker": fila["Ticker"],
+        "senal": fila["Señal Final"],
+        "precio": fila["Precio"],
+        # Score y Semáforo Final ya calculados por puntuar() para toda la tabla
+        "semaforo_final": fila["Semáforo Final"],
+        "score": fila["Score"],
+        "explicacion": explicacion_score,
+        "semaforo_atr": fila["Semáforo ATR"],
+        "atr14": fila.get("ATR14", ""),
+        "atr_pct": fila.get("ATR%", ""),
+        "tipo_stop": fila.get("Tipo Stop", "—"),
+        "stop": fila.get("Stop Sugerido", ""),
+        "tp1": fila.get("TP1", ""),
+        "tp2": fila.get("TP2", ""),
+        "riesgo": fila.get("Riesgo%", ""),
+        "macd_color": macd_color,
+        "macd_senal": fila["MACD Señal"],
+        "macd": fila["MACD"],
+        "signal": fila["Signal"],
+        "rsi_color": rsi_color,
+        "rsi_estado": rsi_estado,
+        "rsi": f"{rsi_val:.2f}",
+        "boll_color": boll_color,
+        "boll_estado": boll_estado,
+        "banda_sup": fila["Banda Superior"],
+        "banda_inf": fila["Banda Inferior"],
+        "kdj_color": kdj_color,
+        "kdj_estado": kdj_estado,
+        "k": fila["K"],
+        "d": fila["D"],
+        "j": fila["J"],
+        "ema_color": "🟢" if tendencia == "Alcista" else "🔴",
+        "tendencia": tendencia,
+        "ema50": f"{float(fila['EMA50']):.2f}",
+        "ema200": f"{float(fila['EMA200']):.2f}",
+        "precio_ema50_color": "🟢" if precio_ema50 == "Arriba" else "🔴",
+        "precio_ema50": precio_ema50,
+    }
+
+
+def _json_script(valor):
+    """JSON seguro dentro de <script> (sin '</' que cierre la etiqueta)."""
+    return json.dumps(valor, ensure_ascii=False, default=str).replace("</", "<\\/")
+
+
+_COMPONENTE = """
+<style>
+  body { margin:0; font-family:Arial; }
+  .tarjeta { background-color:#ffffff; padding:25px; border-radius:20px; margin-bottom:25px; border:1px solid #cccccc; }
+  .tarjeta h2 { margin:0; font-size:26px; }
+  .tarjeta h3 { margin-top:20px; }
+  .tarjeta p { font-size:17px; }
+</style>
+
+<div id="tarjetas"></div>
+
+<script>
+(function () {
+  const DATOS = __DATOS__;
+
+  const filas = DATOS.filas.map(f => Object.fromEntries(DATOS.campos.map((c, i) => [c, f[i]])));
+
+  const esc = v => String(v ?? "").replace(/[&<>"']/g, c => ({"&":"&amp;","<":"&lt;",">":"&gt;","\\"":"&quot;","'":"&#39;"}[c]));
+
+  function tarjeta(t) {
+    return `
+    <div class="tarjeta" id="${esc(t.id)}">
+      <h2>📌 <strong>${esc(t.ticker)}</strong> — <span style="color:#0066ff;">${esc(t.senal)}</span></h2>
+      <p style="font-size:18px; margin-top:10px;">💲 <strong>Precio actual:</strong> ${esc(t.precio)}</p>
+
+      <h3>🚦 Semáforo Final (Score)</h3>
+      <p><strong>${esc(t.semaforo_final)}</strong><br>
+         <strong>Score:</strong> ${esc(t.score)} / 6<br>
+         <small>${esc(t.explicacion)}</small></p>
+
+      <h3>🎯 Gestión de riesgo (ATR)</h3>
+      <p><strong>${esc(t.semaforo_atr)}</strong><br>
+         <strong>ATR(14):</strong> ${esc(t.atr14)} &nbsp; | &nbsp;
+         <strong>ATR%:</strong> ${esc(t.atr_pct)}%<br>
+         <strong>Tipo de Stop:</strong> ${esc(t.tipo_stop)}<br>
+         <strong>Stop sugerido:</strong> ${esc(t.stop)}<br>
+         <strong>TP1:</strong> ${esc(t.tp1)} &nbsp; | &nbsp;
+         <strong>TP2:</strong> ${esc(t.tp2)}<br>
+         <strong>Riesgo%:</strong> ${esc(t.riesgo)}%</p>
+
+      <h3>📉 MACD</h3>
+      <p>${t.macd_color} <strong>${esc(t.macd_senal)}</strong><br>
+         <strong>MACD:</strong> ${esc(t.macd)}<br>
+         <strong>Signal:</strong> ${esc(t.signal)}</p>
+
+      <h3>📊 RSI (14)</h3>
+      <p>${t.rsi_color} <strong>${esc(t.rsi_estado)}</strong><br>
+         RSI: ${esc(t.rsi)}<br>
+         Rangos: Sobreventa &lt; 30 | Normal 30–70 | Sobrecompra &gt; 70</p>
+
+      <h3>📉 Bollinger (Volatilidad)</h3>
+      <p>${t.boll_color} <strong>Estado:</strong> ${esc(t.boll_estado)}<br>
+         <strong>Banda Superior:</strong> ${esc(t.banda_sup)}<br>
+         <strong>Banda Inferior:</strong> ${esc(t.banda_inf)}<br>
+         <small>Interpretación: 🟢 precio bajo banda inferior (zona compra) |
+           🟡 dentro del canal (esperar) |
+           🔴 sobre banda superior (zona venta)</small></p>
+
+      <h3>📊 KDJ (Momentum)</h3>
+      <p>${t.kdj_color} <strong>${esc(t.kdj_estado)}</strong><br>
+         <strong>K:</strong> ${esc(t.k)}<br>
+         <strong>D:</strong> ${esc(t.d)}<br>
+         <strong>J:</strong> ${esc(t.j)}<br>
+         <small>Interpretación: 🟢 K&gt;D (impulso alcista) |
+           🟡 K≈D (sin dirección) |
+           🔴 K&lt;D (impulso bajista)</small></p>
+
+      <h3>📈 Tendencia (EMAs)</h3>
+      <p>${t.ema_color} <strong>EMA50 vs EMA200:</strong> ${esc(t.tendencia)}<br>
+         <strong>EMA50:</strong> ${esc(t.ema50)}<br>
+         <strong>EMA200:</strong> ${esc(t.ema200)}</p>
+
+      <h3 style="margin-top:15px;">⏱️ Reacción (Precio vs EMA50)</h3>
+      <p>${t.precio_ema50_color} <strong>Precio vs EMA50:</strong> ${esc(t.precio_ema50)}</p>
+    </div>`;
+  }
+
+  function ajustarAlto() {
+    // El iframe mide lo que miden sus tarjetas (mismo origen que Streamlit)
+    try { window.frameElement.style.height = document.documentElement.scrollHeight + "px"; } catch (e) {}
+  }
+
+  // Solo llegan las tarjetas de la página visible
+  document.getElementById("tarjetas").innerHTML = filas.map(tarjeta).join("");
+  ajustarAlto();
+})();
+</script>
+"""
+
+
+# ============================================================
+#        CACHE DE RENDER POR FILA (HASH DE LA FILA -> HTML)
+# ============================================================
+# El HTML del resumen y el JSON de cada tarjeta solo dependen de los
+# valores que se pintan de esa fila. Se guardan por hash de la fila
+# (en el proceso, compartido entre sesiones): en un refresco donde solo
+# se movieron unos cuantos tickers, solo esos se vuelven a armar.
+class CacheRender:
+    """LRU de fragmentos por (tipo, hash de fila)."""
+
+    def __init__(self, maximo=RENDER_CACHE_MAX):
+        self.maximo = maximo
+        self._fragmentos = OrderedDict()
+        self._lock = threading.Lock()
+        self.armados = 0      # cuántos se armaron (no salieron del cache)
+
+    def obtener(self, clave, armar, *args):
+        with self._lock:
+            fragmento = self._fragmentos.get(clave)
+            if fragmento is not None:
+                self._fragmentos.move_to_end(clave)
+                return fragmento
+        fragmento = armar(*args)
+        with self._lock:
+            self.armados += 1
+            self._fragmentos[clave] = fragmento
+            while len(self._fragmentos) > self.maximo:
+                self._fragmentos.popitem(last=False)
+        return fragmento
+
+
+render_cache = CacheRender()
+
+
+# Columnas de la fila de presentación que pintan la tarjeta y el resumen.
+# Fecha (hora del escaneo) y Explicación no se pintan y quedan fuera del
+# hash: con ellas cada re-escaneo cambiaba todos los hashes aunque las
+# velas fueran las mismas.
+COLUMNAS_PINTADAS = (
+    "Ticker", "Señal Final", "Precio", "Semáforo Final", "Score", "Semáforo ATR",
+    "ATR14", "ATR%", "Tipo Stop", "Stop Sugerido", "TP1", "TP2", "Riesgo%",
+    "MACD Señal", "MACD", "Signal", "RSI",
+    "Bollinger Señal", "Banda Superior", "Banda Inferior",
+    "K", "D", "J", "Tendencia", "EMA50", "EMA200", "Precio EMA50",
+    "Soporte Estadístico", "Precio Medio", "Zona Cara",
+)
+
+
+def hash_filas(tabla_vista, razones):
+    """
+    Hash (uint64) por fila de lo que se pinta: las COLUMNAS_PINTADAS de la
+    fila de presentación + la explicación del score (razones_score).
+    Series con el mismo índice que la tabla.
+    """
+    columnas = [c for c in COLUMNAS_PINTADAS if c in tabla_vista.columns]
+    return pd.util.hash_pandas_object(tabla_vista[columnas].assign(_razon=razones), index=False)
+
+
+def html_fila_resumen(fila):
+    """Un renglón del "Resumen rápido" (fila de formatear_tabla)."""
+    return f"""
+<div style="padding:8px 0; border-bottom:1px solid #eee;">
+
+🔗 <a href="javascript:void(0)"
+        onclick="goToTicker('{fila["Ticker"]}')"
+        style="text-decoration:none; font-weight:800; color:#0066ff;">
+    {fila["Ticker"]}
+  </a> 
+
+  &nbsp; — &nbsp;
+  <span style="font-weight:800;">{fila["Semáforo Final"]}</span>
+   &nbsp; | &nbsp;
+  <span style="color:#111;">
+    💲 {fila["Precio"]} 
+    &nbsp; | &nbsp; 🧱 {fila["Soporte Estadístico"]}
+    &nbsp; | &nbsp; ⚖️ {fila["Precio Medio"]}
+    &nbsp; | &nbsp; 🏁 {fila["Zona Cara"]}
+  </span>
+  &nbsp; | &nbsp;
+  <span style="color:#666;">Score: {fila.get("Score","–")}/6</span>
+  &nbsp; — &nbsp;
+  <span style="font-weight:800;">{fila["Semáforo ATR"]}</span>
+  &nbsp; — &nbsp;
+  <span style="font-weight:800;">RIESGO {fila["Riesgo%"]}%</span>
+</div>
+""".strip()
+
+
+def filas_resumen(tabla_vista, hashes):
+    """HTML de cada renglón del resumen, en el orden de tabla_vista."""
+    return [
+        render_cache.obtener(("resumen", h), html_fila_resumen, fila)
+        for h, (_, fila) in zip(hashes.to_numpy(), tabla_vista.iterrows())
+    ]
+
+
+def _json_tarjeta(fila, explicacion_score):
+    t = datos_tarjeta(fila, explicacion_score)
+    return _json_script([t[c] for c in CAMPOS])
+
+
+def pagina_tarjetas(tabla_vista, buscar="", pagina=0, por_pagina=TARJETAS_POR_PAGINA):
+    """
+    Filas de una página de tarjetas, con la búsqueda por ticker aplicada.
+    Regresa (filas de la página, página dentro del rango, páginas, acciones filtradas).
+    """
+    buscar = (buscar or "").strip().upper()
+    filtrada = tabla_vista
+    if buscar:
+        filtrada = filtrada[filtrada["Ticker"].str.upper().str.contains(buscar, regex=False)]
+    paginas = max(1, -(-len(filtrada) // por_pagina))
+    pagina = min(max(int(pagina), 0), paginas - 1)
+    inicio = pagina * por_pagina
+    return filtrada.iloc[inicio:inicio + por_pagina], pagina, paginas, len(filtrada)
+
+
+def alto_tarjetas(n):
+    """Alto inicial del iframe para n tarjetas (el JS lo ajusta al real)."""
+    return max(1, n) * ALTO_TARJETA
+
+
+def componente_tarjetas(tabla_vista, razones, hashes):
+    """HTML del componente con las tarjetas de las filas recibidas (una página)."""
+    filas = [
+        render_cache.obtener(("tarjeta", h), _json_tarjeta, fila, razones.at[i])
+        for h, (i, fila) in zip(hashes.loc[tabla_vista.index].to_numpy(), tabla_vista.iterrows())
+    ]
+    datos = '{"campos": ' + _json_script(CAMPOS) + ', "filas": [' + ",".join(filas) + "]}"
+    return _COMPONENTE.replace("__DATOS__", datos)
+
+
+# Script del resumen: escribe el ticker en el buscador del fragmento de
+# tarjetas (input de Streamlit en la página padre, mismo origen) y lo
+# confirma con Enter; el fragmento se re-ejecuta con esa búsqueda.
+IR_A_TICKER_JS = """
+function goToTicker(ticker) {
+  const win = window.parent;
+  const input = win.document.querySelector('input[aria-label="__BUSCAR__"]');
+  if (!input) return;
+  const escribir = Object.getOwnPropertyDescriptor(win.HTMLInputElement.prototype, "value").set;
+  escribir.call(input, ticker);
+  input.dispatchEvent(new Event("input", { bubbles: true }));
+  input.dispatchEvent(new KeyboardEvent("keydown", { key: "Enter", code: "Enter", keyCode: 13, bubbles: true }));
+  input.scrollIntoView({ behavior: "smooth", block: "start" });
+}
+""".replace("__BUSCAR__", BUSCAR_TICKER)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+from datetime import timedelta
+
+from calendario_mercados import MARGEN_CIERRE, abierto, ultimo_cierre, proxima_apertura, hora_local, normalizar_mercado
+from servicio_scan import cache_scan
+
+# ============================================================
+#       PRECÁLCULO EN SEGUNDO PLANO (SEGÚN HORARIO DE BOLSA)
+# ============================================================
+# Corre dentro del proceso de la API:
+#   - con la bolsa abierta: re-escanea cada PRECALCULO_CADENCIA segundos
+#   - al cierre (+ MARGEN_CIERRE): un último escaneo con la vela final
+#   - después: nada hasta la siguiente apertura (noches, fines de
+#     semana y feriados no gastan llamadas al proveedor)
+# Los requests siempre leen un snapshot ya caliente del cache_scan.
+
+PRECALCULO_ACTIVO = os.environ.get("PRECALCULO_ACTIVO", "1") == "1"
+PRECALCULO_CADENCIA = int(os.environ.get("PRECALCULO_CADENCIA", "300"))
+PRECALCULO_REINTENTO = timedelta(seconds=60)   # espera tras un escaneo fallido
+PRECALCULO_MERCADOS = list(dict.fromkeys(
+    normalizar_mercado(m.strip()) for m in os.environ.get("PRECALCULO_MERCADOS", "MX,USA").split(",") if m.strip()))
+
+
+class Precalculador:
+    def __init__(self, cache=cache_scan, mercados=None, cadencia=None, margen=MARGEN_CIERRE):
+        self.cache = cache
+        self.mercados = list(dict.fromkeys(map(normalizar_mercado, mercados))) if mercados else PRECALCULO_MERCADOS
+        self.cadencia = timedelta(seconds=PRECALCULO_CADENCIA if cadencia is None else cadencia)
+        self.margen = timedelta(seconds=margen)
+        self.ultimo = {}      # mercado -> hora del último precálculo exitoso
+        self.fallo = {}       # mercado -> hora del último intento fallido
+        self._tarea = None
+
+    def _siguiente(self, mercado, ahora):
+        """Cuándo toca el siguiente escaneo de este mercado."""
+        t = self._programado(mercado, ahora)
+        fallo = self.fallo.get(mercado)
+        if t is not None and fallo is not None:
+            t = max(t, fallo + PRECALCULO_REINTENTO)
+        return t
+
+    def _programado(self, mercado, ahora):
+        ultimo = self.ultimo.get(mercado)
+        if abierto(mercado, ahora):
+            return ahora if ultimo is None else ultimo + self.cadencia
+
+        # Cerrada: un refresco final después del cierre y luego hasta la apertura
+        cierre = ultimo_cierre(mercado, ahora)
+        if cierre is not None:
+            final = cierre + self.margen
+            if ultimo is None or ultimo < final:
+                return final
+        return proxima_apertura(mercado, ahora)
+
+    def pendientes(self, ahora=None):
+        ahora = hora_local(ahora)
+        return [m for m in self.mercados if (t := self._siguiente(m, ahora)) is not None and t <= ahora]
+
+    def espera(self, ahora=None):
+        """Segundos hasta el siguiente escaneo (tope = cadencia, por si cambia el reloj)."""
+        ahora = hora_local(ahora)
+        tiempos = [t for t in (self._siguiente(m, ahora) for m in self.mercados) if t is not None]
+        if not tiempos:
+            return self.cadencia.total_seconds()
+        return min(max((min(tiempos) - ahora).total_seconds(), 1.0), self.cadencia.total_seconds())
+
+    async def ciclo(self, ahora=None):
+        """Escanea los mercados que tocan (en paralelo). Regresa cuáles."""
+        ahora = hora_local(ahora)
+        pendientes = self.pendientes(ahora)
+        resultados = await asyncio.gather(
+            *(self.cache.refrescar_async(m) for m in pendientes), return_exceptions=True
+        )
+        hechos = []
+        for mercado, r in zip(pendientes, resultados):
+            if not isinstance(r, BaseException) and r.warning is None:
+                self.ultimo[mercado] = ahora
+                self.fallo.pop(mercado, None)
+                hechos.append(mercado)
+            else:
+                # Se reintenta en PRECALCULO_REINTENTO
+                self.fallo[mercado] = ahora
+        return hechos
+
+    async def correr(self):
+        while True:
+            await self.ciclo()
+            await asyncio.sleep(self.espera())
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.ensure_future(self.correr())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+
+precalculador = Precalculador()
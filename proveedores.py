@@ -0,0 +1,202 @@
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from cache_ohlcv import inicio_periodo, nombre_archivo
+
+# ============================================================
+#          PROVEEDORES DE DATOS (YAHOO / LOCAL / SINTÉTICO)
+# ============================================================
+# Todos regresan el mismo panel que yf.download(group_by="ticker"):
+#   columnas MultiIndex -> nivel 0 = Ticker, nivel 1 = Open/High/Low/Close/Adj Close/Volume
+CAMPOS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+
+class ProveedorDatos:
+    """
+    Interfaz mínima de una fuente de precios.
+    Para agregar otra fuente basta con heredar e implementar descargar().
+    """
+    nombre = "base"
+
+    # Si conviene guardar lo descargado en el cache Parquet (cache_ohlcv.py).
+    # Las fuentes locales ya están en disco, no tiene caso duplicarlas.
+    cacheable = False
+
+    def descargar(self, tickers, period="2y", interval="1d", start=None):
+        raise NotImplementedError
+
+
+def _armar_panel(frames):
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1).sort_index()
+
+
+def _recortar(df, period, start):
+    inicio = pd.Timestamp(start) if start is not None else inicio_periodo(period)
+    if inicio is not None:
+        df = df[df.index >= inicio]
+    return df
+
+
+# ============================================================
+#                       YAHOO FINANCE
+# ============================================================
+class ProveedorYahoo(ProveedorDatos):
+    nombre = "yahoo"
+    cacheable = True
+
+    def descargar(self, tickers, period="2y", interval="1d", start=None):
+        """
+        Llamada directa a yfinance. Si viene 'start' se pide desde esa fecha
+        (deltas del cache); si no, se usa 'period'.
+        """
+        import yfinance as yf
+
+        if not tickers:
+            return pd.DataFrame()
+
+        rango = {"start": start} if start is not None else {"period": period}
+
+        return yf.download(
+            tickers=" ".join(tickers),
+            interval=interval,
+            group_by="ticker",
+            threads=True,
+            auto_adjust=False,
+            **rango
+        )
+
+
+# ============================================================
+#             LOCAL (ARCHIVOS PARQUET / CSV POR TICKER)
+# ============================================================
+class ProveedorLocal(ProveedorDatos):
+    """
+    Reproduce OHLCV guardado en disco, un archivo por ticker:
+      carpeta/<ticker>.parquet  o  carpeta/<ticker>.csv
+      carpeta/<interval>/<ticker>.parquet  (misma estructura que el cache)
+    Sirve para correr escaneos sin red apuntando a una copia del cache.
+    """
+    nombre = "local"
+
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+
+    def _leer(self, ticker, interval):
+        nombre = nombre_archivo(ticker)
+        candidatos = [
+            os.path.join(self.carpeta, interval, f"{nombre}.parquet"),
+            os.path.join(self.carpeta, f"{nombre}.parquet"),
+            os.path.join(self.carpeta, f"{nombre}.csv"),
+        ]
+        for ruta in candidatos:
+            if not os.path.exists(ruta):
+                continue
+            if ruta.endswith(".csv"):
+                return pd.read_csv(ruta, index_col=0, parse_dates=True)
+            return pd.read_parquet(ruta)
+        return None
+
+    def descargar(self, tickers, period="2y", interval="1d", start=None):
+        frames = {}
+        for t in tickers:
+            df = self._leer(t, interval)
+            if df is None:
+                continue
+            df = _recortar(df.sort_index(), period, start)
+            if not df.empty:
+                frames[t] = df
+        return _armar_panel(frames)
+
+
+# ============================================================
+#               SINTÉTICO (DETERMINISTA, SIN RED)
+# ============================================================
+class ProveedorSintetico(ProveedorDatos):
+    """
+    Genera velas diarias con una caminata aleatoria geométrica.
+    Cada ticker usa su propia semilla (crc32 del nombre + semilla global),
+    así el mismo ticker siempre da la misma serie y las pruebas/benchmarks
+    son reproducibles. Con 'fin' fijo la serie no cambia de un día a otro.
+    """
+    nombre = "sintetico"
+
+    def __init__(self, semilla=0, fin=None, años=10):
+        self.semilla = semilla
+        self.fin = pd.Timestamp(fin).normalize() if fin is not None else None
+        self.años = años
+
+    def fechas(self):
+        fin = self.fin if self.fin is not None else pd.Timestamp.today().normalize()
+        return pd.bdate_range(fin - pd.DateOffset(years=self.años), fin)
+
+    def serie(self, ticker, fechas=None):
+        fechas = fechas if fechas is not None else self.fechas()
+        n = len(fechas)
+
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()) ^ self.semilla)
+        precio0 = rng.uniform(5, 300)
+        drift = rng.normal(0.0002, 0.0005)
+        vol = rng.uniform(0.008, 0.04)
+
+        retornos = rng.normal(drift, vol, n)
+        close = precio0 * np.exp(np.cumsum(retornos))
+        open_ = np.concatenate([[precio0], close[:-1]])
+        rango = np.abs(rng.normal(0, vol, n)) * close
+        high = np.maximum(open_, close) + rango * rng.uniform(0, 1, n)
+        low = np.minimum(open_, close) - rango * rng.uniform(0, 1, n)
+        volume = rng.integers(10_000, 5_000_000, n).astype(float)
+
+        return pd.DataFrame({
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": volume,
+        }, index=fechas)
+
+    def descargar(self, tickers, period="2y", interval="1d", start=None):
+        frames = {}
+        fechas = self.fechas()
+        for t in tickers:
+            df = _recortar(self.serie(t, fechas), period, start)
+            if not df.empty:
+                frames[t] = df
+        return _armar_panel(frames)
+
+
+# ============================================================
+#                 PROVEEDOR ACTIVO (GLOBAL)
+# ============================================================
+def proveedor_desde_env(valor=None):
+    """
+    PROVEEDOR_DATOS = "yahoo" (default) | "sintetico" | "local:/ruta/a/carpeta"
+    """
+    valor = (valor if valor is not None else os.environ.get("PROVEEDOR_DATOS", "yahoo")).strip()
+
+    if valor.startswith("local:"):
+        return ProveedorLocal(valor.split(":", 1)[1])
+    if valor == "sintetico":
+        return ProveedorSintetico()
+    return ProveedorYahoo()
+
+
+_proveedor = None
+
+
+def get_proveedor():
+    global _proveedor
+    if _proveedor is None:
+        _proveedor = proveedor_desde_env()
+    return _proveedor
+
+
+def set_proveedor(proveedor):
+    """Cambia la fuente de datos para todo el proceso (API, Streamlit, scripts)."""
+    global _proveedor
+    _proveedor = proveedor
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+# ============================================================
+#      SCORE + SEMÁFOROS + SETUP PERFECTO (VECTORIZADO)
+# ============================================================
+# Una sola definición de calcular_score_y_semaforo, semaforo_atr y
+# es_setup_perfecto para la API (main.py) y el dashboard (app.py).
+# Todo trabaja por columnas: puntuar 10k filas es una sola pasada.
+#
+# Reglas (igual que antes, fila por fila):
+#   Score (-6..6): MACD>Signal, RSI<30 / RSI>70, precio fuera de Bollinger,
+#                  EMA50>EMA200, precio>EMA50 y K>D
+#   Semáforo Final: >=4 COMPRA FUERTE | >=2 POSIBLE COMPRA | <=-4 VENTA FUERTE
+#                   | <=-2 POSIBLE VENTA | resto ESPERAR
+#   Setup perfecto: compra + volatilidad sana + Score>=3 + Riesgo%<=5
+#                   + precio <= P50 y < P80 (con percentiles calculados)
+
+UMBRALES = {
+    "rsi_sobreventa": 30,      # score +1 si RSI < esto
+    "rsi_sobrecompra": 70,     # score -1 si RSI > esto
+    "score_min": 3,            # setup perfecto: Score >= esto
+    "riesgo_max": 5.0,         # setup perfecto: Riesgo% <= esto
+    "atr_sana_min": 1.0,       # "VOLATILIDAD SANA": atr_min <= ATR% <= atr_max
+    "atr_sana_max": 3.0,
+    "atr_volatil_max": 4.0,    # "VOLATIL" hasta aquí, arriba "MUY VOLATIL"
+}
+
+COMPRA_FUERTE = "🟢 COMPRA FUERTE"
+POSIBLE_COMPRA = "🟢 POSIBLE COMPRA"
+ESPERAR = "🟡 ESPERAR"
+POSIBLE_VENTA = "🔴 POSIBLE VENTA"
+VENTA_FUERTE = "🔴 VENTA FUERTE"
+
+ATR_LENTA = "⚪ MUY LENTA"
+ATR_SANA = "🟢 VOLATILIDAD SANA"
+ATR_VOLATIL = "🟡 VOLATIL"
+ATR_MUY_VOLATIL = "🔴 MUY VOLATIL"
+ATR_SIN_DATO = "—"
+
+# Orden de prioridad del resumen: primero por señal y luego por volatilidad
+ORDEN_SEMAFORO = {COMPRA_FUERTE: 1, POSIBLE_COMPRA: 2, ESPERAR: 3, POSIBLE_VENTA: 4, VENTA_FUERTE: 5}
+ORDEN_ATR = {ATR_SANA: 1, ATR_VOLATIL: 2, ATR_MUY_VOLATIL: 3, ATR_LENTA: 4, ATR_SIN_DATO: 99, "": 99}
+
+
+def _umbrales(umbrales):
+    return UMBRALES if umbrales is None else {**UMBRALES, **umbrales}
+
+
+def to_float(x):
+    """float o None si viene vacío / NaN / no numérico."""
+    try:
+        if x is None or x == "":
+            return None
+        x = float(x)
+        return None if x != x else x   # NaN = sin dato
+    except:
+        return None
+
+
+def numerica(tabla, col):
+    """to_float de toda una columna: float64 con NaN donde no hay número."""
+    if col not in tabla:
+        return np.full(len(tabla), np.nan)
+    return pd.to_numeric(tabla[col], errors="coerce").to_numpy(dtype=float)
+
+
+# ============================================================
+#                  REGLAS SOBRE ARRAYS
+# ============================================================
+# Sirven igual para vectores (un valor por ticker) que para matrices
+# fechas × tickers (optimizador.py).
+def calcular_score(precio, macd, signal, rsi, lower, upper, ema50, ema200, K, D, umbrales=None):
+    """Score de -6 a 6 (NaN cuenta como condición no cumplida)."""
+    u = _umbrales(umbrales)
+    with np.errstate(invalid="ignore"):
+        score = np.where(macd > signal, 1, -1)
+        score = score + (rsi < u["rsi_sobreventa"]) - (rsi > u["rsi_sobrecompra"])
+        score = score + (precio < lower) - (precio > upper)
+        score = score + np.where(ema50 > ema200, 1, -1)
+        score = score + np.where(precio > ema50, 1, -1)
+        score = score + np.where(K > D, 1, -1)
+    return score
+
+
+def semaforo_final(score):
+    return np.select(
+        [score >= 4, score >= 2, score <= -4, score <= -2],
+        [COMPRA_FUERTE, POSIBLE_COMPRA, VENTA_FUERTE, POSIBLE_VENTA],
+        default=ESPERAR,
+    )
+
+
+def atr_sana(atr_pct, umbrales=None):
+    u = _umbrales(umbrales)
+    with np.errstate(invalid="ignore"):
+        return (atr_pct >= u["atr_sana_min"]) & (atr_pct <= u["atr_sana_max"])
+
+
+def semaforo_atr(atr_pct, umbrales=None):
+    """Semáforo de volatilidad por ATR% ("—" si no hay dato)."""
+    u = _umbrales(umbrales)
+    atr_pct = np.asarray(atr_pct, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return np.select(
+            [np.isnan(atr_pct),
+             atr_pct < u["atr_sana_min"],
+             atr_pct <= u["atr_sana_max"],
+             atr_pct <= u["atr_volatil_max"]],
+            [ATR_SIN_DATO, ATR_LENTA, ATR_SANA, ATR_VOLATIL],
+            default=ATR_MUY_VOLATIL,
+        )
+
+
+def mascara_setup(score, atr_pct, riesgo_pct, precio, soporte, medio, cara, umbrales=None):
+    """
+    es_setup_perfecto por columnas. Riesgo% solo existe en señales de
+    compra, así que NaN ahí (o en los percentiles) descarta la fila.
+    """
+    u = _umbrales(umbrales)
+    with np.errstate(invalid="ignore"):
+        return (
+            (score >= 2)                          # 1) COMPRA FUERTE / POSIBLE COMPRA
+            & atr_sana(atr_pct, u)                # 2) volatilidad operable
+            & (score >= u["score_min"])           # 3) score mínimo
+            & (riesgo_pct <= u["riesgo_max"])     # 4) riesgo máximo
+            & ~np.isnan(soporte)                  # 5) zona barata: <= P50 y < P80
+            & (precio <= medio)
+            & (precio < cara)
+        )
+
+
+# ============================================================
+#                  SOBRE LA TABLA DE RESULTADOS
+# ============================================================
+def puntuar(tabla, umbrales=None):
+    """
+    Agrega Score, Semáforo Final y Semáforo ATR a la tabla (en su lugar)
+    y la regresa. Acepta la tabla cruda (lote.a_dataframe()) o la ya
+    formateada ("" donde no hay dato).
+    """
+    n = {c: numerica(tabla, c) for c in (
+        "Precio", "MACD", "Signal", "RSI", "Banda Inferior", "Banda Superior",
+        "EMA50", "EMA200", "K", "D", "ATR%")}
+
+    score = calcular_score(
+        n["Precio"], n["MACD"], n["Signal"], n["RSI"],
+        n["Banda Inferior"], n["Banda Superior"], n["EMA50"], n["EMA200"],
+        n["K"], n["D"], umbrales,
+    )
+    tabla["Score"] = score
+    tabla["Semáforo Final"] = semaforo_final(score)
+    tabla["Semáforo ATR"] = semaforo_atr(n["ATR%"], umbrales)
+    return tabla
+
+
+def setups_perfectos(tabla, umbrales=None):
+    """Máscara booleana (Series) de setups perfectos de una tabla ya puntuada."""
+    mascara = mascara_setup(
+        numerica(tabla, "Score"), numerica(tabla, "ATR%"), numerica(tabla, "Riesgo%"),
+        numerica(tabla, "Precio"), numerica(tabla, "Soporte Estadístico"),
+        numerica(tabla, "Precio Medio"), numerica(tabla, "Zona Cara"), umbrales,
+    )
+    return pd.Series(mascara, index=tabla.index)
+
+
+def razones_score(tabla, umbrales=None):
+    """
+    Explicación corta del score (las 4 primeras razones) por fila,
+    para las tarjetas del dashboard.
+    """
+    u = _umbrales(umbrales)
+    rsi = numerica(tabla, "RSI")
+    boll = tabla["Bollinger Señal"].to_numpy(dtype=object)
+    with np.errstate(invalid="ignore"):
+        macd = np.where(numerica(tabla, "MACD") > numerica(tabla, "Signal"),
+                        "MACD alcista", "MACD bajista")
+        rsi = np.select(
+            [rsi < u["rsi_sobreventa"], rsi > u["rsi_sobrecompra"]],
+            [f"RSI sobreventa (<{u['rsi_sobreventa']})", f"RSI sobrecompra (>{u['rsi_sobrecompra']})"],
+            default=f"RSI normal ({u['rsi_sobreventa']}–{u['rsi_sobrecompra']})",
+        )
+    boll = np.select([boll == "Sobreventa", boll == "Sobrecompra"],
+                     ["Bollinger sobreventa", "Bollinger sobrecompra"],
+                     default="Bollinger normal")
+    tendencia = np.where(tabla["Tendencia"].to_numpy(dtype=object) == "Alcista",
+                         "Tendencia alcista (EMA50>EMA200)", "Tendencia bajista (EMA50<EMA200)")
+
+    # Siempre son 6 razones, así que siempre lleva " | ..."
+    texto = pd.Series(macd, index=tabla.index).str.cat(
+        [pd.Series(x, index=tabla.index) for x in (rsi, boll, tendencia)], sep=" | ")
+    return texto + " | ..."
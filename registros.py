@@ -0,0 +1,395 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+#        REGISTROS TIPADOS (NaN = SIN DATO, SIN REDONDEO)
+# ============================================================
+# Internamente todo es float (NaN donde antes había "") y el redondeo y
+# los "" solo se aplican al presentar (a_dict / formatear_tabla), así el
+# scoring y los filtros ya no tienen que re-parsear strings.
+
+# (columna de presentación, atributo, decimales)
+NUMERICAS = [
+    ("Precio", "precio", 2),
+    ("MACD", "macd", 4),
+    ("Signal", "signal", 4),
+    ("Banda Superior", "banda_superior", 2),
+    ("Banda Inferior", "banda_inferior", 2),
+    ("K", "k", 2),
+    ("D", "d", 2),
+    ("J", "j", 2),
+    ("RSI", "rsi", 2),
+    ("EMA20", "ema20", 2),
+    ("EMA50", "ema50", 2),
+    ("EMA200", "ema200", 2),
+    ("Soporte Estadístico", "soporte", 2),
+    ("Precio Medio", "precio_medio", 2),
+    ("Zona Cara", "zona_cara", 2),
+    ("ATR14", "atr14", 4),
+    ("ATR%", "atr_pct", 2),
+    ("Stop Sugerido", "stop", 2),
+    ("TP1", "tp1", 2),
+    ("TP2", "tp2", 2),
+    ("Riesgo%", "riesgo_pct", 2),
+]
+
+# (columna de presentación, atributo)
+TEXTOS = [
+    ("MACD Señal", "macd_estado"),
+    ("Bollinger Señal", "bollinger_estado"),
+    ("KDJ Señal", "kdj_estado"),
+    ("RSI Estado", "rsi_estado"),
+    ("Tendencia", "tendencia"),
+    ("Precio EMA50", "precio_ema50"),
+    ("Señal Final", "senal"),
+    ("Tipo Stop", "tipo_stop"),
+]
+
+# Columnas que analizar_con_data dejaba en "" cuando no aplican
+OPCIONALES = {"Soporte Estadístico", "Precio Medio", "Zona Cara",
+              "Stop Sugerido", "TP1", "TP2", "Riesgo%"}
+
+# Orden original del dict de analizar_con_data
+ORDEN = [
+    "Fecha", "Ticker", "Precio",
+    "MACD", "Signal", "MACD Señal",
+    "Banda Superior", "Banda Inferior", "Bollinger Señal",
+    "K", "D", "J", "KDJ Señal",
+    "RSI", "RSI Estado",
+    "EMA20", "EMA50", "EMA200",
+    "Tendencia", "Precio EMA50",
+    "Señal Final",
+    "Soporte Estadístico", "Precio Medio", "Zona Cara",
+    "ATR14", "ATR%", "Tipo Stop", "Stop Sugerido", "TP1", "TP2", "Riesgo%",
+    "Explicación",
+]
+
+DECIMALES = {col: dec for col, _, dec in NUMERICAS}
+COLUMNA_DE = {attr: col for col, attr, _ in NUMERICAS} | {attr: col for col, attr in TEXTOS}
+ATRIBUTOS_NUM = [attr for _, attr, _ in NUMERICAS]
+ATRIBUTOS_TXT = [attr for _, attr in TEXTOS]
+
+COMPRAS = ("COMPRA FUERTE", "POSIBLE COMPRA")
+
+
+def _fecha_ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+
+def explicacion(macd_estado, kdj_estado, bollinger_estado, rsi_estado, tendencia, precio_ema50):
+    return (
+        f"MACD: {macd_estado} | "
+        f"KDJ: {kdj_estado} | "
+        f"Bollinger: {bollinger_estado} | "
+        f"RSI: {rsi_estado} | "
+        f"Tendencia (EMA50/EMA200): {tendencia} | "
+        f"Precio vs EMA50: {precio_ema50}"
+    )
+
+
+def _presentar(col, valor):
+    """Redondeo / "" de una celda, igual que el dict original."""
+    if col in OPCIONALES and (valor is None or valor != valor):
+        return ""
+    if col in DECIMALES:
+        return round(float(valor), DECIMALES[col])
+    return valor
+
+
+def presentar(r):
+    """Redondeo y "" de presentación de un dict (los registros internos van sin redondear)."""
+    return {k: _presentar(k, v) for k, v in r.items()}
+
+
+# ============================================================
+#                 UN TICKER (SLOTS, SIN DICT)
+# ============================================================
+class ResultadoAnalisis:
+    __slots__ = ("fecha", "ticker", *ATRIBUTOS_NUM, *ATRIBUTOS_TXT)
+
+    def __init__(self, ticker, fecha=None, **valores):
+        self.ticker = ticker
+        self.fecha = fecha or _fecha_ahora()
+        for attr in ATRIBUTOS_NUM:
+            v = valores.get(attr)
+            setattr(self, attr, float("nan") if v is None else float(v))
+        for attr in ATRIBUTOS_TXT:
+            setattr(self, attr, valores.get(attr, ""))
+
+    def a_dict(self):
+        """Dict de presentación (el mismo que siempre regresó analizar_con_data)."""
+        d = {"Fecha": self.fecha, "Ticker": self.ticker}
+        for attr in ATRIBUTOS_NUM:
+            col = COLUMNA_DE[attr]
+            d[col] = _presentar(col, getattr(self, attr))
+        for attr in ATRIBUTOS_TXT:
+            d[COLUMNA_DE[attr]] = getattr(self, attr)
+        d["Explicación"] = explicacion(
+            self.macd_estado, self.kdj_estado, self.bollinger_estado,
+            self.rsi_estado, self.tendencia, self.precio_ema50,
+        )
+        return {k: d[k] for k in ORDEN}
+
+    def __repr__(self):
+        return f"ResultadoAnalisis({self.ticker!r}, precio={self.precio}, señal={self.senal!r})"
+
+
+def armar_registro(ticker, precio,
+                   macd, signal, upper, lower, K, D, J, rsi,
+                   ema20, ema50, ema200, atr14,
+                   soporte_est, precio_medio, zona_cara,
+                   fecha=None):
+    """Estados + señal + stop/TP de un ticker a partir de sus indicadores."""
+    atr_pct = (atr14 / precio) * 100 if precio else 0
+
+    # -------- ESTADOS --------
+    macd_estado = "Alcista" if macd > signal else "Bajista"
+    kdj_estado = "Alcista" if K > D else "Bajista"
+
+    if precio < lower:
+        bollinger_estado = "Sobreventa"
+    elif precio > upper:
+        bollinger_estado = "Sobrecompra"
+    else:
+        bollinger_estado = "Normal"
+
+    if rsi < 30:
+        rsi_estado = "Sobreventa"
+    elif rsi > 70:
+        rsi_estado = "Sobrecompra"
+    else:
+        rsi_estado = "Normal"
+
+    tendencia = "Alcista" if ema50 > ema200 else "Bajista"
+    precio_ema50 = "Arriba" if precio > ema50 else "Debajo"
+
+    # -------- SEÑAL FINAL --------
+    if macd > signal and rsi < 35 and precio < lower and tendencia == "Alcista":
+        señal = "COMPRA FUERTE"
+    elif macd < signal and rsi > 70 and precio > upper and tendencia == "Bajista":
+        señal = "VENTA FUERTE"
+    elif macd > signal or K > D:
+        señal = "POSIBLE COMPRA"
+    elif macd < signal or K < D:
+        señal = "POSIBLE VENTA"
+    else:
+        señal = "ESPERAR"
+
+    # Stop/TP sugeridos SOLO para compras
+    if señal in COMPRAS:
+        mult = 2.0 if señal == "COMPRA FUERTE" else 1.5
+        tipo_stop = "Conservador (2 ATR)" if mult == 2.0 else "Agresivo (1.5 ATR)"
+        stop_sugerido = precio - (mult * atr14)
+        riesgo = precio - stop_sugerido
+        tp1 = precio + (1.0 * riesgo)
+        tp2 = precio + (2.0 * riesgo)
+        riesgo_pct = (riesgo / precio) * 100 if precio else 0
+    else:
+        tipo_stop = "—"
+        stop_sugerido = None
+        tp1 = None
+        tp2 = None
+        riesgo_pct = None
+
+    return ResultadoAnalisis(
+        ticker, fecha=fecha,
+        precio=precio, macd=macd, signal=signal,
+        banda_superior=upper, banda_inferior=lower,
+        k=K, d=D, j=J, rsi=rsi,
+        ema20=ema20, ema50=ema50, ema200=ema200,
+        soporte=soporte_est, precio_medio=precio_medio, zona_cara=zona_cara,
+        atr14=atr14, atr_pct=atr_pct,
+        stop=stop_sugerido, tp1=tp1, tp2=tp2, riesgo_pct=riesgo_pct,
+        macd_estado=macd_estado, bollinger_estado=bollinger_estado,
+        kdj_estado=kdj_estado, rsi_estado=rsi_estado,
+        tendencia=tendencia, precio_ema50=precio_ema50,
+        senal=señal, tipo_stop=tipo_stop,
+    )
+
+
+# ============================================================
+#            LOTE COLUMNAR (UN ARRAY POR CAMPO)
+# ============================================================
+class LoteResultados:
+    """
+    Resultados de muchos tickers guardados por columna:
+      numericas[attr] -> np.ndarray float64 (NaN = sin dato)
+      textos[attr]    -> np.ndarray object
+    a_dataframe() envuelve esos arrays sin copiarlos.
+    """
+    __slots__ = ("tickers", "fecha", "numericas", "textos")
+
+    def __init__(self, tickers, fecha, numericas, textos):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.fecha = fecha
+        self.numericas = numericas
+        self.textos = textos
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def vacio(cls):
+        return cls([], _fecha_ahora(),
+                   {a: np.empty(0) for a in ATRIBUTOS_NUM},
+                   {a: np.empty(0, dtype=object) for a in ATRIBUTOS_TXT})
+
+    @classmethod
+    def desde_indicadores(cls, tickers, ind, fecha=None):
+        """
+        Versión vectorizada de armar_registro: 'ind' trae un vector por
+        indicador (precio, macd, signal, upper, lower, K, D, J, rsi, ema20,
+        ema50, ema200, atr14, p20, p50, p80) alineado con 'tickers'.
+        """
+        precio, macd, signal = ind["precio"], ind["macd"], ind["signal"]
+        upper, lower, K, D = ind["upper"], ind["lower"], ind["K"], ind["D"]
+        rsi, ema50, ema200, atr14 = ind["rsi"], ind["ema50"], ind["ema200"], ind["atr14"]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            atr_pct = np.where(precio != 0, atr14 / precio * 100, 0.0)
+
+            # -------- ESTADOS --------
+            macd_alcista = macd > signal
+            kdj_alcista = K > D
+            tendencia_alcista = ema50 > ema200
+            boll = np.where(precio < lower, "Sobreventa",
+                            np.where(precio > upper, "Sobrecompra", "Normal"))
+            rsi_estado = np.where(rsi < 30, "Sobreventa",
+                                  np.where(rsi > 70, "Sobrecompra", "Normal"))
+
+            # -------- SEÑAL FINAL --------
+            compra_fuerte = macd_alcista & (rsi < 35) & (precio < lower) & tendencia_alcista
+            venta_fuerte = (macd < signal) & (rsi > 70) & (precio > upper) & ~tendencia_alcista
+            senal = np.select(
+                [compra_fuerte, venta_fuerte, macd_alcista | kdj_alcista, (macd < signal) | (K < D)],
+                ["COMPRA FUERTE", "VENTA FUERTE", "POSIBLE COMPRA", "POSIBLE VENTA"],
+                default="ESPERAR",
+            )
+
+            # -------- STOP / TP (solo compras) --------
+            compra = (senal == "COMPRA FUERTE") | (senal == "POSIBLE COMPRA")
+            mult = np.where(senal == "COMPRA FUERTE", 2.0, 1.5)
+            riesgo = np.where(compra, mult * atr14, np.nan)
+            stop = precio - riesgo
+            riesgo = precio - stop
+            riesgo_pct = np.where(precio != 0, riesgo / precio * 100, np.where(compra, 0.0, np.nan))
+            tipo_stop = np.where(senal == "COMPRA FUERTE", "Conservador (2 ATR)",
+                                 np.where(compra, "Agresivo (1.5 ATR)", "—"))
+
+        numericas = {
+            "precio": precio, "macd": macd, "signal": signal,
+            "banda_superior": upper, "banda_inferior": lower,
+            "k": K, "d": D, "j": ind["J"], "rsi": rsi,
+            "ema20": ind["ema20"], "ema50": ema50, "ema200": ema200,
+            "soporte": ind["p20"], "precio_medio": ind["p50"], "zona_cara": ind["p80"],
+            "atr14": atr14, "atr_pct": atr_pct,
+            "stop": stop, "tp1": precio + riesgo, "tp2": precio + 2.0 * riesgo,
+            "riesgo_pct": riesgo_pct,
+        }
+        textos = {
+            "macd_estado": np.where(macd_alcista, "Alcista", "Bajista"),
+            "bollinger_estado": boll,
+            "kdj_estado": np.where(kdj_alcista, "Alcista", "Bajista"),
+            "rsi_estado": rsi_estado,
+            "tendencia": np.where(tendencia_alcista, "Alcista", "Bajista"),
+            "precio_ema50": np.where(precio > ema50, "Arriba", "Debajo"),
+            "senal": senal,
+            "tipo_stop": tipo_stop,
+        }
+        numericas = {k: np.asarray(v, dtype=float) for k, v in numericas.items()}
+        textos = {k: np.asarray(v, dtype=object) for k, v in textos.items()}
+        return cls(tickers, fecha or _fecha_ahora(), numericas, textos)
+
+    @classmethod
+    def desde_registros(cls, registros):
+        registros = list(registros)
+        if not registros:
+            return cls.vacio()
+        return cls(
+            [r.ticker for r in registros], registros[0].fecha,
+            {a: np.array([getattr(r, a) for r in registros], dtype=float) for a in ATRIBUTOS_NUM},
+            {a: np.array([getattr(r, a) for r in registros], dtype=object) for a in ATRIBUTOS_TXT},
+        )
+
+    @classmethod
+    def concatenar(cls, lotes):
+        lotes = [l for l in lotes if len(l)]
+        if not lotes:
+            return cls.vacio()
+        return cls(
+            np.concatenate([l.tickers for l in lotes]), lotes[0].fecha,
+            {a: np.concatenate([l.numericas[a] for l in lotes]) for a in ATRIBUTOS_NUM},
+            {a: np.concatenate([l.textos[a] for l in lotes]) for a in ATRIBUTOS_TXT},
+        )
+
+    def tomar(self, indices):
+        """Sub-lote con las filas indicadas (máscara booleana o posiciones)."""
+        return LoteResultados(
+            self.tickers[indices], self.fecha,
+            {a: v[indices] for a, v in self.numericas.items()},
+            {a: v[indices] for a, v in self.textos.items()},
+        )
+
+    def registro(self, i):
+        valores = {a: self.numericas[a][i] for a in ATRIBUTOS_NUM}
+        valores.update({a: self.textos[a][i] for a in ATRIBUTOS_TXT})
+        return ResultadoAnalisis(self.tickers[i], fecha=self.fecha, **valores)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.registro(i)
+
+    def a_dataframe(self):
+        """
+        DataFrame crudo (float sin redondear, NaN = sin dato) con los nombres
+        de columna de siempre. Los arrays se envuelven, no se copian.
+        """
+        columnas = {"Fecha": np.full(len(self), self.fecha, dtype=object), "Ticker": self.tickers}
+        for col, attr, _ in NUMERICAS:
+            columnas[col] = self.numericas[attr]
+        for col, attr in TEXTOS:
+            columnas[col] = self.textos[attr]
+        return pd.DataFrame(columnas, copy=False)
+
+    def a_dicts(self):
+        """Lista de dicts de presentación (como analizar_con_data)."""
+        return [r.a_dict() for r in self]
+
+
+# ============================================================
+#               PRESENTACIÓN (REDONDEO + "")
+# ============================================================
+def formatear_tabla(tabla):
+    """
+    Copia de la tabla lista para mostrar/exportar: redondea cada columna
+    como el dict original, deja "" donde no hay dato y agrega Explicación.
+    Las columnas extra (Score, Semáforos...) se conservan al final.
+    """
+    salida = tabla.copy()
+    for col, dec in DECIMALES.items():
+        if col not in salida:
+            continue
+        # round() de Python (no el de NumPy) para dar exactamente lo mismo que el dict
+        salida[col] = [_presentar(col, v) for v in salida[col].to_numpy(dtype=float)]
+
+    if "Explicación" not in salida and len(salida):
+        salida["Explicación"] = [
+            explicacion(*fila) for fila in zip(
+                salida["MACD Señal"], salida["KDJ Señal"], salida["Bollinger Señal"],
+                salida["RSI Estado"], salida["Tendencia"], salida["Precio EMA50"],
+            )
+        ]
+
+    base = [c for c in ORDEN if c in salida]
+    extra = [c for c in salida.columns if c not in base]
+    return salida[base + extra]
+
+
+def registros_json(tabla):
+    """formatear_tabla como lista de dicts para la API (NaN -> None, JSON no acepta NaN)."""
+    return [
+        {k: (None if isinstance(v, float) and v != v else v) for k, v in r.items()}
+        for r in formatear_tabla(tabla).to_dict("records")
+    ]
@@ -0,0 +1,778 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from analisis_vectorizado import como_panel
+from bot_trading import descargar_batch, acciones_mx, acciones_usa
+from calendario_mercados import datos_al_dia, normalizar_mercado
+from ejecutor_scan import escanear
+from indicadores_streaming import estados_ticker
+from proveedores import get_proveedor
+from puntuacion import UMBRALES, puntuar, setups_perfectos
+from registros import LoteResultados, presentar
+
+# ============================================================
+#        SERVICIO DE ESCANEO (CACHE EN PROCESO + SWR)
+# ============================================================
+# Un escaneo = descargar_batch + motor vectorizado + puntuar. El resultado
+# se guarda por (mercado, versión de datos) durante SCAN_CACHE_TTL
+# segundos. Pasado el TTL se sigue sirviendo el resultado viejo al
+# instante y UN solo hilo en segundo plano lo recalcula
+# (stale-while-revalidate): n8n ya no paga la latencia del escaneo.
+#
+# Además, escaneos idénticos simultáneos se juntan en uno solo
+# (single-flight): si 5 clientes piden USA a la vez hay UNA descarga y
+# UNA pasada de CPU, y los 5 reciben el mismo resultado.
+#
+# Para la API async: la descarga corre en un pool de hilos de I/O y el
+# análisis en otro de CPU, así el event loop nunca se bloquea y se
+# pueden descargar MX y USA en paralelo.
+
+SCAN_CACHE_TTL = int(os.environ.get("SCAN_CACHE_TTL", "300"))
+SCAN_CACHE_TTL_PARCIAL = int(os.environ.get("SCAN_CACHE_TTL_PARCIAL", "30"))   # escaneos con warning
+SCAN_HILOS_DESCARGA = int(os.environ.get("SCAN_HILOS_DESCARGA", "4"))
+SCAN_HILOS_ANALISIS = int(os.environ.get("SCAN_HILOS_ANALISIS", "2"))
+SCAN_TAM_PARTE = int(os.environ.get("SCAN_TAM_PARTE", "50"))   # tickers por parte (streaming)
+
+# Listas personalizadas (POST /escaneo): límites por request
+LISTA_MAX_TICKERS = int(os.environ.get("LISTA_MAX_TICKERS", "5000"))
+LISTA_MAX_DESCARGAS = int(os.environ.get("LISTA_MAX_DESCARGAS", "1000"))   # tickers que no están en cache
+LISTA_TAM_BLOQUE = int(os.environ.get("LISTA_TAM_BLOQUE", "200"))          # tickers por llamada al proveedor
+
+TZ = pytz.timezone("America/Mazatlan")
+
+
+def universo(mercado):
+    """Tickers del mercado ("MX" = BMV, cualquier otro = USA, como antes)."""
+    return acciones_mx if normalizar_mercado(mercado) == "MX" else acciones_usa
+
+
+def version_datos(period="2y", interval="1d"):
+    """
+    Qué datos produce un escaneo: fuente, ventana y umbrales del score.
+    Si cambia cualquiera (p.ej. set_proveedor) el cache viejo ya no aplica.
+    """
+    return (get_proveedor().nombre, period, interval, tuple(sorted(UMBRALES.items())))
+
+
+def firmas_ultimas_velas(batch, tickers):
+    """
+    "ticker|fecha|close" de la última vela de cada ticker. Incluye el close
+    porque la vela de hoy cambia durante la sesión sin cambiar de fecha.
+    """
+    if not len(tickers) or not len(batch.index):
+        return []
+    close = batch.xs("Close", axis=1, level=1).reindex(columns=list(tickers)).to_numpy(dtype=float)
+    validos = ~np.isnan(close)
+    ultima = len(close) - 1 - np.argmax(validos[::-1], axis=0)
+    fechas = batch.index[ultima]
+    valores = close[ultima, np.arange(close.shape[1])]
+    return [
+        f"{t}|{f.isoformat()}|{float(v)!r}" if ok else f"{t}|-"
+        for t, f, v, ok in zip(tickers, fechas, valores, validos.any(axis=0))
+    ]
+
+
+class ResultadoScan:
+    """Resultado de escanear un mercado (tabla cruda ya puntuada)."""
+
+    def __init__(self, mercado, tabla, faltantes, timestamp, fecha_datos=None, warning=None, firmas=None):
+        self.mercado = mercado
+        self.tabla = tabla
+        self.faltantes = faltantes
+        self.timestamp = timestamp        # hora del escaneo (America/Mazatlan)
+        self.fecha_datos = fecha_datos    # última vela del panel
+        self.warning = warning
+        self.firmas = firmas or []        # última vela de cada ticker (ver version)
+        self.creado = time.time()
+        self._version = None
+        self.derivados = {}               # índices precalculados sobre este snapshot
+
+    @property
+    def version(self):
+        """
+        Versión del contenido (para ETag): hash de la última vela de cada
+        ticker + los umbrales del score. Mismos datos = misma versión,
+        aunque el escaneo se haya repetido (o hecho por partes).
+        """
+        if self._version is None:
+            h = hashlib.sha1(repr(sorted(UMBRALES.items())).encode())
+            h.update(self.mercado.encode())
+            for firma in self.firmas:
+                h.update(firma.encode() + b";")
+            self._version = h.hexdigest()[:20]
+        return self._version
+
+    def edad(self):
+        """Segundos desde que se calculó."""
+        return time.time() - self.creado
+
+    def setups(self):
+        """Solo los setups perfectos."""
+        return self.tabla[setups_perfectos(self.tabla)]
+
+    @classmethod
+    def unir(cls, mercado, partes):
+        """Junta los resultados por partes de un mismo escaneo (en orden)."""
+        tabla = pd.concat([p.tabla for p in partes], ignore_index=True)
+        faltantes = [t for p in partes for t in p.faltantes]
+        fechas = [p.fecha_datos for p in partes if p.fecha_datos is not None]
+        warnings = [p.warning for p in partes if p.warning is not None]
+        return cls(mercado, tabla, faltantes, partes[0].timestamp,
+                   max(fechas) if fechas else None, warnings[0] if warnings else None,
+                   [f for p in partes for f in p.firmas])
+
+
+def setups_respuesta(resultado):
+    """Setups perfectos de un escaneo, en el formato de n8n/Telegram."""
+    setups = []
+    # Score + Semáforos + filtro de Setup Perfecto ya vienen calculados
+    # (mismo módulo que Streamlit), por columnas sobre todo el mercado
+    for r in resultado.setups().to_dict("records"):
+        # Aquí se redondea
+        r = presentar(r)
+        setups.append({
+            "ticker": r.get("Ticker"),
+            "tipo_senal": r.get("Semáforo Final"),
+            "precio_entrada": r.get("Precio"),
+            "stop_loss": r.get("Stop Sugerido"),
+            "tp1": r.get("TP1"),
+            "tp2": r.get("TP2"),
+            "riesgo_pct": r.get("Riesgo%"),
+            "atr_pct": r.get("ATR%"),
+            "score": r.get("Score"),
+            "soporte": r.get("Soporte Estadístico"),
+            "precio_medio": r.get("Precio Medio"),
+            "zona_cara": r.get("Zona Cara"),
+            "timestamp": resultado.timestamp,
+        })
+    return setups
+
+
+_pool_descarga = ThreadPoolExecutor(SCAN_HILOS_DESCARGA, thread_name_prefix="scan-descarga")
+_pool_analisis = ThreadPoolExecutor(SCAN_HILOS_ANALISIS, thread_name_prefix="scan-analisis")
+
+
+def _descargar(mercado, period, interval, acciones=None):
+    """Parte de I/O del escaneo: (acciones, batch, timestamp)."""
+    acciones = universo(mercado) if acciones is None else acciones
+    batch = descargar_batch(acciones, period=period, interval=interval)
+    timestamp = datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
+    return acciones, batch, timestamp
+
+
+def _analizar(mercado, acciones, batch, timestamp):
+    """Parte de CPU del escaneo: motor vectorizado + puntuar."""
+    sin_actualizar = batch.attrs.get("sin_actualizar", [])
+    batch = como_panel(batch, acciones)
+    # Validación del batch (MultiIndex)
+    if not isinstance(batch.columns, pd.MultiIndex):
+        return ResultadoScan(
+            mercado, puntuar(LoteResultados.vacio().a_dataframe()), list(acciones), timestamp,
+            warning="Batch no vino con MultiIndex (respuesta inesperada de yfinance).",
+        )
+
+    # Todos los indicadores del mercado en una sola pasada vectorizada
+    # (en shards sobre un process pool si el universo es muy grande)
+    lote, faltantes = escanear(batch, acciones)
+    fecha_datos = batch.index.max() if len(batch.index) else None
+    warning = None
+    if sin_actualizar:
+        # El cache de OHLCV no pudo traer el delta: se analizan velas viejas
+        warning = (f"No se pudo actualizar {len(sin_actualizar)} tickers; se usan sus últimas "
+                   f"velas guardadas: {', '.join(sin_actualizar[:10])}")
+    return ResultadoScan(mercado, puntuar(lote.a_dataframe()), faltantes, timestamp, fecha_datos,
+                         warning=warning, firmas=firmas_ultimas_velas(batch, acciones))
+
+
+def escanear_mercado(mercado, period="2y", interval="1d"):
+    """Escaneo completo (sin cache) de un mercado."""
+    mercado = normalizar_mercado(mercado)
+    return _analizar(mercado, *_descargar(mercado, period, interval))
+
+
+async def escanear_mercado_async(mercado, period="2y", interval="1d"):
+    """Igual que escanear_mercado, sin bloquear el event loop."""
+    mercado = normalizar_mercado(mercado)
+    loop = asyncio.get_running_loop()
+    datos = await loop.run_in_executor(_pool_descarga, _descargar, mercado, period, interval)
+    return await loop.run_in_executor(_pool_analisis, _analizar, mercado, *datos)
+
+
+class PartesEnCurso:
+    """
+    Partes de un escaneo por partes que va en curso. Quien llegue (el que
+    lo lanzó o los que se unen después) las lee todas desde la primera,
+    en orden, y espera las que faltan.
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.error = None
+        self.cerrado = False
+        self._aviso = Future()    # se resuelve con cada parte nueva o al cerrar
+        self._lock = threading.Lock()
+
+    def agregar(self, parte):
+        with self._lock:
+            self.partes.append(parte)
+            aviso, self._aviso = self._aviso, Future()
+        aviso.set_result(None)
+
+    def cerrar(self, error=None):
+        with self._lock:
+            self.error = error
+            self.cerrado = True
+            aviso = self._aviso
+        aviso.set_result(None)
+
+    def _siguiente(self, k):
+        """(parte k o None, Future a esperar o None si ya terminó)."""
+        with self._lock:
+            if k < len(self.partes):
+                return self.partes[k], None
+            if self.cerrado:
+                if self.error is not None:
+                    raise self.error
+                return None, None
+            return None, self._aviso
+
+    def leer(self):
+        k = 0
+        while True:
+            parte, aviso = self._siguiente(k)
+            if parte is not None:
+                yield parte
+                k += 1
+            elif aviso is None:
+                return
+            else:
+                aviso.result()
+
+    async def leer_async(self):
+        k = 0
+        while True:
+            parte, aviso = self._siguiente(k)
+            if parte is not None:
+                yield parte
+                k += 1
+            elif aviso is None:
+                return
+            else:
+                await _esperar(aviso)
+
+
+async def _esperar(futuro):
+    # shield: si el request que espera se cancela, el Future compartido no
+    return await asyncio.shield(asyncio.wrap_future(futuro))
+
+
+class VueloUnico:
+    """
+    Single-flight: mientras haya un cálculo en curso para una clave, las
+    demás llamadas con esa clave esperan y reciben su mismo resultado
+    (o su misma excepción) en vez de repetir el trabajo. Sirve igual
+    para llamadas normales (hacer) que async (hacer_async): ambas
+    esperan el mismo Future. Un escaneo por partes (por_partes) ocupa
+    la misma clave y además publica sus partes.
+    """
+
+    def __init__(self):
+        self._en_curso = {}
+        self._partes = {}
+        self._lock = threading.Lock()
+
+    def _unirse(self, clave, por_partes=False):
+        """(Future, PartesEnCurso o None, ¿es el líder?)"""
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                return futuro, self._partes.get(clave), False
+            futuro = self._en_curso[clave] = Future()
+            partes = self._partes[clave] = PartesEnCurso() if por_partes else None
+            return futuro, partes, True
+
+    def _terminar(self, clave, futuro, resultado=None, error=None):
+        with self._lock:
+            del self._en_curso[clave]
+            self._partes.pop(clave, None)
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(resultado)
+
+    def hacer(self, clave, funcion, *args):
+        futuro, _, lider = self._unirse(clave)
+        if not lider:
+            return futuro.result()
+
+        try:
+            resultado = funcion(*args)
+        except BaseException as e:
+            self._terminar(clave, futuro, error=e)
+            raise
+        self._terminar(clave, futuro, resultado)
+        return resultado
+
+    async def hacer_async(self, clave, corrutina, *args):
+        futuro, _, lider = self._unirse(clave)
+        if lider:
+            # El cálculo vive en su propia tarea: si el request que lo
+            # lanzó se cancela, los demás que esperan no se quedan sin él.
+            tarea = asyncio.ensure_future(corrutina(*args))
+
+            def _al_terminar(t):
+                if t.cancelled():
+                    self._terminar(clave, futuro, error=asyncio.CancelledError())
+                elif t.exception() is not None:
+                    self._terminar(clave, futuro, error=t.exception())
+                else:
+                    self._terminar(clave, futuro, t.result())
+
+            tarea.add_done_callback(_al_terminar)
+
+        return await _esperar(futuro)
+
+    def por_partes(self, clave, funcion, *args):
+        """
+        (Future, PartesEnCurso o None). El líder lanza funcion(*args, partes)
+        en un hilo propio: va publicando cada parte y regresa el resultado
+        unido. Si el vuelo en curso es un cálculo normal no hay partes
+        (None) y solo queda esperar el Future.
+        """
+        futuro, partes, lider = self._unirse(clave, por_partes=True)
+        if lider:
+            def correr():
+                try:
+                    resultado = funcion(*args, partes)
+                except BaseException as e:
+                    partes.cerrar(e)
+                    self._terminar(clave, futuro, error=e)
+                    return
+                partes.cerrar()
+                self._terminar(clave, futuro, resultado)
+
+            threading.Thread(target=correr, daemon=True, name=f"scan-partes-{clave[0]}").start()
+        return futuro, partes
+
+
+_vuelos = VueloUnico()
+
+
+def escanear_compartido(mercado, period="2y", interval="1d"):
+    """
+    escanear_mercado con single-flight (sin TTL): lo usan la API y el
+    dashboard. El resultado es compartido; no modificar resultado.tabla
+    en su lugar (hacer .copy()).
+    """
+    mercado = normalizar_mercado(mercado)
+    clave = (mercado,) + version_datos(period, interval)
+    return _vuelos.hacer(clave, escanear_mercado, mercado, period, interval)
+
+
+async def escanear_compartido_async(mercado, period="2y", interval="1d"):
+    """escanear_compartido para la API async (comparte vuelos con la versión normal)."""
+    mercado = normalizar_mercado(mercado)
+    clave = (mercado,) + version_datos(period, interval)
+    return await _vuelos.hacer_async(clave, escanear_mercado_async, mercado, period, interval)
+
+
+class CacheScan:
+    """
+    Cache de resultados por (mercado, versión de datos) con TTL.
+
+      resultado, estado = cache_scan.obtener("USA")
+      resultado, estado = await cache_scan.obtener_async("USA")
+
+    estado: "nuevo" (se calculó ahora), "fresco" (dentro del TTL, o
+    calculado después del último cierre con la bolsa cerrada) o "viejo"
+    (ya se está recalculando en segundo plano). Un resultado parcial (con
+    warning) solo es fresco durante ttl_parcial, también con la bolsa
+    cerrada: el siguiente request lo revalida.
+    """
+
+    def __init__(self, calcular=escanear_compartido, calcular_async=escanear_compartido_async,
+                 ttl=None, ttl_parcial=None):
+        self.calcular = calcular
+        self.calcular_async = calcular_async
+        self.ttl = SCAN_CACHE_TTL if ttl is None else ttl
+        self.ttl_parcial = SCAN_CACHE_TTL_PARCIAL if ttl_parcial is None else ttl_parcial
+        self._entradas = {}
+        self._refrescando = set()
+        self._tareas = set()
+        self._lock = threading.Lock()
+        # f(mercado, resultado) por cada escaneo nuevo que se guarda (alertas.py)
+        self.suscriptores = []
+
+    def _guardar(self, clave, resultado):
+        # Un escaneo fallido (sin MultiIndex) no pisa uno bueno ni se cachea.
+        # Uno por partes al que solo le falló alguna parte sí se guarda con
+        # su warning si no hay uno completo (así no se repite el escaneo).
+        if resultado.warning is not None and resultado.tabla.empty:
+            return
+        with self._lock:
+            anterior = self._entradas.get(clave)
+            if resultado.warning is not None and anterior is not None and anterior.warning is None:
+                return
+            self._entradas[clave] = resultado
+        # El mismo resultado compartido (single-flight) se guarda una sola vez
+        if resultado is not anterior:
+            for f in self.suscriptores:
+                try:
+                    f(clave[0], resultado)
+                except Exception:
+                    pass
+
+    def _fresco(self, mercado, resultado):
+        # Parcial (chunks caídos, tickers sin actualizar): TTL corto, para
+        # que no se sirva como "fresco" hasta que venza el TTL normal
+        if resultado.warning is not None:
+            return resultado.edad() < self.ttl_parcial
+        # Con la bolsa cerrada los datos no cambian: no se vuelve a
+        # descargar en la noche, fines de semana ni feriados
+        return resultado.edad() < self.ttl or datos_al_dia(mercado, resultado.creado)
+
+    def _vigente(self, mercado):
+        """(clave, resultado o None, ¿hay que lanzar el refresco?)"""
+        clave = (mercado, version_datos())
+        with self._lock:
+            resultado = self._entradas.get(clave)
+            refrescar = (resultado is not None and not self._fresco(mercado, resultado)
+                         and clave not in self._refrescando)
+            if refrescar:
+                self._refrescando.add(clave)
+        return clave, resultado, refrescar
+
+    def _estado(self, mercado, resultado):
+        return "fresco" if self._fresco(mercado, resultado) else "viejo"
+
+    def _refrescar(self, clave, mercado):
+        try:
+            self._guardar(clave, self.calcular(mercado))
+        except Exception:
+            pass   # se queda el resultado viejo; el siguiente request reintenta
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
+
+    async def _refrescar_async(self, clave, mercado):
+        try:
+            self._guardar(clave, await self.calcular_async(mercado))
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
+
+    def obtener(self, mercado):
+        mercado = normalizar_mercado(mercado)
+        clave, resultado, refrescar = self._vigente(mercado)
+        if refrescar:
+            threading.Thread(target=self._refrescar, args=(clave, mercado), daemon=True).start()
+
+        if resultado is None:
+            # Varios requests sin cache a la vez -> un solo cálculo
+            resultado = self.calcular(mercado)
+            self._guardar(clave, resultado)
+            return resultado, "nuevo"
+
+        return resultado, self._estado(mercado, resultado)
+
+    async def obtener_async(self, mercado):
+        mercado = normalizar_mercado(mercado)
+        clave, resultado, refrescar = self._vigente(mercado)
+        if refrescar:
+            tarea = asyncio.ensure_future(self._refrescar_async(clave, mercado))
+            self._tareas.add(tarea)   # referencia viva hasta que termine
+            tarea.add_done_callback(self._tareas.discard)
+
+        if resultado is None:
+            resultado = await self.calcular_async(mercado)
+            self._guardar(clave, resultado)
+            return resultado, "nuevo"
+
+        return resultado, self._estado(mercado, resultado)
+
+    async def refrescar_async(self, mercado):
+        """Recalcula ya (sin mirar el TTL) y guarda; lo usa el precálculo."""
+        mercado = normalizar_mercado(mercado)
+        resultado = await self.calcular_async(mercado)
+        self._guardar((mercado, version_datos()), resultado)
+        return resultado
+
+    def guardado(self, mercado):
+        """El último resultado guardado (fresco o viejo), o None; no calcula nada."""
+        with self._lock:
+            return self._entradas.get((normalizar_mercado(mercado), version_datos()))
+
+    def fresco(self, mercado):
+        """El resultado guardado si sigue fresco (sin lanzar refrescos), o None."""
+        mercado = normalizar_mercado(mercado)
+        with self._lock:
+            resultado = self._entradas.get((mercado, version_datos()))
+        if resultado is not None and self._fresco(mercado, resultado):
+            return resultado
+        return None
+
+    def invalidar(self, mercado=None):
+        with self._lock:
+            if mercado is None:
+                self._entradas.clear()
+            else:
+                for clave in [c for c in self._entradas if c[0] == normalizar_mercado(mercado)]:
+                    del self._entradas[clave]
+
+
+cache_scan = CacheScan()
+
+
+def _escanear_partes(mercado, tam, period, interval, partes):
+    """
+    El escaneo por partes en sí (lo corre el líder del vuelo): publica
+    cada parte en 'partes' en cuanto se analiza, guarda el resultado
+    unido en cache_scan y lo regresa. La descarga de la parte siguiente
+    corre en _pool_descarga mientras se analiza la actual.
+    """
+    tam = tam or SCAN_TAM_PARTE
+    acciones = universo(mercado)
+    grupos = [acciones[i:i + tam] for i in range(0, len(acciones), tam)]
+
+    lista = []
+    siguiente = _pool_descarga.submit(_descargar, mercado, period, interval, grupos[0]) if grupos else None
+    for k in range(len(grupos)):
+        grupo, batch, timestamp = siguiente.result()
+        if k + 1 < len(grupos):
+            siguiente = _pool_descarga.submit(_descargar, mercado, period, interval, grupos[k + 1])
+        if lista:
+            timestamp = lista[0].timestamp   # una sola hora para todo el escaneo
+        parte = _pool_analisis.submit(_analizar, mercado, grupo, batch, timestamp).result()
+        lista.append(parte)
+        partes.agregar(parte)
+
+    if not lista:
+        return ResultadoScan(mercado, puntuar(LoteResultados.vacio().a_dataframe()), [],
+                             datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S"))
+    resultado = ResultadoScan.unir(mercado, lista)
+    cache_scan._guardar((mercado, version_datos(period, interval)), resultado)
+    return resultado
+
+
+async def escanear_por_partes(mercado, tam=None, period="2y", interval="1d"):
+    """
+    Generador async: un ResultadoScan por cada parte de 'tam' tickers, en
+    orden, en cuanto se analiza (el primer setup sale tras UNA parte, no
+    tras todo el universo). Al final el resultado completo se guarda en
+    cache_scan.
+
+    Si cache_scan ya tiene un resultado se entrega ese, en una parte (si
+    está viejo se refresca atrás). Si no, varios clientes a la vez
+    comparten UN escaneo por partes (single-flight): los que llegan
+    después leen las mismas partes desde la primera.
+    """
+    mercado = normalizar_mercado(mercado)
+    if cache_scan.guardado(mercado) is not None:
+        resultado, _ = await cache_scan.obtener_async(mercado)
+        yield resultado
+        return
+
+    clave = (mercado,) + version_datos(period, interval)
+    futuro, partes = _vuelos.por_partes(clave, _escanear_partes, mercado, tam, period, interval)
+    if partes is None:
+        yield await _esperar(futuro)
+        return
+    async for parte in partes.leer_async():
+        yield parte
+
+
+def escanear_por_partes_sync(mercado, tam=None, period="2y", interval="1d"):
+    """
+    escanear_por_partes para código normal (el dashboard): genera
+    (parte, segundos que tardó esa parte) en orden. Comparte el vuelo
+    (y las partes) con la versión async y con otras sesiones.
+    """
+    mercado = normalizar_mercado(mercado)
+    if cache_scan.guardado(mercado) is not None:
+        yield cache_scan.obtener(mercado)[0], 0.0
+        return
+
+    clave = (mercado,) + version_datos(period, interval)
+    futuro, partes = _vuelos.por_partes(clave, _escanear_partes, mercado, tam, period, interval)
+    inicio = time.perf_counter()
+    if partes is None:
+        yield futuro.result(), time.perf_counter() - inicio
+        return
+    for parte in partes.leer():
+        yield parte, time.perf_counter() - inicio
+        inicio = time.perf_counter()
+
+
+def mercado_de(ticker):
+    """"MX" para tickers de la BMV (.MX), "USA" para cualquier otro."""
+    return "MX" if ticker.upper().endswith(".MX") else "USA"
+
+
+def _fila(resultado, ticker):
+    filas = resultado.tabla[resultado.tabla["Ticker"] == ticker]
+    return filas if len(filas) else None
+
+
+def _analizar_ticker(mercado, acciones, batch, timestamp):
+    """
+    Parte de CPU de /analisis/{ticker}: en vez del motor por lotes se
+    actualiza el estado incremental del ticker (indicadores_streaming),
+    así un tick o una vela nueva no recalculan los 2 años.
+    """
+    ticker = acciones[0]
+    panel = como_panel(batch, acciones)
+    if not isinstance(panel.columns, pd.MultiIndex) or ticker not in panel.columns.get_level_values(0):
+        return _analizar(mercado, acciones, batch, timestamp)
+
+    estado = estados_ticker.actualizar(ticker, panel[ticker])
+    registro = estado.registro() if estado is not None else None
+    lote = LoteResultados.desde_registros([registro] if registro is not None else [])
+    sin_actualizar = batch.attrs.get("sin_actualizar", [])
+    return ResultadoScan(
+        mercado, puntuar(lote.a_dataframe()), [] if registro is not None else [ticker], timestamp,
+        panel.index.max() if len(panel.index) else None,
+        warning="No se pudo actualizar el ticker; se usan sus últimas velas guardadas." if sin_actualizar else None,
+        firmas=firmas_ultimas_velas(panel, acciones),
+    )
+
+
+async def analizar_ticker_async(ticker, period="2y", interval="1d"):
+    """
+    (ResultadoScan de una fila o None si no hay datos, origen) de un solo
+    ticker, aunque no esté en acciones_mx / acciones_usa.
+      origen "scan":     sale del escaneo fresco de su mercado (sin descargar)
+      origen "descarga": descargar_batch de ese ticker (cache Parquet + solo
+                         el delta que falte) y su estado incremental
+                         (indicadores_streaming.estados_ticker)
+    """
+    ticker = ticker.strip().upper()
+    mercado = mercado_de(ticker)
+
+    resultado = cache_scan.fresco(mercado)
+    if resultado is not None and (filas := _fila(resultado, ticker)) is not None:
+        return ResultadoScan(mercado, filas.reset_index(drop=True), [], resultado.timestamp,
+                             resultado.fecha_datos), "scan"
+
+    async def calcular():
+        loop = asyncio.get_running_loop()
+        datos = await loop.run_in_executor(_pool_descarga, _descargar, mercado, period, interval, [ticker])
+        return await loop.run_in_executor(_pool_analisis, _analizar_ticker, mercado, *datos)
+
+    # Varios requests del mismo ticker a la vez -> una sola descarga
+    clave = ("ticker", ticker) + version_datos(period, interval)
+    resultado = await _vuelos.hacer_async(clave, calcular)
+    if resultado.warning is not None or not len(resultado.tabla):
+        return None, "descarga"
+    return resultado, "descarga"
+
+
+class DemasiadasDescargas(Exception):
+    """La lista pide descargar más tickers de los permitidos (POST /escaneo -> 413)."""
+
+
+def _juntar_bloques(bloques):
+    """
+    Une los paneles descargados por bloque en uno solo (MultiIndex por
+    columnas, fechas alineadas). Los bloques que no vienen como panel se
+    dejan fuera: sus tickers salen en faltantes.
+    """
+    paneles, sin_actualizar = [], []
+    for grupo, batch in bloques:
+        sin_actualizar += batch.attrs.get("sin_actualizar", [])
+        batch = como_panel(batch, grupo)
+        if isinstance(batch.columns, pd.MultiIndex) and not batch.empty:
+            paneles.append(batch)
+    panel = pd.concat(paneles, axis=1).sort_index() if paneles else pd.DataFrame()
+    panel.attrs["sin_actualizar"] = sin_actualizar
+    return panel
+
+
+def normalizar_tickers(tickers):
+    """Mayúsculas, sin vacíos ni duplicados, en el orden en que llegaron."""
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+
+
+async def escanear_lista_async(tickers, period="2y", interval="1d", max_descargas=None):
+    """
+    Escaneo de una lista arbitraria de tickers. Regresa
+    (un ResultadoScan por mercado, cuántos salieron del escaneo en cache).
+
+    Los tickers que ya están en el escaneo fresco de su mercado no se
+    vuelven a descargar ni a analizar. El resto se descarga en bloques de
+    LISTA_TAM_BLOQUE en paralelo (descargar_batch: cache Parquet + delta);
+    los bloques de cada mercado se juntan en un panel y se analizan en una
+    sola pasada del motor por lotes. Si faltan más de max_descargas se
+    rechaza antes de descargar nada (DemasiadasDescargas).
+    """
+    tickers = normalizar_tickers(tickers)
+    por_mercado = {}
+    for t in tickers:
+        por_mercado.setdefault(mercado_de(t), []).append(t)
+
+    # -------- Lo que ya está en el escaneo en cache --------
+    guardados, faltan, en_cache = {}, {}, 0
+    for mercado, lista in por_mercado.items():
+        faltan[mercado] = lista
+        resultado = cache_scan.fresco(mercado)
+        if resultado is None:
+            continue
+        esta = resultado.tabla["Ticker"].isin(lista)
+        if esta.any():
+            guardados[mercado] = ResultadoScan(
+                mercado, resultado.tabla[esta].reset_index(drop=True), [],
+                resultado.timestamp, resultado.fecha_datos,
+            )
+            ya = set(guardados[mercado].tabla["Ticker"])
+            faltan[mercado] = [t for t in lista if t not in ya]
+            en_cache += len(ya)
+
+    total_faltan = sum(len(v) for v in faltan.values())
+    if max_descargas is not None and total_faltan > max_descargas:
+        raise DemasiadasDescargas(
+            f"{total_faltan} tickers no están en cache (máximo {max_descargas} por request)"
+        )
+
+    # -------- Solo lo que falta: descarga en bloques paralelos --------
+    loop = asyncio.get_running_loop()
+
+    async def mercado_nuevo(mercado, lista):
+        grupos = [lista[i:i + LISTA_TAM_BLOQUE] for i in range(0, len(lista), LISTA_TAM_BLOQUE)]
+        descargas = await asyncio.gather(*(
+            loop.run_in_executor(_pool_descarga, _descargar, mercado, period, interval, g)
+            for g in grupos
+        ))
+        panel = _juntar_bloques([(g, batch) for g, (_, batch, _) in zip(grupos, descargas)])
+        timestamp = min(ts for _, _, ts in descargas)
+        # Un solo análisis por mercado sobre el panel ya unido
+        return await loop.run_in_executor(_pool_analisis, _analizar, mercado, lista, panel, timestamp)
+
+    pendientes = [m for m, lista in faltan.items() if lista]
+    hechos = dict(zip(pendientes, await asyncio.gather(
+        *(mercado_nuevo(m, faltan[m]) for m in pendientes)
+    )))
+
+    resultados = []
+    for mercado, lista in por_mercado.items():
+        partes = [guardados[mercado]] if mercado in guardados else []
+        if mercado in hechos:
+            partes.append(hechos[mercado])
+        resultado = ResultadoScan.unir(mercado, partes)
+
+        # Mismo orden que la lista pedida
+        posicion = {t: i for i, t in enumerate(lista)}
+        orden = np.argsort(resultado.tabla["Ticker"].map(posicion).to_numpy(), kind="stable")
+        resultado.tabla = resultado.tabla.iloc[orden].reset_index(drop=True)
+        resultados.append(resultado)
+
+    return resultados, en_cache